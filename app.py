@@ -1,11 +1,14 @@
 import streamlit as st
-import pandas as pd
+from utils import perf
 from utils.ui import inject_css, hero, kpi, sidebar_header, card_buttons
+from utils.data import load_district_features
+from utils.registry import get_registry
 
 # ==============================
 # Configuración inicial
 # ==============================
 st.set_page_config(page_title="Smart Housing Madrid", layout="wide", page_icon="🧭")
+perf.start_rerun("inicio")
 
 # ==============================
 # Branding lateral + CSS
@@ -13,6 +16,9 @@ st.set_page_config(page_title="Smart Housing Madrid", layout="wide", page_icon="
 sidebar_header()
 inject_css()
 
+# Precarga de modelos en segundo plano para que la Calculadora no espere al abrirse
+get_registry().warm_up()
+
 # ==============================
 # Encabezado principal (hero)
 # ==============================
@@ -23,12 +29,11 @@ hero()
 # ==============================
 st.markdown("## Conoce el mercado ⬇️")
 try:
-    df_sum = pd.read_csv("data/district_features.csv")
+    df_sum = load_district_features()
     # Calcular métricas: precio medio de la ciudad y variación media
     precio_ciudad_val = df_sum["PRECIO_EUR_M2"].mean()
     variacion_media = df_sum["VARIACION_PCT"].mean()
     # Distrito más caro y más barato
-    df_sum["distrito_nombre"] = df_sum["DISTRITO"].str.split(".").str[-1].str.strip()
     distrito_caro_val = df_sum.loc[df_sum["PRECIO_EUR_M2"].idxmax(), "distrito_nombre"]
     distrito_barato_val = df_sum.loc[df_sum["PRECIO_EUR_M2"].idxmin(), "distrito_nombre"]
     precio_ciudad = f"{precio_ciudad_val:,.0f}"
@@ -91,3 +96,5 @@ st.caption(
     """,
     unsafe_allow_html=True
 )
+
+perf.end_rerun()
@@ -0,0 +1,242 @@
+"""
+benchmark.py — Banco de pruebas de rendimiento de la app.
+
+Mide, sin navegador:
+- páginas (`app.py` y `pages/*.py`) con `streamlit.testing.v1.AppTest`:
+  primera ejecución con las cachés de Streamlit vacías (arranque en frío) y
+  mediana de varias re-ejecuciones (rerun en caliente);
+- inferencia: `predict` de cada modelo cuantílico y del `QuantilePredictor`
+  (los tres a la vez) para 1, 100 y 10.000 filas del dataset;
+- entrenamiento: tiempo de cada etapa de `train_quantiles.py` (en un
+  directorio temporal; no toca `models/`).
+
+Los resultados se guardan en JSON y se comparan con una línea base: si alguna
+métrica empeora más de la tolerancia (y más que el umbral de ruido absoluto),
+el script lo indica y termina con código 1. También termina con código 1 si
+alguna página lanza una excepción: una página que falla pronto sería "más
+rápida" y pasaría por una mejora.
+
+    python benchmark.py                          # todo salvo entrenamiento
+    python benchmark.py --training               # incluye entrenamiento
+    python benchmark.py --only pages --repeats 10
+    python benchmark.py --save-baseline          # guarda la línea base
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = BASE_DIR / "benchmark_baseline.json"
+RESULTS_PATH = BASE_DIR / "benchmark_results.json"
+SUITES = ("pages", "predict", "training")
+PREDICT_SIZES = (1, 100, 10_000)
+# Tolerancia relativa y umbral absoluto (s) por debajo del cual una diferencia se considera ruido
+DEFAULT_TOLERANCE = 0.25
+NOISE_FLOOR_S = 0.005
+PAGE_TIMEOUT_S = 120
+
+
+def timed(fn, repeats=1):
+    """Mediana de `repeats` ejecuciones de `fn()` en segundos."""
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples))
+
+
+# ==============================
+# Páginas
+# ==============================
+def page_files():
+    return ["app.py", *sorted(os.path.relpath(p, BASE_DIR) for p in glob.glob(str(BASE_DIR / "pages" / "*.py")))]
+
+
+def bench_pages(repeats):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    for page in page_files():
+        # Arranque en frío: cachés compartidas vacías
+        st.cache_resource.clear()
+        st.cache_data.clear()
+        at = AppTest.from_file(str(BASE_DIR / page), default_timeout=PAGE_TIMEOUT_S)
+        # La contraseña evita el aviso de secrets ausentes; con la sesión ya
+        # autenticada se mide el panel, no el formulario de acceso
+        at.secrets["admin_password"] = "benchmark"
+        if page.endswith("0_Admin.py"):
+            at.session_state["is_admin"] = True
+        t0 = time.perf_counter()
+        at.run()
+        cold = time.perf_counter() - t0
+        warm = timed(at.run, repeats)
+        errors = [str(e.value) for e in at.exception]
+        results[page] = {"cold_s": cold, "warm_s": warm, "errors": errors}
+        flag = f"  ⚠️ {errors[0][:80]}" if errors else ""
+        print(f"{page:<32}{cold:>10.3f}{warm:>10.3f}{flag}")
+    return results
+
+
+# ==============================
+# Inferencia
+# ==============================
+def sample_rows(feature_cols, n, seed=0):
+    """`n` filas del dataset (con reemplazo) con las columnas del modelo."""
+    from utils.ingest import load_dataset
+
+    df = load_dataset()
+    missing = [c for c in feature_cols if c not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas del modelo en el dataset: {missing[:5]}")
+    idx = np.random.default_rng(seed).integers(0, len(df), size=n)
+    return df[feature_cols].iloc[idx].reset_index(drop=True)
+
+
+def bench_predict(repeats):
+    from utils.registry import load_bundle
+
+    t0 = time.perf_counter()
+    bundle = load_bundle()
+    results = {"load_s": time.perf_counter() - t0}
+    print(f"{'carga de modelos':<32}{results['load_s']:>10.3f}")
+    for n in PREDICT_SIZES:
+        X = sample_rows(bundle.feature_cols, n)
+        # Más repeticiones cuanto más pequeño el lote (la latencia de una fila es ruidosa)
+        reps = max(1, repeats * (10 if n == 1 else 2 if n <= 100 else 1))
+        entry = {q: timed(lambda m=model: m.predict(X), reps) for q, model in bundle.models.items()}
+        entry["predictor"] = timed(lambda: bundle.predictor.predict(X), reps)
+        if bundle.predictor.compiled is not None:
+            entry["compiled"] = timed(lambda: bundle.predictor.compiled.predict(X), reps)
+        results[f"rows_{n}"] = entry
+        print(f"{f'predict {n} filas':<32}" + "".join(f"{q}={s * 1000:.2f}ms  " for q, s in entry.items()))
+    return results
+
+
+# ==============================
+# Entrenamiento
+# ==============================
+def bench_training(jobs):
+    import train_quantiles
+
+    out_dir_orig = train_quantiles.OUT_DIR
+    with tempfile.TemporaryDirectory(prefix="smarthousing_bench_") as out_dir:
+        train_quantiles.OUT_DIR = Path(out_dir)
+        train_quantiles.TIMINGS.clear()
+        try:
+            timings = dict(train_quantiles.main(["--jobs", str(jobs)]))
+        finally:
+            train_quantiles.OUT_DIR = out_dir_orig
+    return {f"{stage}_s": secs for stage, secs in timings.items()}
+
+
+# ==============================
+# Comparación con la línea base
+# ==============================
+def flatten(results, prefix=""):
+    """{"pages/app.py/warm_s": 0.12, ...} con las métricas numéricas."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    """Lista de (métrica, base, actual, ratio) de las métricas que empeoran."""
+    regressions = []
+    base = flatten(baseline)
+    for name, value in flatten(current).items():
+        if name not in base or base[name] <= 0:
+            continue
+        if value > base[name] * (1 + tolerance) and value - base[name] > NOISE_FLOOR_S:
+            regressions.append((name, base[name], value, value / base[name]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banco de pruebas de rendimiento (páginas, inferencia, entrenamiento).")
+    parser.add_argument("--only", choices=SUITES, action="append", help="Ejecuta sólo estas suites (repetible).")
+    parser.add_argument("--training", action="store_true", help="Incluye el entrenamiento (lento).")
+    parser.add_argument("--repeats", type=int, default=5, help="Repeticiones por medida (se toma la mediana).")
+    parser.add_argument("--jobs", type=int, default=1, help="Procesos para el entrenamiento.")
+    parser.add_argument("--output", default=str(RESULTS_PATH), help="JSON de resultados.")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="JSON de la línea base.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Empeoramiento relativo admitido antes de fallar (0.25 = 25 %%).")
+    parser.add_argument("--save-baseline", action="store_true", help="Guarda los resultados como nueva línea base.")
+    args = parser.parse_args(argv)
+    os.chdir(BASE_DIR)  # las páginas usan rutas relativas (data/, models/)
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+
+    suites = args.only or [s for s in SUITES if s != "training" or args.training]
+    results = {}
+    if "pages" in suites:
+        print(f"\n{'página':<32}{'frío (s)':>10}{'rerun (s)':>10}")
+        results["pages"] = bench_pages(args.repeats)
+    if "predict" in suites:
+        print()
+        results["predict"] = bench_predict(args.repeats)
+    if "training" in suites:
+        print()
+        results["training"] = bench_training(args.jobs)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeats": args.repeats,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {args.output}")
+
+    failed = {page: r["errors"] for page, r in results.get("pages", {}).items() if r["errors"]}
+    if failed:
+        print(f"❌ {len(failed)} página(s) con excepciones (sus tiempos no son comparables):")
+        for page, errors in failed.items():
+            print(f"   {page}: {errors[0][:200]}")
+        if args.save_baseline:
+            print("No se guarda la línea base.")
+        return 1
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Línea base guardada en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("Sin línea base: ejecuta con --save-baseline para crearla.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.tolerance)
+    if not regressions:
+        print(f"✅ Sin regresiones respecto a la línea base (tolerancia {args.tolerance:.0%}).")
+        return 0
+    print(f"❌ {len(regressions)} métrica(s) más lentas que la línea base (tolerancia {args.tolerance:.0%}):")
+    for name, base, value, ratio in sorted(regressions, key=lambda r: -r[3]):
+        print(f"   {name:<48}{base * 1000:>10.1f} ms -> {value * 1000:>10.1f} ms  (x{ratio:.2f})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
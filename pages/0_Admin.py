@@ -1,8 +1,11 @@
 import os
-import subprocess
+import time
 
 import streamlit as st
 
+from utils import compiled, jobs, perf, registry
+from utils.registry import get_registry
+
 """
 Panel de administración
 ======================
@@ -28,6 +31,7 @@ producción.
 """
 
 st.set_page_config(page_title="Panel de administración", layout="wide", page_icon="🔧")
+perf.start_rerun("admin")
 
 # Leer contraseña desde secrets o usar valor por defecto
 ADMIN_PASSWORD = st.secrets.get("admin_password", "admin")
@@ -49,6 +53,7 @@ def login_form():
 # Mostrar login si el usuario no está autenticado
 if not st.session_state["is_admin"]:
     login_form()
+    perf.end_rerun()
     st.stop()
 
 # Sección para gestionar datasets
@@ -65,6 +70,24 @@ if dataset_file is not None:
         with open(target_path, "wb") as f:
             f.write(dataset_file.getbuffer())
         st.success(f"Dataset guardado como `{target_path}`. Ahora puedes reentrenar los modelos si lo deseas.")
+        # Convertir una sola vez a la caché columnar (Parquet tipado) que leen el entrenamiento y las páginas
+        with st.spinner("Generando caché columnar del dataset..."):
+            try:
+                from utils.ingest import build_cache, read_schema
+                build_cache(target_path)
+                schema = read_schema()
+                st.info(f"Caché generada: {schema['rows']:,} filas, {len(schema['dtypes'])} columnas "
+                        f"({schema['memory_bytes'] / 1024:,.0f} KB en memoria).")
+            except Exception as e:
+                st.warning(f"No se pudo generar la caché del dataset: {e}")
+        # Reajustar las proyecciones P10/P50/P90 por distrito con el nuevo histórico
+        with st.spinner("Recalculando proyecciones de precios..."):
+            try:
+                from utils.forecast import build_forecast_table
+                payload = build_forecast_table()
+                st.info(f"Proyecciones recalculadas para {len(payload['params'])} distritos.")
+            except Exception as e:
+                st.warning(f"No se pudieron recalcular las proyecciones: {e}")
 
 st.markdown("---")
 
@@ -77,49 +100,202 @@ model_p50_file = st.file_uploader("Modelo P50 (.pkl)", type=["pkl"], key="model_
 model_p90_file = st.file_uploader("Modelo P90 (.pkl)", type=["pkl"], key="model_p90")
 preprocessor_file = st.file_uploader("Preprocesador (.pkl) opcional", type=["pkl"], key="preproc")
 shap_file = st.file_uploader("Explainer SHAP (.pkl) opcional", type=["pkl"], key="shap")
+compiled_file = st.file_uploader("Ensemble compilado (.bin) opcional", type=["bin"], key="compiled")
 
 if st.button("Guardar modelos", use_container_width=True):
-    os.makedirs("models", exist_ok=True)
     uploads = [
         (model_p10_file, "model_p10.pkl"),
         (model_p50_file, "model_p50.pkl"),
         (model_p90_file, "model_p90.pkl"),
         (preprocessor_file, "preprocessor.pkl"),
         (shap_file, "shap_explainer.pkl"),
+        (compiled_file, compiled.COMPILED_NAME),
     ]
-    saved_any = False
-    for file, name in uploads:
-        if file is not None:
-            with open(os.path.join("models", name), "wb") as f:
-                f.write(file.getbuffer())
-            saved_any = True
-    if saved_any:
-        st.success("Los modelos y artefactos han sido actualizados correctamente.")
+    files = {name: file.getvalue() for file, name in uploads if file is not None}
+    if compiled.COMPILED_NAME in files:
+        try:
+            compiled_header, _ = compiled.read_header(files[compiled.COMPILED_NAME])
+        except ValueError as e:
+            st.error(f"El ensemble compilado no es válido: {e}")
+            files = {}
+        else:
+            import sklearn
+            if compiled_header.get("sklearn_version") != sklearn.__version__:
+                st.warning(
+                    f"El ensemble compilado se generó con scikit-learn {compiled_header.get('sklearn_version')} "
+                    f"(en uso: {sklearn.__version__}): se ignorará y se cargarán los pickles."
+                )
+    if files:
+        # Publicación atómica (temporal + rename) y versión por hash de contenido;
+        # la app carga la nueva versión en segundo plano sin reiniciar el servidor.
+        manifest = registry.publish(files)
+        get_registry().refresh()
+        st.success(f"Los modelos y artefactos han sido actualizados correctamente (versión `{manifest['version']}`).")
+        # Sin .bin subido, se compila a partir de los nuevos pickles (si son GBR);
+        # uno que no corresponda a los pickles se ignora al cargar.
+        if compiled.COMPILED_NAME not in files and any(name in files for name in registry.QUANTILE_FILES.values()):
+            with st.spinner("Compilando el ensemble para carga mapeada en memoria..."):
+                try:
+                    registry.build_compiled()
+                    manifest = registry.write_manifest()
+                    get_registry().refresh()
+                    st.info(f"Ensemble compilado generado (versión `{manifest['version']}`).")
+                except Exception as e:
+                    st.warning(f"No se generó el ensemble compilado (opcional): {e}")
+        # Regenerar la tabla precalculada de la Calculadora para los nuevos modelos
+        with st.spinner("Precalculando predicciones por distrito y barrio..."):
+            try:
+                from utils.precompute import build_prediction_table
+                payload = build_prediction_table()
+                st.success(f"Tabla de predicciones precalculada ({len(payload['table'])} filas).")
+            except Exception as e:
+                st.warning(f"No se pudo precalcular la tabla de predicciones: {e}")
     else:
         st.info("No se subió ningún archivo. Selecciona al menos un modelo para guardar.")
 
+registry_status = get_registry().status()
+if registry_status["version"]:
+    st.caption(
+        f"Versión de modelos en memoria: `{registry_status['version']}`"
+        + (" · cargando nueva versión en segundo plano…" if registry_status["loading"] else "")
+        + (f" · último error de recarga: {registry_status['last_error']}" if registry_status["last_error"] else "")
+    )
+
 st.markdown("---")
 
 # Sección para reentrenar modelos desde la interfaz
 st.header("Entrenamiento de modelos cuantilícos")
-st.write("Puedes ejecutar el script `train_quantiles.py` con el dataset actual para crear nuevos modelos P10–P90. Este proceso puede tardar varios minutos y requiere que las dependencias estén instaladas.")
+st.write("Puedes ejecutar el script `train_quantiles.py` con el dataset actual para crear nuevos modelos P10–P90. El entrenamiento se ejecuta en segundo plano: puedes seguir usando el panel y cualquier sesión de administración verá el mismo entrenamiento.")
+
+JOB_STATUS_LABELS = {
+    "queued": "⏳ En cola",
+    "running": "⚙️ En ejecución",
+    "done": "✅ Completado",
+    "failed": "❌ Fallido",
+}
+
+TRAIN_BACKENDS = {
+    "GradientBoosting (gbr, por defecto)": "gbr",
+    "HistGradientBoosting con categóricas nativas (hgb)": "hgb",
+}
+backend_label = st.selectbox("Backend del modelo cuantílico", list(TRAIN_BACKENDS))
+compare_backends = st.checkbox("Generar informe comparativo gbr vs hgb (tiempo de ajuste, latencia y pinball loss)")
 
 if st.button("Entrenar modelos con dataset actual", use_container_width=True):
-    with st.spinner("Entrenando modelos... esto puede tardar varios minutos."):
-        try:
-            # Ejecutar el script en un subproceso; captura la salida para depuración
-            result = subprocess.run(["python", "train_quantiles.py"], capture_output=True, text=True)
-            if result.returncode == 0:
-                st.success("Entrenamiento completado. Los nuevos modelos están en la carpeta 'models/'.")
-            else:
-                st.error("Se produjo un error al entrenar los modelos. Consulta el registro para más detalles.")
-                st.code(result.stderr)
-        except Exception as e:
-            st.error(f"No se pudo ejecutar el script de entrenamiento: {e}")
+    train_args = ["--backend", TRAIN_BACKENDS[backend_label]]
+    if compare_backends:
+        train_args.append("--compare")
+    try:
+        job, created = jobs.start_training(train_args)
+        if created:
+            st.success("Entrenamiento lanzado en segundo plano.")
+        else:
+            st.info("Ya hay un entrenamiento en curso; se muestra su progreso.")
+    except Exception as e:
+        st.error(f"No se pudo ejecutar el script de entrenamiento: {e}")
+
+
+@st.fragment(run_every=2)
+def training_status():
+    """Estado del último entrenamiento; se refresca solo cada 2 s sin relanzar la página."""
+    job = jobs.get_job()
+    if job is None:
+        st.caption("No se ha lanzado ningún entrenamiento todavía.")
+        return
+    log_text = jobs.read_log(job)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Estado", JOB_STATUS_LABELS.get(job["status"], job["status"]))
+    c2.metric("Tiempo transcurrido", f"{jobs.elapsed(job):,.0f} s")
+    c3.metric("Trabajo", job["id"])
+    metrics = job["metrics"] or jobs.parse_metrics(log_text)
+    if metrics:
+        st.dataframe(
+            [{"Cuantil": f"P{int(round(m['alpha'] * 100))}", "MAE": m["mae"], "RMSE": m["rmse"], "R²": m["r2"]} for m in metrics],
+            use_container_width=True,
+        )
+    if job["status"] == "done":
+        st.success("Entrenamiento completado. Los nuevos modelos están en la carpeta 'models/'.")
+    elif job["status"] == "failed":
+        st.error(job.get("error") or "Se produjo un error al entrenar los modelos. Consulta el registro para más detalles.")
+    with st.expander("Registro del entrenamiento", expanded=job["status"] in jobs.ACTIVE_STATUSES):
+        st.code(log_text[-5000:] or "(sin salida todavía)")
+
+
+training_status()
+
+st.markdown("---")
+
+# Sección de rendimiento: tiempos de las zonas instrumentadas con utils/perf.py
+st.header("Rendimiento")
+st.write("Tiempos registrados en este proceso (búfer circular en memoria): lectura de CSV y del dataset, codificación de imágenes, carga de modelos, SHAP, gráficos Plotly y ejecuciones completas de cada página.")
+
+PERF_WINDOWS = {"Últimos 5 minutos": 300, "Última hora": 3600, "Todo el búfer": None}
+perf_window = st.selectbox("Periodo", list(PERF_WINDOWS), index=1)
+window_s = PERF_WINDOWS[perf_window]
+perf_rows = perf.summary(time.time() - window_s if window_s else None)
+if perf_rows:
+    st.dataframe(
+        [
+            {
+                "Zona": r["name"],
+                "Llamadas": r["calls"],
+                "Fallos de caché": r["misses"],
+                "Aciertos de caché": None if r["hit_rate"] is None else f"{r['hit_rate']:.0%}",
+                "p50 (ms)": round(r["p50_ms"], 2),
+                "p95 (ms)": round(r["p95_ms"], 2),
+                "Máx. (ms)": round(r["max_ms"], 2),
+                "Total (ms)": round(r["total_ms"], 1),
+            }
+            for r in perf_rows
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+else:
+    st.caption("Sin medidas en este periodo." if perf.ENABLED else "Instrumentación desactivada (SMARTHOUSING_PERF=0).")
+
+st.subheader("Memoria por sesión")
+st.caption(
+    f"Estimación de `session_state` tomada en el primer rerun de cada sesión y cada {perf.MEMORY_EVERY} reruns. "
+    "Pulsa el botón para que cada sesión la actualice en su próximo rerun."
+)
+if st.button("Medir memoria de las sesiones", use_container_width=True):
+    perf.request_memory()
+session_rows = perf.sessions(perf.active_sessions())
+if session_rows:
+    st.dataframe(
+        [
+            {
+                "Sesión": r["session"][:8],
+                "Página": r["page"],
+                "session_state (KB)": round(r["bytes"] / 1024, 1),
+                "Claves": r["keys"],
+                "Última ejecución (s)": round(time.time() - r["seen"]),
+                "Medida hace (s)": round(time.time() - r["measured"]),
+            }
+            for r in session_rows
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+else:
+    st.caption("Ninguna sesión ha completado todavía una ejecución medida.")
+
+c1, c2 = st.columns(2)
+if c1.button("Exportar medidas a archivo (JSON Lines)", use_container_width=True):
+    try:
+        st.success(f"Medidas exportadas a `{perf.export()}`.")
+    except OSError as e:
+        st.error(f"No se pudieron exportar las medidas: {e}")
+if c2.button("Vaciar búfer de medidas", use_container_width=True):
+    perf.clear()
+    st.info("Búfer vaciado.")
 
 st.markdown("---")
 
 st.header("Cerrar sesión")
 if st.button("Cerrar sesión", use_container_width=True):
     st.session_state["is_admin"] = False
-    st.success("Sesión cerrada. Recarga la página para volver al inicio.")
\ No newline at end of file
+    st.success("Sesión cerrada. Recarga la página para volver al inicio.")
+
+perf.end_rerun()
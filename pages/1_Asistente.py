@@ -3,12 +3,21 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from utils.ui import inject_css, chip
+import pydeck as pdk
+from utils import perf
+from utils.ui import inject_css, chip, plotly_chart, sparkline_svg
+from utils.data import DISTRICT_FEATURES_PATH, file_key, load_district_table
+from utils.exports import download_button
+from utils.forecast import history, projection, start_period
+from utils.scoring import PRIORITIES, rank
+from utils.store import get_store
+from utils.geo import choropleth
 
 # ==============================
 # Configuración inicial
 # ==============================
 st.set_page_config(page_title="Asistente", layout="wide", page_icon="🧭")
+perf.start_rerun("asistente")
 inject_css()
 st.title("")
 st.title("Asistente: Encuentra tu mejor lugar y momento")
@@ -28,32 +37,43 @@ def semaforo_color(valor: float) -> tuple[str, str]:
     return "#AA1927", "🔴"
 
 def tarjetas_recomendacion(df_top: pd.DataFrame):
-    cols = st.columns(len(df_top))
-    for i, (_, row) in enumerate(df_top.iterrows()):
+    # Todas las tarjetas en un único bloque HTML con minigráficos SVG (utils/ui.py):
+    # histórico anual real + P50 proyectado a 12 y 24 meses (utils/forecast.py)
+    tarjetas = []
+    for _, row in df_top.iterrows():
         color, emoji = semaforo_color(float(row["variacion_interanual"]))
-        with cols[i]:
-            st.markdown(
-                f"""
-                <div style="border:1px solid #e5e7eb;border-radius:12px;padding:14px;text-align:center;background:#fff">
-                    <div style="font-weight:800;font-size:1.05rem">{emoji} {row['distrito']}</div>
-                    <div style="margin-top:6px;font-size:1.1rem"><b>{int(row['precio_m2']):,} €/m²</b></div>
-                    <div style="margin-top:4px;color:{color}">{row['variacion_interanual']}% tendencia</div>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-            # Microserie demo
-            y = np.cumsum(np.random.randn(24)) * 5 + row["precio_m2"]
-            fig = px.line(x=list(range(24)), y=y, labels={"x": "meses", "y": "€/m²"})
-            fig.update_layout(height=120, margin=dict(l=0, r=0, t=0, b=0))
-            st.plotly_chart(fig, use_container_width=True)
-
-def proyeccion_demo(base: float, titulo: str):
-    meses = np.arange(0, 24)
-    trend = base * (1 + 0.002 * meses)  # demo
-    noise = np.linspace(-80, 80, 24)
-    p50 = trend + noise
-    p10, p90 = p50 - 150, p50 + 150
+        serie = history(row["distrito"])
+        tabla = projection(row["distrito"], months=24)
+        futuro = tabla.loc[tabla["mes"].isin([12, 24]), "p50"] if tabla is not None else ()
+        grafico = sparkline_svg(serie.values, futuro, color=color) if serie is not None else ""
+        alcance = ""
+        if pd.notna(row.get("m2_alcanzables")):
+            alcance = f'<div style="margin-top:4px;font-size:.85rem;color:#555">≈ {row["m2_alcanzables"]:,.0f} m² con tu presupuesto</div>'
+        tarjetas.append(
+            f"""
+            <div style="border:1px solid #e5e7eb;border-radius:12px;padding:14px;text-align:center;background:#fff">
+                <div style="font-weight:800;font-size:1.05rem">{emoji} {row['distrito']}</div>
+                <div style="margin-top:6px;font-size:1.1rem"><b>{int(row['precio_m2']):,} €/m²</b></div>
+                <div style="margin-top:4px;color:{color}">{row['variacion_interanual']}% tendencia</div>
+                {alcance}
+                <div style="margin-top:8px">{grafico}</div>
+            </div>
+            """
+        )
+    rejilla = "".join(tarjetas)
+    st.markdown(
+        f'<div style="display:grid;grid-template-columns:repeat(auto-fit,minmax(200px,1fr));gap:16px">{rejilla}</div>',
+        unsafe_allow_html=True
+    )
+    st.caption("Línea continua: €/m² anual 2015–2024 · discontinua: P50 proyectado a 12 y 24 meses.")
+
+def proyeccion(distrito: str, titulo: str):
+    """Proyección P10/P50/P90 precalculada del distrito (utils/forecast.py)."""
+    tabla = projection(distrito, months=24)
+    if tabla is None:
+        st.warning("No hay histórico de precios para este distrito.")
+        return
+    meses, p10, p50, p90 = (tabla[c].to_numpy() for c in ("mes", "p10", "p50", "p90"))
 
     fig = go.Figure()
     fig.add_trace(go.Scatter(x=meses, y=p90, mode="lines", name="P90", line=dict(width=1)))
@@ -64,8 +84,8 @@ def proyeccion_demo(base: float, titulo: str):
         fill="toself", name="Banda P10–P90", opacity=0.15, line=dict(width=0)
     ))
     fig.add_trace(go.Scatter(x=meses, y=p50, mode="lines", name="P50", line=dict(width=2)))
-    fig.update_layout(title=titulo, xaxis_title="Meses", yaxis_title="€/m²", height=380, margin=dict(l=0,r=0,t=40,b=0))
-    st.plotly_chart(fig, use_container_width=True)
+    fig.update_layout(title=titulo, xaxis_title=f"Meses desde {start_period()}", yaxis_title="€/m²", height=380, margin=dict(l=0,r=0,t=40,b=0))
+    plotly_chart(fig, "asistente_proyeccion", use_container_width=True)
 
 # ==============================
 # Selección de objetivo (persistente)
@@ -86,23 +106,16 @@ st.write(f"**Has elegido:** {objetivo.capitalize()}")
 # Cargamos el dataset de características por distrito generado a partir de la base MASTER_BD_VIVIENDA_2015a2024.xlsx.
 # Este archivo contiene la media de las variables relevantes por distrito y la variación porcentual del precio
 # entre los extremos del periodo 2015–2024.
-df = pd.read_csv("data/district_features.csv")
-
-# Normalizamos nombres de columna para trabajar en minúsculas y crear etiquetas más amigables
-df = df.rename(columns={
-    "DISTRITO": "distrito",
-    "PRECIO_EUR_M2": "precio_m2",
-    "VARIACION_PCT": "variacion_pct"
-})
-
-# Extraemos un nombre corto de distrito eliminando el prefijo numérico ("01. Centro" -> "Centro")
-df["distrito_nombre"] = df["distrito"].str.split(".").str[-1].str.strip()
+# La tabla se comparte entre sesiones (cacheada por fecha de modificación del CSV), ya renombrada
+# (distrito, precio_m2, variacion_pct) y con el nombre corto del distrito ("01. Centro" -> "Centro").
+def tabla_asistente() -> pd.DataFrame:
+    df = load_district_table().copy()
+    # Para compatibilidad con funciones anteriores, creamos variacion_interanual como la variación porcentual
+    df["variacion_interanual"] = df["variacion_pct"]
+    return df
 
-# Calculamos una columna de puntuación para recomendaciones de compra:
-df["score"] = df["variacion_pct"].rank(ascending=False) + df["precio_m2"].rank(ascending=True)
 
-# Para compatibilidad con funciones anteriores, creamos variacion_interanual como la variación porcentual
-df["variacion_interanual"] = df["variacion_pct"]
+df = tabla_asistente()
 
 # ==============================
 # Paso 1: Perfilado inicial (dinámico)
@@ -115,9 +128,14 @@ with st.expander("① Perfilado inicial", expanded=True):
             presupuesto = st.slider("Presupuesto máximo (€)", 120_000, 1_200_000, 350_000, 10_000)
             habitaciones = st.selectbox("Habitaciones", [1, 2, 3, 4], index=1)
             prioridades = st.multiselect(
-                "Prioridades", ["Precio bajo", "Zonas verdes", "Transporte", "Seguridad", "Inversión"],
+                "Prioridades", list(PRIORITIES),
                 default=["Precio bajo", "Transporte"]
             )
+            # Importancia relativa de cada prioridad (pesos del motor de puntuación)
+            pesos = {
+                p: st.select_slider(f"Importancia · {p}", options=[1, 2, 3], value=1, key=f"peso_{p}")
+                for p in prioridades
+            }
             st.write("**Tus prioridades:**")
             for p in prioridades: chip(p)
         with c2:
@@ -157,21 +175,29 @@ st.markdown("---")
 
 if objetivo == "comprar":
     st.subheader("② Recomendaciones de compra")
-    # Ranking de distritos basados en precio medio y variación porcentual.
+    # Ranking por prioridades ponderadas y viabilidad del presupuesto (utils/scoring.py);
+    # `score` es la posición en el ranking (menor = mejor)
+    ranking = rank(pesos, presupuesto, habitaciones)
+    df = df.merge(ranking[["distrito", "p50", "m2_alcanzables", "asequible"]], on="distrito", how="left")
+    df["score"] = df["distrito"].map({d: i for i, d in enumerate(ranking["distrito"])})
     df_top = df.sort_values("score").head(3)
+    if not df_top["asequible"].any():
+        st.warning("Con este presupuesto ningún distrito alcanza la superficie típica para "
+                   f"{habitaciones} habitación(es); se muestran los más cercanos.")
     tarjetas_recomendacion(df_top)
 
 elif objetivo == "vender":
     st.subheader("② Análisis de tu distrito")
     # Seleccionamos la fila correspondiente al distrito elegido (por nombre corto)
     distrito_sel = locals().get("distrito_v", df["distrito_nombre"].iloc[0])
-    row = df.loc[df["distrito_nombre"] == distrito_sel].head(1)
-    if row.empty:
+    # Búsqueda indexada en el almacén de zonas (utils/store.py)
+    row = get_store().district(distrito_sel)
+    if row is None:
         st.warning("No hay datos para el distrito seleccionado; usando valores de demo.")
         precio_base, variacion = 4000.0, 0.0
     else:
-        precio_base = float(row["precio_m2"].values[0])
-        variacion = float(row["variacion_pct"].values[0])
+        precio_base = float(row["PRECIO_EUR_M2"])
+        variacion = float(row["VARIACION_PCT"])
     color, emoji = semaforo_color(variacion)
     st.metric(label=f"Precio medio en {distrito_sel}", value=f"{precio_base:,.0f} €/m²", delta=f"{variacion:.2f}%")
     st.info(f"{emoji} Estado del mercado en {distrito_sel} — "
@@ -184,9 +210,39 @@ else:  # explorar
     fig_bar = px.bar(df_sorted, x="distrito_nombre", y="precio_m2", color="variacion_pct",
                      title="Top distritos por €/m² (color por variación %)",
                      color_continuous_scale="RdYlGn")
-    st.plotly_chart(fig_bar, use_container_width=True)
+    plotly_chart(fig_bar, "asistente_destacados", use_container_width=True)
     st.caption("Escala de color: verde=crece, amarillo=estable, rojo=cae.")
 
+    # Mapa coroplético (geometrías precalculadas y cacheadas en utils/geo.py)
+    m1, m2 = st.columns(2)
+    with m1:
+        nivel_mapa = st.radio("Nivel del mapa", ["Distritos", "Barrios"], horizontal=True)
+    with m2:
+        metrica_mapa = st.radio("Indicador", ["€/m²", "Variación %"], horizontal=True)
+    nivel = "barrio" if nivel_mapa == "Barrios" else "distrito"
+    formato = "{:,.0f} €/m²" if metrica_mapa == "€/m²" else "{:+.2f}%"
+    if nivel == "barrio":
+        # Indicadores propios de cada barrio (utils/features.barrio_base), unidos por BARRIO
+        columna = "PRECIO_EUR_M2" if metrica_mapa == "€/m²" else "VARIACION_PCT"
+        barrios = get_store().barrios
+        valores = pd.Series(barrios[columna].to_numpy(), index=barrios["BARRIO"].astype(str))
+        capa = choropleth(valores, level="barrio", zoom=10, key_column="BARRIO", value_format=formato)
+    else:
+        columna = "precio_m2" if metrica_mapa == "€/m²" else "variacion_pct"
+        capa = choropleth(df.set_index("distrito")[columna], level="distrito", zoom=10, value_format=formato)
+    nombre = "{barrio_nombre} ({distrito_nombre})" if nivel == "barrio" else "{distrito_nombre}"
+    st.pydeck_chart(pdk.Deck(
+        layers=[pdk.Layer(
+            "GeoJsonLayer", capa, pickable=True, stroked=True, filled=True,
+            get_fill_color="properties.fill_color", get_line_color=[255, 255, 255], line_width_min_pixels=1,
+        )],
+        initial_view_state=pdk.ViewState(latitude=40.42, longitude=-3.70, zoom=10),
+        map_style=None,
+        tooltip={"html": f"<b>{nombre}</b><br/>{{value_label}}"},
+    ))
+    if nivel == "barrio":
+        st.caption("Indicadores por barrio (dataset de viviendas); los barrios sin datos propios muestran el valor de su distrito.")
+
 # ==============================
 # Paso 3: Comparador integrado (siempre visible, contextual)
 # ==============================
@@ -224,7 +280,7 @@ if seleccion:
     # Barras €/m² con color por variación
     fig_comp = px.bar(df_sel, x="distrito_nombre", y="precio_m2", color="variacion_pct",
                       title="Comparativa €/m² (color por variación %)", color_continuous_scale="RdYlGn")
-    st.plotly_chart(fig_comp, use_container_width=True)
+    plotly_chart(fig_comp, "asistente_comparativa", use_container_width=True)
 else:
     st.info("Selecciona al menos un distrito para comparar.")
 
@@ -246,9 +302,8 @@ else:
 sel = st.selectbox("Ver proyección para:", df["distrito"].tolist(),
                    index=df["distrito"].tolist().index(default_distrito) if default_distrito in df["distrito"].tolist() else 0)
 
-base_precio = float(df.loc[df["distrito"]==sel,"precio_m2"].iloc[0]) if sel in df["distrito"].values else 4000.0
-proyeccion_demo(base_precio, f"Proyección en {sel} (P10–P90 • demo)")
-st.info("Intervalos de confianza ( % 10, % 50, % 90).")
+proyeccion(sel, f"Proyección en {sel} (P10–P90)")
+st.info("Intervalos de confianza ( % 10, % 50, % 90) a partir de la evolución anual del €/m² del distrito (2015–2024).")
 
 c1, c2 = st.columns(2)
 with c1:
@@ -262,9 +317,14 @@ with c1:
         st.switch_page("pages/3_Calculadora.py")
 
 with c2:
-    st.download_button(
-        "📥 Descargar resumen (CSV)",
-        data=df.to_csv(index=False).encode(),
-        file_name="resumen_asistente.csv",
+    # Exportación generada al pulsar y cacheada por versión del CSV (utils/exports.py)
+    download_button(
+        "📥 Descargar resumen",
+        "resumen_asistente",
+        file_key(DISTRICT_FEATURES_PATH),
+        tabla_asistente,
+        file_name="resumen_asistente",
         use_container_width=True
     )
+
+perf.end_rerun()
@@ -0,0 +1,140 @@
+import glob
+import os
+import tempfile
+import time
+import uuid
+
+import pandas as pd
+import streamlit as st
+from utils import perf
+from utils.ui import inject_css
+from utils.registry import get_registry
+from utils.portfolio import CHUNK_SIZE, TEMPLATE, value_csv
+from utils.exports import download_button, file_download_button
+
+# ==============================
+# Configuración inicial
+# ==============================
+st.set_page_config(page_title="Valoración de cartera", layout="wide", page_icon="🧭")
+perf.start_rerun("cartera")
+inject_css()
+st.title("📦 Valoración de cartera")
+
+st.write(
+    "Sube un CSV con una fila por inmueble y obtén P10/P50/P90 (€/m² y €) para toda la cartera. "
+    "El archivo se procesa por bloques y el resultado se escribe en disco a medida que se calcula, "
+    "así que admite carteras de cientos de miles de filas."
+)
+
+# ==============================
+# Formato de entrada
+# ==============================
+with st.expander("Formato del CSV"):
+    st.markdown(
+        "- **Ubicación**: `distrito` y opcionalmente `barrio` (por nombre), o `latitud`/`longitud`.\n"
+        "- **Superficie** en m² (`superficie`), necesaria para el valor total.\n"
+        "- `habitaciones`, `ascensor`, `cerca_metro` y `antiguedad` son opcionales.\n"
+        "- Los nombres de columna no distinguen mayúsculas ni acentos."
+    )
+    st.dataframe(TEMPLATE, use_container_width=True, hide_index=True)
+    download_button(
+        "📄 Descargar plantilla",
+        "plantilla_cartera",
+        1,
+        lambda: TEMPLATE,
+        file_name="plantilla_cartera",
+        formats=("csv",),
+    )
+
+c1, c2 = st.columns([3, 1])
+with c1:
+    archivo = st.file_uploader("CSV de la cartera", type=["csv"])
+with c2:
+    separador = st.selectbox("Separador", [",", ";"], index=0)
+
+# ==============================
+# Valoración por bloques
+# ==============================
+# El resultado vive en un archivo temporal por sesión; en la sesión sólo se guarda su ruta
+RESULT_PREFIX = "smarthousing_cartera_"
+# Los resultados de sesiones ya cerradas se borran pasado este tiempo
+RESULT_MAX_AGE_S = 24 * 3600
+
+if "cartera_resultado" not in st.session_state:
+    st.session_state["cartera_resultado"] = None
+
+
+def _remove(path: str | None):
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _sweep_results():
+    """Borra los resultados antiguos que dejaron sesiones que ya no existen."""
+    limit = time.time() - RESULT_MAX_AGE_S
+    for path in glob.glob(os.path.join(tempfile.gettempdir(), f"{RESULT_PREFIX}*.csv")):
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def _result_path() -> str:
+    # El resultado anterior de la sesión se sustituye: se borra su archivo
+    previo = st.session_state.get("cartera_resultado")
+    _remove(previo and previo["path"])
+    st.session_state["cartera_resultado"] = None
+    _sweep_results()
+    return os.path.join(tempfile.gettempdir(), f"{RESULT_PREFIX}{uuid.uuid4().hex}.csv")
+
+
+if archivo is not None and st.button("Valorar cartera", use_container_width=True):
+    predictor = get_registry().get().predictor
+    barra = st.progress(0.0, text="Valorando…")
+    tamano = max(archivo.size, 1)
+
+    def progreso(filas):
+        # Avance aproximado por bytes leídos del archivo subido
+        barra.progress(min(archivo.tell() / tamano, 1.0), text=f"{filas:,} inmuebles valorados")
+
+    path = _result_path()
+    try:
+        archivo.seek(0)
+        resumen = value_csv(archivo, path, predictor, chunksize=CHUNK_SIZE, sep=separador, progress=progreso)
+    except (pd.errors.ParserError, UnicodeDecodeError, ValueError) as e:
+        barra.empty()
+        _remove(path)
+        st.error(f"No se pudo leer el CSV: {e}")
+    except Exception as e:
+        barra.empty()
+        _remove(path)
+        st.error(f"No se pudo valorar la cartera ({type(e).__name__}): {e}")
+    else:
+        barra.progress(1.0, text=f"{resumen['rows']:,} inmuebles valorados")
+        st.session_state["cartera_resultado"] = dict(resumen, path=path, name=archivo.name)
+
+resultado = st.session_state["cartera_resultado"]
+if resultado is not None and os.path.exists(resultado["path"]):
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Inmuebles", f"{resultado['rows']:,}")
+    m2.metric("Sin valorar", f"{resultado['errors']:,}")
+    m3.metric("Valor total (mediana)", f"{resultado['total_p50']:,.0f} €")
+
+    st.caption("Primeras filas del resultado")
+    st.dataframe(pd.read_csv(resultado["path"], nrows=20), use_container_width=True, hide_index=True)
+
+    # Bytes leídos al pulsar, una vez por versión del archivo (utils/exports.py)
+    nombre = os.path.splitext(resultado["name"])[0]
+    file_download_button(
+        "📥 Descargar valoración",
+        resultado["path"],
+        file_name=f"{nombre}_valorada",
+        key="cartera_descarga",
+        use_container_width=True,
+    )
+
+perf.end_rerun()
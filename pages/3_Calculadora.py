@@ -2,13 +2,20 @@ import streamlit as st
 import numpy as np
 import pandas as pd
 import plotly.express as px
-import joblib, json, os
-from utils.ui import inject_css
+from utils import perf
+from utils.ui import inject_css, plotly_chart
+from utils.data import load_district_table
+from utils.registry import get_registry
+from utils.precompute import artifact_key, load_prediction_table, lookup
+from utils.spatial import locate_point
+from utils.features import NUEVA_MAX_ANTIGUEDAD, build_inputs, profile, property_columns
+from utils.store import get_store
 
 # ==============================
 # Configuración inicial
 # ==============================
 st.set_page_config(page_title="Calculadora", layout="wide", page_icon="🧭")
+perf.start_rerun("calculadora")
 inject_css()
 st.title("🧮 Calculadora de precio")
 
@@ -16,27 +23,56 @@ st.title("🧮 Calculadora de precio")
 # Cargar datos agregados por distrito
 # ==============================
 # Usamos district_features.csv para extraer valores medios de las variables utilizadas por el modelo
-district_df = pd.read_csv("data/district_features.csv")
-district_df = district_df.rename(columns={"DISTRITO": "distrito", "PRECIO_EUR_M2": "precio_m2"})
-# Extraemos nombre corto del distrito para el desplegable
-district_df["distrito_nombre"] = district_df["distrito"].str.split(".").str[-1].str.strip()
+# (tabla compartida y cacheada). Las búsquedas de distrito y barrio van por el almacén indexado
+# de utils/store.py (barrios con sus propios indicadores del dataset de viviendas).
+district_df = load_district_table()
+zonas = get_store()
 
 DIST_LIST = district_df["distrito_nombre"].tolist()
 
 # ==============================
 # Prefill desde Asistente (si existe)
 # ==============================
-default_distrito = st.session_state.get("selected_distrito", "Centro")
+# El Asistente guarda la etiqueta ("01. Centro"); se normaliza al nombre corto
+default_distrito = zonas.district_name(st.session_state.get("selected_distrito", "Centro")) or DIST_LIST[0]
 default_superficie = st.session_state.get("calc_superficie", 85)
 default_antiguedad = st.session_state.get("calc_antiguedad", 35)
 default_ascensor = st.session_state.get("calc_ascensor", 1)  # 1=Sí, 0=No
 
+# ==============================
+# Ubicación por coordenadas (opcional)
+# ==============================
+# El barrio se resuelve con el índice espacial de utils/spatial.py sobre Barrios.json
+ubicacion = None
+with st.expander("📍 Ubicar por coordenadas (opcional)"):
+    usar_coords = st.checkbox("Fijar distrito y barrio a partir de latitud/longitud")
+    l1, l2 = st.columns(2)
+    with l1:
+        latitud = st.number_input("Latitud", value=40.4169, format="%.5f")
+    with l2:
+        longitud = st.number_input("Longitud", value=-3.7034, format="%.5f")
+    if usar_coords:
+        ubicacion = locate_point(latitud, longitud)
+        if ubicacion is None:
+            st.warning("Las coordenadas no caen dentro de ningún barrio de Madrid.")
+        else:
+            st.caption(f"📍 {ubicacion['barrio_nombre']} ({ubicacion['distrito_nombre']})")
+            if ubicacion["distrito_nombre"] in DIST_LIST:
+                default_distrito = ubicacion["distrito_nombre"]
+
 # ==============================
 # Inputs
 # ==============================
 c1, c2, c3 = st.columns(3)
 with c1:
     distrito = st.selectbox("Distrito", DIST_LIST, index=DIST_LIST.index(default_distrito))
+    BARRIO_REFERENCIA = "(barrio de referencia del distrito)"
+    barrios_distrito = [BARRIO_REFERENCIA] + zonas.barrios_of(distrito)["barrio_nombre"].tolist()
+    barrio_previo = ubicacion["barrio_nombre"] if ubicacion is not None and ubicacion["distrito_nombre"] == distrito else BARRIO_REFERENCIA
+    barrio_sel = st.selectbox(
+        "Barrio", barrios_distrito,
+        index=barrios_distrito.index(barrio_previo) if barrio_previo in barrios_distrito else 0,
+    )
     superficie = st.number_input("Superficie (m²)", 20, 400, int(default_superficie))
 with c2:
     habitaciones = st.selectbox("Habitaciones", [1,2,3,4], index=1)
@@ -48,56 +84,80 @@ with c3:
 # ==============================
 # Carga modelos y columnas de características
 # ==============================
-# Cargamos los modelos de cuantiles entrenados con los datos agregados por distrito.
-@st.cache_resource(show_spinner=False)
-def load_models():
+# Los modelos se sirven desde el registro compartido del proceso (utils/registry.py): si se publican
+# nuevos artefactos, se cargan en segundo plano mientras se sigue usando la versión anterior.
+bundle = get_registry().get()
+feature_cols, predictor = bundle.feature_cols, bundle.predictor
+
+# Características del inmueble que usa el modelo (el resto de variables son las del distrito)
+inmueble = {"habitaciones": habitaciones, "ascensor": ascensor, "cerca_metro": cerca_metro, "antiguedad": antiguedad}
+ETIQUETAS_INMUEBLE = {"habitaciones": "habitaciones", "ascensor": "ascensor", "cerca_metro": "cercanía a metro", "antiguedad": "antigüedad"}
+
+
+def _enumerar(items: list[str]) -> str:
+    return items[0] if len(items) == 1 else f"{', '.join(items[:-1])} y {items[-1]}"
+
+
+def efecto_inmueble(feature_cols: list[str]) -> str:
+    """Qué hace cada característica del inmueble con el modelo cargado (sólo los efectos que existen)."""
+    columnas = property_columns(feature_cols)
+    efectos = []
+    if "TIPO_VIVIENDA" in columnas["antiguedad"]:
+        efectos.append(f"la antigüedad fija el tipo de vivienda (aproximación: nueva hasta {NUEVA_MAX_ANTIGUEDAD} años)")
+    if "ANTIGUEDAD" in columnas["antiguedad"]:
+        efectos.append("la antigüedad es una variable del modelo")
+    if columnas["cerca_metro"]:
+        efectos.append("la cercanía a metro fija el indicador «tiene metro» (aproximación: las paradas de la zona no cambian)")
+    directas = [ETIQUETAS_INMUEBLE[n] for n in ("habitaciones", "ascensor") if columnas[n]]
+    if directas:
+        efectos.append(f"{_enumerar(directas)} {'son variables' if len(directas) > 1 else 'es una variable'} del modelo")
+    ignoradas = [ETIQUETAS_INMUEBLE[n] for n, cols in columnas.items() if not cols]
+    if ignoradas:
+        efectos.append(f"{_enumerar(ignoradas)} no {'afectan' if len(ignoradas) > 1 else 'afecta'} al modelo actual")
+    texto = "; ".join(efectos)
+    return texto[:1].upper() + texto[1:] + "."
+
+
+st.caption(efecto_inmueble(feature_cols))
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_precomputed(key):
     """
-    Carga los artefactos de los modelos (P10, P50, P90) y la lista de columnas de características.
-    Devuelve una tupla (feature_columns, model_p10, model_p50, model_p90, shap_explainer opcional).
+    Tabla precalculada de cuantiles y SHAP por distrito/barrio (utils/precompute.py).
+    `key` cambia cuando cambian los modelos o los CSV; si la huella no coincide se devuelve None.
     """
-    models_dir = "models"
-    # Cargar columnas de características
-    with open(os.path.join(models_dir, 'feature_columns.json'), 'r') as f:
-        feature_cols = json.load(f)
-    # Cargar modelos cuantílicos
-    model_p10 = joblib.load(os.path.join(models_dir, 'model_p10.pkl'))
-    model_p50 = joblib.load(os.path.join(models_dir, 'model_p50.pkl'))
-    model_p90 = joblib.load(os.path.join(models_dir, 'model_p90.pkl'))
-    # Cargar explainer SHAP si existe
-    shap_explainer = None
-    shap_path = os.path.join(models_dir, 'shap_explainer.pkl')
-    if os.path.exists(shap_path):
-        try:
-            shap_explainer = joblib.load(shap_path)
-        except Exception:
-            shap_explainer = None
-    return feature_cols, model_p10, model_p50, model_p90, shap_explainer
-
-
-feature_cols, model_p10, model_p50, model_p90, shap_explainer = load_models()
+    return load_prediction_table()
+
+
+prediction_table = load_precomputed(artifact_key())
 
 # ==============================
 # Botón de cálculo real
 # ==============================
 if st.button("Calcular Intervalos de Confianza", use_container_width=True):
-    # Seleccionar fila del distrito elegido
-    row = district_df[district_df["distrito_nombre"] == distrito]
-    if row.empty:
+    # Barrio concreto (elegido o ubicado por coordenadas); si no, barrio de referencia del distrito
+    barrio = zonas.barrio(barrio_sel, distrito) if barrio_sel != BARRIO_REFERENCIA else None
+    barrio_nombre = barrio["barrio_nombre"] if barrio is not None else None
+    # Respuesta desde la tabla precalculada si está vigente; si no, predicción en vivo
+    perfil = profile(inmueble)
+    cached = lookup(prediction_table, distrito, barrio_nombre, perfil) if prediction_table is not None else None
+    etiqueta = zonas.district_label(distrito)
+    if etiqueta is None:
         st.error("No se encontraron datos para el distrito seleccionado.")
     else:
-        # Utilizar las columnas de características esperadas por el modelo
-        # Convertir a DataFrame con una fila siguiendo el orden de feature_cols
-        X_input = row.copy()
-        # Asegurar que las columnas estén en el orden requerido
-        # Algunas columnas pueden faltar si no estaban en feature_cols; las añadimos como NaN
-        for col in feature_cols:
-            if col not in X_input.columns:
-                X_input[col] = np.nan
-        X_input = X_input[feature_cols]
-        # Predecir precio €/m2 para cada cuantil
-        pred_p10 = float(model_p10.predict(X_input)[0])
-        pred_p50 = float(model_p50.predict(X_input)[0])
-        pred_p90 = float(model_p90.predict(X_input)[0])
+        # Fila del modelo: base cacheada del distrito o del barrio + características del inmueble
+        # (las variables que falten quedan como NaN y el predictor usa sus valores por defecto)
+        X_input = build_inputs(
+            [etiqueta], feature_cols,
+            barrios=[barrio["BARRIO"]] if barrio is not None else None, props=inmueble,
+        )
+        if cached is not None:
+            preds, shap_vals = cached
+        else:
+            # Predecir precio €/m2 para los tres cuantiles en una sola pasada
+            preds, shap_vals = predictor.predict(X_input).iloc[0], None
+        pred_p10, pred_p50, pred_p90 = float(preds["p10"]), float(preds["p50"]), float(preds["p90"])
 
         # Calcular valor total según superficie
         total_p10 = pred_p10 * superficie
@@ -127,28 +187,28 @@ if st.button("Calcular Intervalos de Confianza", use_container_width=True):
             domain={'x':[0,1],'y':[0,1]}
         ))
         fig.update_layout(height=160, margin=dict(l=10,r=10,t=10,b=10))
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig, "calculadora_bandas", use_container_width=True)
 
         # Importancia de variables (si disponible)
         st.markdown("---")
         st.subheader("¿Qué variables pesan más en esta predicción?")
-        if shap_explainer is not None:
+        if shap_vals is None:
+            # El explicador se carga la primera vez que se necesita y se comparte entre sesiones
             try:
-                import shap
-                # shap_explainer puede recibir el DataFrame directamente
-                shap_values = shap_explainer(X_input)
-                # shap_values.values es un array (n_rows x n_features)
-                shap_vals = shap_values.values[0]
-                # Selecciona top 10 características por valor absoluto
-                abs_vals = np.abs(shap_vals)
-                top_idx = np.argsort(abs_vals)[-10:][::-1]
-                top_features = [feature_cols[i] for i in top_idx]
-                top_shap = shap_vals[top_idx]
-                fig_imp = px.bar(x=np.abs(top_shap)[::-1], y=[top_features[j] for j in range(len(top_features))][::-1], orientation="h",
-                                 title="Impacto de características (SHAP)")
-                st.plotly_chart(fig_imp, use_container_width=True)
+                explanation = bundle.explain(X_input)
+                if explanation is not None:
+                    shap_vals = explanation[0][0]
             except Exception as e:
                 st.write("No se pudieron calcular los valores SHAP: ", e)
+        if shap_vals is not None:
+            # Selecciona top 10 características por valor absoluto
+            abs_vals = np.abs(shap_vals)
+            top_idx = np.argsort(abs_vals)[-10:][::-1]
+            top_features = [feature_cols[i] for i in top_idx]
+            top_shap = shap_vals[top_idx]
+            fig_imp = px.bar(x=np.abs(top_shap)[::-1], y=[top_features[j] for j in range(len(top_features))][::-1], orientation="h",
+                             title="Impacto de características (SHAP)")
+            plotly_chart(fig_imp, "calculadora_shap", use_container_width=True)
         else:
             st.write("Las importancias de variables no están disponibles en este momento.")
 
@@ -157,3 +217,5 @@ if st.button("Calcular Intervalos de Confianza", use_container_width=True):
 # ==============================
 if st.button("⬅️ Volver al Asistente", use_container_width=True):
     st.switch_page("pages/1_Asistente.py")
+
+perf.end_rerun()
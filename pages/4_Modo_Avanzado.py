@@ -1,14 +1,17 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
-import plotly.graph_objects as go
-from utils.ui import inject_css
+from utils import perf
+from utils.ui import inject_css, plotly_chart
+from utils.data import DISTRICT_FEATURES_PATH, file_key, load_district_table
+from utils.exports import download_button
+from utils.analytics import METHODS, correlations
 
 # ==============================
 # Configuración inicial
 # ==============================
 st.set_page_config(page_title="Análisis avanzado", layout="wide", page_icon="🧭")
+perf.start_rerun("avanzado")
 inject_css()
 st.title("🔬 Análisis avanzado del mercado")
 
@@ -16,14 +19,19 @@ st.title("🔬 Análisis avanzado del mercado")
 # Cargar datos agregados de distrito
 # ==============================
 # Utilizamos el CSV con los indicadores agregados por distrito para los análisis
-df = pd.read_csv("data/district_features.csv")
+# (tabla compartida y cacheada, ya renombrada: distrito, precio_m2, variacion_pct, distrito_nombre)
+df_ren = load_district_table()
 
 st.caption(
     "🗂️ Dataset de indicadores agregados por distrito. Columnas como `PRECIO_EUR_M2`, `RENTA_NETA_PERSONA`, `PARADAS_METRO`, etc."
 )
 
-# Renombrar columnas clave para visualización sencilla
-df_ren = df.rename(columns={"PRECIO_EUR_M2": "precio_m2", "VARIACION_PCT": "variacion_pct"})
+# Correlaciones, ranking y figuras precalculados por versión del dataset (utils/analytics.py)
+metodo = st.radio(
+    "Tipo de correlación", list(METHODS), format_func=METHODS.get, horizontal=True,
+    help="Parcial: relación entre dos variables descontando el efecto del resto (orientativa con pocos distritos)."
+)
+analitica = correlations(metodo)
 
 # ==============================
 # Tabs de análisis
@@ -37,58 +45,40 @@ tab1, tab2, tab3 = st.tabs([
 # --- TAB 1: Correlaciones entre variables numéricas ---
 with tab1:
     st.subheader("Matriz de correlación (variables numéricas)")
-    # Seleccionar columnas numéricas con al menos alguna variación
-    num_cols = [c for c in df_ren.select_dtypes(include=[np.number]).columns if c not in {"precio_m2", "variacion_pct"}]
-    # Añadimos precio y variacion si existen
-    heat_df = df_ren[num_cols + ["precio_m2", "variacion_pct"]].copy()
-    corr = heat_df.corr()
-    heatmap = go.Figure(data=go.Heatmap(
-        z=corr.values,
-        x=corr.columns,
-        y=corr.index,
-        colorscale='Blues',
-        zmin=-1,
-        zmax=1,
-        colorbar=dict(title="Correlación")
-    ))
-    heatmap.update_layout(title="Matriz de correlaciones")
-    st.plotly_chart(heatmap, use_container_width=True)
+    # Variables numéricas con variación; figura cacheada compartida (st.plotly_chart no la modifica)
+    plotly_chart(analitica["heatmap"], "avanzado_correlaciones", use_container_width=True)
 
     st.subheader("Relación €/m² vs variación porcentual")
     fig_scatter = px.scatter(
         df_ren, x="precio_m2", y="variacion_pct",
-        text=df_ren["DISTRITO"].str.split(".").str[-1],
+        text="distrito_nombre",
         title="Relación precio medio €/m² vs variación porcentual",
         labels={"precio_m2": "€/m²", "variacion_pct": "Variación (%)"},
         color="variacion_pct", color_continuous_scale="RdYlGn"
     )
     fig_scatter.update_traces(textposition='top center')
-    st.plotly_chart(fig_scatter, use_container_width=True)
+    plotly_chart(fig_scatter, "avanzado_dispersion", use_container_width=True)
 
 # --- TAB 2: Correlación de características con el precio ---
 with tab2:
     st.subheader("Características con mayor correlación con el precio €/m²")
-    # Calcular la correlación absoluta de cada variable numérica con el precio
-    corr_with_price = df_ren.corr()["precio_m2"].drop("precio_m2").dropna()
-    corr_abs = corr_with_price.abs().sort_values(ascending=False)
-    top_corr = corr_abs.head(10)
-    fig_importance = px.bar(
-        x=top_corr.values[::-1],
-        y=[col for col in top_corr.index[::-1]],
-        orientation="h",
-        title="Top variables correlacionadas con €/m²"
-    )
-    st.plotly_chart(fig_importance, use_container_width=True)
+    # Ranking por correlación absoluta con el precio (sólo variables numéricas)
+    plotly_chart(analitica["ranking_fig"], "avanzado_ranking", use_container_width=True)
     st.info("Estas correlaciones indican la relación lineal entre cada variable y el precio promedio €/m². El valor absoluto muestra la fuerza de la relación.")
 
 # --- TAB 3: Descargas ---
 with tab3:
     st.subheader("Descargar datos de distrito")
-    st.write("Puedes descargar el CSV con todas las variables agregadas por distrito para tu propio análisis.")
+    st.write("Puedes descargar la tabla con todas las variables agregadas por distrito (CSV, CSV comprimido, Parquet o Excel) para tu propio análisis.")
     # Mostrar una vista previa del DataFrame
     st.dataframe(df_ren.head(20), use_container_width=True)
-    st.download_button(
-        "📥 Descargar CSV",
-        data=df_ren.to_csv(index=False).encode(),
-        file_name="district_features.csv"
+    # Bytes generados al pulsar y cacheados por versión del CSV (utils/exports.py)
+    download_button(
+        "📥 Descargar datos",
+        "district_features",
+        file_key(DISTRICT_FEATURES_PATH),
+        load_district_table,
+        file_name="district_features"
     )
+
+perf.end_rerun()
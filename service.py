@@ -0,0 +1,241 @@
+"""
+service.py — Servicio HTTP de valoración sin interfaz (P10/P50/P90).
+
+Expone los mismos modelos que la Calculadora (registro de `models/` con
+recarga en caliente, `utils/registry.py`) y la misma resolución de ubicación y
+características del inmueble que la valoración de cartera (`utils/portfolio.py`).
+Sólo usa la biblioteca estándar para el servidor HTTP.
+
+Las peticiones concurrentes se agrupan en micro-lotes (`utils/batching.py`):
+durante unos milisegundos se acumulan filas y el GBDT predice una matriz en
+lugar de fila a fila.
+
+    python service.py                          # http://127.0.0.1:8502
+    python service.py --port 9000 --max-wait-ms 2
+
+Endpoints:
+- `GET /health` -> estado y versión de los modelos.
+- `POST /valorar` -> un inmueble (objeto JSON) o varios (lista, o
+  `{"inmuebles": [...]}`). Campos como en el CSV de cartera: `distrito`,
+  `barrio` o `latitud`/`longitud`, `superficie`, `habitaciones`, `ascensor`,
+  `cerca_metro`, `antiguedad`.
+
+    curl -s localhost:8502/valorar -d '{"distrito": "Centro", "superficie": 85}'
+"""
+import argparse
+import json
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from utils.batching import MicroBatcher
+from utils.data import CATALOGO_PATH, DISTRICT_FEATURES_PATH, file_key
+from utils.portfolio import OUTPUT_COLUMNS, canonical_columns, lookup_tables, value_chunk
+from utils.registry import get_registry
+
+DEFAULT_PORT = 8502
+# Límites por petición
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_ITEMS = 10_000
+REQUEST_TIMEOUT_S = 30.0
+# Tipos JSON admitidos por campo canónico (null siempre se admite)
+FIELD_TYPES = {
+    "distrito": ("texto", (str,)),
+    "barrio": ("texto", (str,)),
+    "latitud": ("número", (int, float)),
+    "longitud": ("número", (int, float)),
+    "superficie": ("número", (int, float)),
+    "habitaciones": ("número", (int, float)),
+    "antiguedad": ("número", (int, float)),
+    "ascensor": ("booleano, texto o número", (bool, str, int, float)),
+    "cerca_metro": ("booleano, texto o número", (bool, str, int, float)),
+}
+
+
+# ==============================
+# Valoración por lotes
+# ==============================
+class Valuator:
+    """Función de lote del agrupador: valora un DataFrame con columnas canónicas."""
+
+    def __init__(self):
+        self._lookups_key = None
+        self._lookups = None
+
+    def lookups(self) -> tuple[dict, dict]:
+        # Tablas de nombres normalizados, recalculadas sólo si cambian los CSV
+        key = (file_key(DISTRICT_FEATURES_PATH), file_key(CATALOGO_PATH))
+        if key != self._lookups_key:
+            self._lookups, self._lookups_key = lookup_tables(), key
+        return self._lookups
+
+    def __call__(self, batch: pd.DataFrame) -> pd.DataFrame:
+        bundle = get_registry().get()
+        result = value_chunk(batch, bundle.predictor, self.lookups())
+        return result.assign(version=bundle.version)
+
+
+def parse_items(payload) -> tuple[pd.DataFrame, bool]:
+    """(inmuebles como DataFrame con columnas canónicas, True si era un único objeto)."""
+    single = isinstance(payload, dict) and "inmuebles" not in payload
+    if single:
+        items = [payload]
+    elif isinstance(payload, dict):
+        items = payload["inmuebles"]
+    else:
+        items = payload
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError("Se esperaba un objeto, una lista de objetos o {\"inmuebles\": [...]}")
+    if not items:
+        raise ValueError("No hay inmuebles que valorar")
+    if len(items) > MAX_ITEMS:
+        raise ValueError(f"Como máximo {MAX_ITEMS} inmuebles por petición")
+    frame = pd.DataFrame.from_records(items)
+    columns = canonical_columns(frame.columns)
+    check_types(items, columns)
+    return frame.rename(columns=columns), single
+
+
+def check_types(items: list[dict], columns: dict):
+    """ValueError (-> 400) si algún campo reconocido tiene un tipo JSON no admitido."""
+    for i, item in enumerate(items):
+        for key, value in item.items():
+            if value is None or key not in columns:
+                continue
+            label, allowed = FIELD_TYPES[columns[key]]
+            # bool es subclase de int: sólo vale donde se admite explícitamente
+            if not isinstance(value, allowed) or (isinstance(value, bool) and bool not in allowed):
+                where = f"inmueble {i}: " if len(items) > 1 else ""
+                raise ValueError(f"{where}'{key}' debe ser {label}, no {type(value).__name__}")
+
+
+def to_records(result: pd.DataFrame) -> list[dict]:
+    """Filas de salida como dicts JSON (NaN -> null, números nativos)."""
+    columns = [c for c in OUTPUT_COLUMNS if c in result]
+    out = result[columns].astype(object).where(result[columns].notna(), None)
+    records = out.to_dict("records")
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, np.generic):
+                record[key] = value.item()
+    return records
+
+
+# ==============================
+# HTTP
+# ==============================
+class ValuationHandler(BaseHTTPRequestHandler):
+    server_version = "SmartHousingValuation/1.0"
+    # El servidor asigna `batcher` y `valuator`
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/health":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "Ruta no encontrada"})
+            return
+        status = get_registry().status()
+        self._send_json(HTTPStatus.OK, {"status": "ok", **status, "batching": dict(self.server.batcher.stats)})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/valorar":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "Ruta no encontrada"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": "Cabecera Content-Length no válida"})
+            return
+        if length <= 0 or length > MAX_BODY_BYTES:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"Cuerpo vacío o mayor de {MAX_BODY_BYTES} bytes"})
+            return
+        try:
+            frame, single = parse_items(json.loads(self.rfile.read(length)))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"JSON no válido: {e}"})
+            return
+        except ValueError as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            return
+
+        t0 = time.perf_counter()
+        try:
+            result = self.server.batcher(frame, timeout=REQUEST_TIMEOUT_S)
+        except Exception as e:
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"No se pudo valorar: {e}"})
+            return
+        records = to_records(result)
+        version = result["version"].iat[0] if len(result) else None
+        body = {"version": version, "ms": round((time.perf_counter() - t0) * 1000, 2)}
+        body.update(records[0] if single else {"inmuebles": records})
+        self._send_json(HTTPStatus.OK, body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    max_batch: int = 1024,
+    max_wait_ms: float = 5.0,
+    quiet: bool = False,
+) -> ThreadingHTTPServer:
+    """
+    Crea el servidor (un hilo por conexión) con su agrupador. Con `port=0`
+    se elige un puerto libre (`server.server_address`), útil para pruebas
+    locales en el mismo proceso.
+    """
+    server = ThreadingHTTPServer((host, port), ValuationHandler)
+    server.daemon_threads = True
+    server.valuator = Valuator()
+    server.batcher = MicroBatcher(server.valuator, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    server.quiet = quiet
+    return server
+
+
+def serve_in_thread(**kwargs) -> tuple[ThreadingHTTPServer, threading.Thread]:
+    """Arranca el servidor en un hilo en segundo plano (para pruebas locales)."""
+    server = make_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, name="valuation-service", daemon=True)
+    thread.start()
+    return server, thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP de valoración P10/P50/P90.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch", type=int, default=1024, help="Filas máximas por micro-lote.")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="Espera máxima (ms) para completar un micro-lote desde la primera petición.")
+    parser.add_argument("--quiet", action="store_true", help="No registrar cada petición.")
+    args = parser.parse_args(argv)
+
+    # Carga síncrona de los modelos antes de aceptar peticiones
+    bundle = get_registry().get()
+    server = make_server(args.host, args.port, args.max_batch, args.max_wait_ms, args.quiet)
+    host, port = server.server_address[:2]
+    print(f"✅ Modelos {bundle.version[:12]} cargados · escuchando en http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import io
+import json
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from utils.prediction import QUANTILES  # noqa: E402
+
+# Variables de los pipelines de prueba (`quantile_models`)
+FEATURES = ["DISTRITO", "RENTA", "PARADAS"]
+# Variables (nombres del dataset) de los modelos de prueba de `models_dir`
+MODEL_FEATURES = ["DISTRITO", "TIPO_VIVIENDA", "RENTA_NETA_PERSONA", "PARADAS_METRO", "TIENE_METRO"]
+
+
+class ConstantPredictor:
+    """Predictor con la interfaz de `QuantilePredictor` y salida fija (100/200/300 €/m²)."""
+
+    def __init__(self, feature_cols):
+        self.feature_cols = list(feature_cols)
+        self.quantiles = list(QUANTILES)
+
+    def predict_unique(self, X: pd.DataFrame) -> pd.DataFrame:
+        values = np.tile([100.0, 200.0, 300.0], (len(X), 1))
+        return pd.DataFrame(values, columns=self.quantiles, index=X.index)
+
+
+@pytest.fixture
+def feature_cols():
+    with open(os.path.join(ROOT, "models", "feature_columns.json")) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def constant_predictor(feature_cols):
+    return ConstantPredictor(feature_cols)
+
+
+@pytest.fixture(scope="session")
+def quantile_models():
+    """Pipelines P10/P50/P90 pequeños (mismo esquema que train_quantiles.py) y sus datos."""
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({
+        "DISTRITO": rng.choice(["Centro", "Retiro", "Tetuán"], 300),
+        "RENTA": rng.normal(20_000, 5_000, 300),
+        "PARADAS": rng.integers(0, 10, 300).astype(float),
+    })
+    y = X["RENTA"] / 10 + X["PARADAS"] * 50 + X["DISTRITO"].map({"Centro": 900, "Retiro": 700, "Tetuán": 300})
+    out = {}
+    for q, alpha in (("p10", 0.1), ("p50", 0.5), ("p90", 0.9)):
+        prep = ColumnTransformer([
+            ("cat", OneHotEncoder(handle_unknown="ignore"), ["DISTRITO"]),
+            ("num", StandardScaler(), ["RENTA", "PARADAS"]),
+        ])
+        gb = GradientBoostingRegressor(loss="quantile", alpha=alpha, n_estimators=20, max_depth=3, random_state=0)
+        out[q] = Pipeline([("prep", prep), ("gb", gb)]).fit(X, y)
+    return out, X
+
+
+@pytest.fixture(scope="session")
+def models_dir(tmp_path_factory):
+    """
+    Directorio de modelos publicado (como `models/`) con pipelines pequeños
+    entrenados sobre las filas de entrada reales de distritos y perfiles.
+    """
+    from utils import features, registry
+
+    districts = features.district_base()["DISTRITO"]
+    X = pd.concat(
+        [features.build_inputs(districts, MODEL_FEATURES, props=props) for props in features.profile_grid(MODEL_FEATURES)],
+        ignore_index=True,
+    )
+    y = X["RENTA_NETA_PERSONA"] / 5 + X["PARADAS_METRO"] * 20 + (X["TIPO_VIVIENDA"] == "NUEVA") * 500
+    files = {"feature_columns.json": json.dumps(MODEL_FEATURES).encode()}
+    for q, alpha in (("p10", 0.1), ("p50", 0.5), ("p90", 0.9)):
+        prep = ColumnTransformer([
+            ("cat", OneHotEncoder(handle_unknown="ignore"), ["DISTRITO", "TIPO_VIVIENDA"]),
+            ("num", StandardScaler(), ["RENTA_NETA_PERSONA", "PARADAS_METRO", "TIENE_METRO"]),
+        ])
+        gb = GradientBoostingRegressor(loss="quantile", alpha=alpha, n_estimators=20, max_depth=3, random_state=0)
+        buffer = io.BytesIO()
+        joblib.dump(Pipeline([("prep", prep), ("gb", gb)]).fit(X, y), buffer)
+        files[registry.QUANTILE_FILES[q]] = buffer.getvalue()
+    path = tmp_path_factory.mktemp("models")
+    registry.publish(files, str(path))
+    return str(path)
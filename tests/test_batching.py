@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from service import parse_items
+from utils.batching import MicroBatcher
+
+
+def _double(batch: pd.DataFrame) -> pd.DataFrame:
+    if (batch["x"] < 0).any():
+        raise ValueError("x negativo")
+    return batch.assign(y=batch["x"] * 2)
+
+
+def test_failing_request_does_not_fail_its_batch():
+    batcher = MicroBatcher(_double, max_wait_ms=200)
+    try:
+        good = batcher.submit(pd.DataFrame({"x": [1, 2]}, index=[10, 11]))
+        bad = batcher.submit(pd.DataFrame({"x": [-1]}))
+        other = batcher.submit(pd.DataFrame({"x": [5]}))
+        assert good.result(5)["y"].tolist() == [2, 4]
+        assert good.result(5).index.tolist() == [10, 11]
+        assert other.result(5)["y"].tolist() == [10]
+        with pytest.raises(ValueError, match="x negativo"):
+            bad.result(5)
+    finally:
+        batcher.close()
+    assert batcher.stats["failed_batches"] == 1
+    assert batcher.stats["requests"] == 2
+
+
+def test_requests_share_a_batch():
+    batcher = MicroBatcher(_double, max_wait_ms=200)
+    try:
+        futures = [batcher.submit(pd.DataFrame({"x": [i]})) for i in range(5)]
+        assert [f.result(5)["y"].iat[0] for f in futures] == [0, 2, 4, 6, 8]
+    finally:
+        batcher.close()
+    assert batcher.stats["batches"] == 1
+
+
+@pytest.mark.parametrize("payload", [
+    {"distrito": 7},
+    {"distrito": "Centro", "superficie": "85"},
+    {"distrito": "Centro", "superficie": True},
+    [{"distrito": "Centro"}, {"latitud": [40.4], "longitud": -3.7}],
+])
+def test_parse_items_rejects_wrong_types(payload):
+    with pytest.raises(ValueError, match="debe ser"):
+        parse_items(payload)
+
+
+def test_parse_items_accepts_valid_fields():
+    frame, single = parse_items({"Distrito": "Centro", "Superficie": 85, "ascensor": True, "barrio": None})
+    assert single
+    assert frame.loc[0, "distrito"] == "Centro"
+    assert frame.loc[0, "superficie"] == 85
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from conftest import FEATURES
+from utils import compiled
+
+SOURCES = {"model_p10.pkl": "a", "model_p50.pkl": "b", "model_p90.pkl": "c"}
+
+
+@pytest.fixture
+def saved(quantile_models, tmp_path):
+    pipelines, X = quantile_models
+    ensemble = compiled.compile_models(pipelines, FEATURES)
+    path = str(tmp_path / compiled.COMPILED_NAME)
+    compiled.save(ensemble, path, SOURCES)
+    return path, pipelines, X
+
+
+def test_round_trip_is_memory_mapped_and_exact(saved):
+    path, pipelines, X = saved
+    ensemble = compiled.load(path, SOURCES, FEATURES)
+    assert ensemble is not None
+    assert isinstance(ensemble.value.base, np.memmap)
+    assert compiled.validate(ensemble, pipelines, X)
+
+
+def test_load_rejects_what_it_does_not_stand_in_for(saved, monkeypatch):
+    path, _, _ = saved
+    assert compiled.load(path, dict(SOURCES, **{"model_p50.pkl": "x"}), FEATURES) is None
+    assert compiled.load(path, SOURCES, FEATURES[::-1]) is None
+    import sklearn
+    monkeypatch.setattr(sklearn, "__version__", "0.0.0")
+    assert compiled.load(path, SOURCES, FEATURES) is None
+
+
+def test_load_rejects_truncated_file(saved):
+    path, _, _ = saved
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:len(data) - 1024])
+    assert compiled.load(path, SOURCES, FEATURES) is None
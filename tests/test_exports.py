@@ -0,0 +1,55 @@
+import gzip
+import io
+
+import pandas as pd
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+from utils import exports
+
+
+@pytest.mark.parametrize("fmt", exports.FILE_FORMATS)
+def test_open_file_streams_what_download_button_reads(tmp_path, monkeypatch, fmt):
+    monkeypatch.setattr(exports, "COPY_CHUNK", 64)  # varios bloques
+    path = tmp_path / "cartera.csv"
+    content = "".join(f"{i},Centro,{i * 1.5}\n" for i in range(500)).encode()
+    path.write_bytes(content)
+    with exports.open_file(str(path), fmt) as f:
+        data, _ = convert_data_to_bytes_and_infer_mime(f, unsupported_error=TypeError(type(f)))
+    assert (gzip.decompress(data) if fmt == "csv.gz" else data) == content
+
+
+def test_gzip_stream_is_reproducible(tmp_path):
+    path = tmp_path / "cartera.csv"
+    path.write_bytes(b"a,b\n1,2\n" * 1000)
+    with exports.open_file(str(path), "csv.gz") as a, exports.open_file(str(path), "csv.gz") as b:
+        assert a.read() == b.read()
+
+
+@pytest.mark.parametrize("fmt", exports.FORMATS)
+def test_to_bytes_round_trips(fmt):
+    frame = pd.DataFrame({"distrito": ["Centro", "Retiro"], "p50": [4500.5, 4000.25]})
+    data = exports.to_bytes(frame, fmt)
+    readers = {
+        "csv": pd.read_csv,
+        "csv.gz": lambda f: pd.read_csv(f, compression="gzip"),
+        "parquet": pd.read_parquet,
+        "xlsx": pd.read_excel,
+    }
+    result = readers[fmt](io.BytesIO(data))
+    pd.testing.assert_frame_equal(result, frame, check_dtype=False)
+
+
+def test_artifact_is_built_once_per_version():
+    builds = []
+
+    def build():
+        builds.append(1)
+        return pd.DataFrame({"x": [len(builds)]})
+
+    first = exports.artifact("test_exportacion", 1, build)
+    assert exports.artifact("test_exportacion", 1, build) == first
+    assert len(builds) == 1
+    second = exports.lazy("test_exportacion", 2, build)
+    assert not builds[1:]  # diferido: nada se construye hasta llamarlo
+    assert second() != first and len(builds) == 2
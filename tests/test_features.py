@@ -0,0 +1,31 @@
+import json
+import os
+
+from conftest import ROOT
+from utils.features import apply_property, district_base, property_columns
+
+
+def test_property_columns_of_training_columns():
+    # Columnas de `train_quantiles.py`: sin paradas de metro ni columnas directas
+    with open(os.path.join(ROOT, "data_columns.json")) as f:
+        columns = property_columns(json.load(f))
+    assert columns["antiguedad"] == ["TIPO_VIVIENDA"]
+    assert columns["cerca_metro"] == []
+    assert columns["habitaciones"] == [] and columns["ascensor"] == []
+
+
+def test_property_columns_follow_source_aliases(feature_cols):
+    columns = property_columns(["PARADAS_METRO_x", "HABITACIONES"])
+    assert columns["cerca_metro"] == []
+    assert columns["habitaciones"] == ["HABITACIONES"]
+    assert property_columns(feature_cols)["cerca_metro"] == ["TIENE_METRO"]
+
+
+def test_apply_property_keeps_zone_aggregates():
+    rows = district_base().iloc[:3]
+    zona = ["PARADAS_METRO", "PARADAS_TOTAL", "DENSIDAD_PARADAS", "PRECIO_TURISMOxMETRO"]
+    for metro in ("Sí", "No"):
+        out = apply_property(rows, {"habitaciones": 2, "ascensor": "Sí", "cerca_metro": metro, "antiguedad": 40})
+        assert out[zona].equals(rows[zona])
+        assert (out["TIENE_METRO"] == (1.0 if metro == "Sí" else 0.0)).all()
+        assert (out["TIPO_VIVIENDA"] == "USADA").all()
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import forecast
+
+
+@pytest.fixture(scope="module")
+def payload():
+    return forecast.build_forecast_table(save=False)
+
+
+def test_projection_shape_and_order(payload):
+    params, table = payload["params"], payload["forecast"]
+    months = forecast.HORIZON_MONTHS + 1
+    assert len(table) == len(params) * months
+    assert (table.groupby("DISTRITO")["mes"].agg(list) == [list(range(months))] * len(params)).all()
+    assert np.isfinite(table[["p10", "p50", "p90"]].to_numpy()).all()
+    assert ((table["p10"] <= table["p50"]) & (table["p50"] <= table["p90"])).all()
+    # Mes 0: el último precio observado, sin banda
+    start = table[table["mes"] == 0].set_index("DISTRITO")
+    for q in ("p10", "p50", "p90"):
+        assert start[q].to_numpy() == pytest.approx(params.loc[start.index, "ultimo"].to_numpy())
+
+
+def test_bands_widen_with_horizon(payload):
+    width = payload["forecast"].assign(ancho=lambda t: t["p90"] / t["p10"]).pivot(
+        index="mes", columns="DISTRITO", values="ancho",
+    )
+    assert (width.diff().iloc[1:] >= 0).all().all()
+
+
+def test_fit_shrinks_towards_city_drift():
+    years = list(range(2015, 2025))
+    history = pd.DataFrame(
+        [1000 * 1.10 ** np.arange(10), 1000 * 1.02 ** np.arange(10)],
+        index=["01. Rápido", "02. Lento"], columns=years,
+    )
+    params = forecast.fit(history)
+    assert params["periodo"].tolist() == [2024, 2024]
+    assert params["n"].tolist() == [9, 9]
+    city = np.log([1.10, 1.02]).mean()
+    assert np.log(1.02) < params.loc["02. Lento", "mu"] < city < params.loc["01. Rápido", "mu"] < np.log(1.10)
+
+    rows = forecast.project(params, horizon_months=12)
+    assert rows.loc[rows["mes"] == 12, "p50"].to_numpy() == pytest.approx(
+        history[2024].to_numpy() * np.exp(params["mu"].to_numpy())
+    )
+
+
+def test_queries_accept_short_names(payload, monkeypatch):
+    monkeypatch.setattr(forecast, "forecast_table", lambda: payload)
+    rows = forecast.projection("Centro", months=12)
+    assert rows["mes"].tolist() == list(range(13))
+    assert forecast.history("01. Centro").index.max() == forecast.start_period()
+    assert forecast.projection("No existe") is None
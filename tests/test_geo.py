@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import geo
+from utils.data import load_catalogo, load_district_table
+
+
+@pytest.mark.parametrize("level", geo.LEVELS)
+def test_layer_keys_match_datasets(level):
+    layer = geo.load_layer(level, zoom=10)
+    props = pd.DataFrame([f["properties"] for f in layer["features"]])
+    assert set(props["DISTRITO"]) == set(load_district_table()["distrito"])
+    if level == "barrio":
+        assert set(props["BARRIO"]) <= set(load_catalogo()["BARRIO"])
+        assert props["BARRIO"].is_unique
+
+
+def test_simplification_keeps_endpoints():
+    full = geo.polygons("distrito")
+    simple = geo.polygons("distrito", geo.tolerance_for_zoom(0))
+    assert len(full) == len(simple)
+    ring, ring_simple = full[0][1][0][0], simple[0][1][0][0]
+    assert len(ring_simple) < len(ring)
+    assert np.array_equal(ring_simple[[0, -1]], ring[[0, -1]])
+
+
+def test_choropleth_by_barrio():
+    catalogo = load_catalogo()
+    values = pd.Series(np.arange(len(catalogo), dtype=float), index=catalogo["BARRIO"])
+    layer = geo.choropleth(values.iloc[1:], level="barrio", zoom=10, key_column="BARRIO", value_format="{:.0f}")
+    by_barrio = {f["properties"]["BARRIO"]: f["properties"] for f in layer["features"]}
+    first, second = values.index[0], values.index[1]
+    assert by_barrio[first]["value"] is None and by_barrio[first]["value_label"] == "s/d"
+    assert by_barrio[second]["value"] == values[second]
+    assert by_barrio[second]["value_label"] == f"{values[second]:.0f}"
+    assert by_barrio[values.index[-1]]["fill_color"][:3] == list(geo.COLOR_HIGH)
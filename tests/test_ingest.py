@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import ingest
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(ingest, "CACHE_DIR", str(tmp_path / ".cache"))
+    return tmp_path
+
+
+def _write(path, frame: pd.DataFrame, mtime_ns: int):
+    frame.to_csv(path, index=False)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_optimize_dtypes_is_lossless():
+    frame = pd.DataFrame({
+        "entero": [1, 2, 300],
+        "exacto": [0.5, 2.25, np.nan],
+        "inexacto": [0.1, 2.2, 1e-9],
+        "texto": ["NUEVA", "USADA", "NUEVA"],
+    })
+    out = ingest.optimize_dtypes(frame)
+    assert out["entero"].dtype == np.int16
+    assert out["exacto"].dtype == np.float32
+    assert out["inexacto"].dtype == np.float64
+    assert isinstance(out["texto"].dtype, pd.CategoricalDtype)
+    for col in frame:
+        assert out[col].astype(frame[col].dtype).equals(frame[col])
+
+
+def test_cache_rebuilds_when_source_changes(data_dir, monkeypatch):
+    source = data_dir / f"{ingest.DATASET_NAME}.csv"
+    frame = pd.DataFrame({"BARRIO": ["011. Palacio", "012. Embajadores"], "PRECIO_EUR_M2": [4500.5, 4000.25]})
+    _write(source, frame, 1_000_000_000_000_000_000)
+    builds = []
+    build_cache = ingest.build_cache
+    monkeypatch.setattr(ingest, "build_cache", lambda *a: builds.append(a) or build_cache(*a))
+
+    first = ingest.load_dataset()
+    assert len(builds) == 1
+    assert first["PRECIO_EUR_M2"].tolist() == frame["PRECIO_EUR_M2"].tolist()
+    assert first["BARRIO"].astype(str).tolist() == frame["BARRIO"].tolist()
+
+    # Misma fecha: se lee la caché
+    ingest.load_dataset()
+    assert len(builds) == 1
+    # Sólo cambia la fecha (mismo contenido): se actualiza la huella sin regenerar
+    os.utime(source, ns=(1_000_000_001_000_000_000,) * 2)
+    ingest.load_dataset()
+    assert len(builds) == 1
+    assert ingest.read_schema()["source"]["mtime_ns"] == 1_000_000_001_000_000_000
+
+    # Contenido nuevo con otra fecha: se regenera
+    _write(source, frame.assign(PRECIO_EUR_M2=[5000.5, 4100.25]), 1_000_000_002_000_000_000)
+    changed = ingest.load_dataset()
+    assert len(builds) == 2
+    assert changed["PRECIO_EUR_M2"].tolist() == [5000.5, 4100.25]
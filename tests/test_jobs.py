@@ -0,0 +1,38 @@
+import json
+import subprocess
+import sys
+import time
+
+from utils import jobs
+
+# Referencias a los Popen de prueba: si se destruyen, subprocess recoge el hijo por su cuenta
+_children = []
+
+
+def _exited_child(register: bool) -> int:
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    _children.append(proc)
+    if register:
+        jobs._runners[proc.pid] = proc
+    # Esperar a que termine sin recogerlo (queda como zombi)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        with open(f"/proc/{proc.pid}/stat") as f:
+            if f.read().split(")")[-1].split()[0] == "Z":
+                break
+        time.sleep(0.01)
+    return proc.pid
+
+
+def test_exited_runner_is_not_alive():
+    assert not jobs._pid_alive(_exited_child(register=True))
+    assert not jobs._pid_alive(_exited_child(register=False))
+
+
+def test_zombie_job_is_marked_failed(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(jobs, "STATE_PATH", str(tmp_path / "train.json"))
+    monkeypatch.setattr(jobs, "LOCK_PATH", str(tmp_path / "train.lock"))
+    state = {"id": "j1", "status": "running", "created_at": time.time() - 60, "pid": _exited_child(register=False)}
+    (tmp_path / "train.json").write_text(json.dumps(state))
+    assert jobs.get_job()["status"] == "failed"
@@ -0,0 +1,14 @@
+import numpy as np
+import pandas as pd
+
+from utils import perf
+
+
+def test_sizeof_uses_buffers_and_samples_containers():
+    frame = pd.DataFrame({"a": np.zeros(1000), "b": np.ones(1000)})
+    assert perf.sizeof(frame) >= 16_000
+    assert perf.sizeof(np.zeros(500)) == 4000
+    items = [np.zeros(10)] * 10_000
+    # Se muestrean SIZEOF_SAMPLE elementos y se extrapola al resto
+    assert perf.sizeof(items) >= 10_000 * 80
+    assert perf.sizeof({"x": frame}) > perf.sizeof(frame)
@@ -0,0 +1,46 @@
+import io
+
+import pandas as pd
+import pytest
+
+from utils.portfolio import TEMPLATE, value_csv
+
+
+def _value(frame: pd.DataFrame, predictor, chunksize: int) -> tuple[dict, pd.DataFrame]:
+    out = io.StringIO()
+    summary = value_csv(io.StringIO(frame.to_csv(index=False)), out, predictor, chunksize=chunksize)
+    out.seek(0)
+    return summary, pd.read_csv(out, keep_default_na=False, na_values=[""])
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 10_000])
+def test_template_is_valued(constant_predictor, chunksize):
+    # Con bloques de 1 fila, la de sólo coordenadas forma un bloque sin barrios conocidos
+    summary, result = _value(TEMPLATE, constant_predictor, chunksize)
+    assert summary["rows"] == len(TEMPLATE)
+    assert summary["errors"] == 0
+    assert result["DISTRITO"].notna().all()
+    assert result.loc[0, "BARRIO"].endswith("Palacio")
+    assert pd.notna(result.loc[2, "BARRIO"])  # resuelto por coordenadas
+    assert (result["total_p50"] == TEMPLATE["superficie"] * 200.0).all()
+
+
+@pytest.mark.parametrize("chunksize", [1, 10_000])
+def test_unknown_barrio_and_location(constant_predictor, chunksize):
+    extra = pd.DataFrame({
+        "distrito": ["", "Retiro", "Atlántida"],
+        "barrio": ["Barrio Inventado", "Barrio Inventado", ""],
+        "superficie": [70, 80, 90],
+    })
+    summary, result = _value(pd.concat([TEMPLATE, extra], ignore_index=True), constant_predictor, chunksize)
+    n = len(TEMPLATE)
+    assert summary["rows"] == n + 3
+    assert summary["errors"] == 2
+    # Sin distrito y con barrio desconocido: fila sin valorar, con su error
+    assert result.loc[n, "error"] == "distrito no reconocido"
+    assert pd.isna(result.loc[n, "p50"])
+    # Barrio desconocido en un distrito conocido: se valora con el barrio de referencia
+    assert result.loc[n + 1, "DISTRITO"].endswith("Retiro")
+    assert pd.isna(result.loc[n + 1, "BARRIO"])
+    assert result.loc[n + 1, "p50"] == 200.0
+    assert result.loc[n + 2, "error"] == "distrito no reconocido"
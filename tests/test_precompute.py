@@ -0,0 +1,54 @@
+import shutil
+
+import joblib
+import pytest
+
+from utils import features, precompute
+
+
+@pytest.fixture
+def table_dir(models_dir, tmp_path, monkeypatch):
+    # Copias propias de los modelos y del CSV de distritos: el test los modifica
+    path = tmp_path / "models"
+    shutil.copytree(models_dir, path)
+    csv = tmp_path / "district_features.csv"
+    shutil.copy(precompute.DISTRICT_FEATURES_PATH, csv)
+    monkeypatch.setattr(precompute, "DISTRICT_FEATURES_PATH", str(csv))
+    precompute.build_prediction_table(str(path), with_shap=False)
+    return path, csv
+
+
+def test_lookup_hits_known_district_and_barrio(table_dir):
+    path, _ = table_dir
+    payload = precompute.load_prediction_table(str(path))
+    assert payload is not None
+    models = {q: joblib.load(path / f"model_{q}.pkl") for q in ("p10", "p50", "p90")}
+
+    for distrito, barrio in (("Centro", None), ("Centro", "Palacio"), ("Retiro", "Los Jerónimos")):
+        row, shap_values = precompute.lookup(payload, distrito, barrio)
+        assert shap_values is None
+        assert (row["distrito_nombre"], row["nivel"]) == (distrito, "distrito" if barrio is None else "barrio")
+        X = features.build_inputs([row["DISTRITO"]], payload["feature_cols"], barrios=[row["BARRIO"]])
+        for q, model in models.items():
+            assert row[q] == pytest.approx(model.predict(X)[0])
+
+    perfil = features.profile(dict(features.PROPERTY_DEFAULTS, antiguedad=1, cerca_metro="No"))
+    row, _ = precompute.lookup(payload, "Centro", perfil=perfil)
+    assert (row["TIPO_VIVIENDA"], row["TIENE_METRO"]) == ("NUEVA", 0.0)
+    assert precompute.lookup(payload, "No existe") is None
+    assert precompute.lookup(payload, "Centro", "No existe") is None
+
+
+def test_fingerprint_invalidates_table(table_dir):
+    path, csv = table_dir
+    assert precompute.load_prediction_table(str(path)) is not None
+    # Cambia el CSV de entrada
+    with open(csv, "a", encoding="utf-8") as f:
+        f.write("\n")
+    assert precompute.load_prediction_table(str(path)) is None
+
+    precompute.build_prediction_table(str(path), with_shap=False)
+    assert precompute.load_prediction_table(str(path)) is not None
+    # Cambia un modelo
+    shutil.copy(path / "model_p90.pkl", path / "model_p50.pkl")
+    assert precompute.load_prediction_table(str(path)) is None
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from conftest import FEATURES
+from utils import compiled
+from utils.prediction import COMPILED_MAX_ROWS, QUANTILES, QuantilePredictor
+
+
+@pytest.fixture(params=["sklearn", "compiled"])
+def predictor(request, quantile_models):
+    pipelines, _ = quantile_models
+    ensemble = compiled.compile_models(pipelines, FEATURES) if request.param == "compiled" else None
+    return QuantilePredictor(pipelines, FEATURES, ensemble)
+
+
+@pytest.mark.parametrize("n", [1, COMPILED_MAX_ROWS + 1, 300])
+def test_predict_matches_each_pipeline(predictor, quantile_models, n):
+    pipelines, X = quantile_models
+    X = X.head(n)
+    preds = predictor.predict(X)
+    assert list(preds.columns) == list(QUANTILES)
+    assert preds.index.equals(X.index)
+    for q in QUANTILES:
+        assert preds[q].to_numpy() == pytest.approx(pipelines[q].predict(X))
+
+
+def test_missing_numeric_values_use_training_mean(predictor, quantile_models):
+    pipelines, X = quantile_models
+    X = X.head(5).copy()
+    X.loc[X.index[:2], "RENTA"] = np.nan
+    filled = X.fillna({"RENTA": pipelines["p50"]["prep"].named_transformers_["num"].mean_[0]})
+    preds = predictor.predict(X)
+    for q in QUANTILES:
+        assert preds[q].to_numpy() == pytest.approx(pipelines[q].predict(filled))
+    # Una columna ausente se rellena igual
+    sin_paradas = predictor.predict(X.drop(columns="PARADAS"))
+    assert np.isfinite(sin_paradas.to_numpy()).all()
+
+
+def test_predict_unique_reuses_repeated_rows(predictor, quantile_models):
+    _, X = quantile_models
+    repeated = X.iloc[[0, 1, 0, 1, 2]].reset_index(drop=True)
+    unique = predictor.predict_unique(repeated)
+    assert unique.to_numpy() == pytest.approx(predictor.predict(repeated).to_numpy())
@@ -0,0 +1,63 @@
+import io
+import json
+
+import joblib
+import pytest
+
+from conftest import FEATURES
+from utils import registry
+from utils.registry import ModelRegistry, load_bundle, publish, write_manifest
+
+
+def _artifacts(pipelines: dict) -> dict[str, bytes]:
+    files = {"feature_columns.json": json.dumps(FEATURES).encode()}
+    for q, name in registry.QUANTILE_FILES.items():
+        buffer = io.BytesIO()
+        joblib.dump(pipelines[q], buffer)
+        files[name] = buffer.getvalue()
+    return files
+
+
+def test_registry_reloads_after_publish(quantile_models, tmp_path):
+    pipelines, X = quantile_models
+    publish(_artifacts(pipelines), str(tmp_path))
+    models = ModelRegistry(str(tmp_path))
+    first = models.get()
+
+    # Otra versión: P50 sustituido por el pipeline P90
+    publish(_artifacts(dict(pipelines, p50=pipelines["p90"])), str(tmp_path))
+    assert models.get() is first  # la recarga va en segundo plano
+    models.wait()
+    second = models.get()
+    assert second.version != first.version
+    p50 = second.predictor.predict_unique(X[FEATURES].head(5))["p50"].to_numpy()
+    assert p50 == pytest.approx(pipelines["p90"].predict(X[FEATURES].head(5)))
+
+
+def test_registry_keeps_old_bundle_during_publish(quantile_models, tmp_path):
+    pipelines, _ = quantile_models
+    publish(_artifacts(pipelines), str(tmp_path))
+    models = ModelRegistry(str(tmp_path))
+    first = models.get()
+
+    # Publicación a medias: un artefacto nuevo pero el manifiesto aún es el anterior
+    nuevo = _artifacts(dict(pipelines, p50=pipelines["p90"]))["model_p50.pkl"]
+    registry._atomic_write(str(tmp_path / "model_p50.pkl"), nuevo)
+    assert models.get() is first
+    models.wait()
+    assert models.get() is first
+    assert "en curso" in models.last_error
+
+    write_manifest(str(tmp_path))
+    models.get()
+    models.wait()
+    assert models.get().version != first.version
+
+
+def test_load_bundle_without_artifacts(quantile_models, tmp_path):
+    pipelines, _ = quantile_models
+    publish(_artifacts(pipelines), str(tmp_path))
+    for name in registry.ARTIFACT_FILES:
+        (tmp_path / name).unlink(missing_ok=True)
+    with pytest.raises(RuntimeError, match="No hay artefactos"):
+        load_bundle(str(tmp_path))
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from conftest import ConstantPredictor
+from utils import scoring
+
+
+@pytest.mark.parametrize("level", scoring.LEVELS)
+def test_rank_follows_weights(level):
+    barato = scoring.rank({"Precio bajo": 1.0}, level=level)
+    assert barato["precio_m2"].is_monotonic_increasing
+    inversion = scoring.rank({"Inversión": 1.0}, level=level)
+    assert inversion["variacion_pct"].is_monotonic_decreasing
+    # Más peso al precio: las zonas caras bajan en la clasificación
+    mezcla = scoring.rank({"Precio bajo": 3.0, "Inversión": 1.0}, level=level)
+    assert mezcla["precio_m2"].iloc[0] < mezcla["precio_m2"].iloc[-1]
+
+
+def test_scores_are_normalized():
+    Z = np.array([[0.0, 1.0], [1.0, 0.0], [0.5, 0.5]])
+    w = np.array([1.0, -1.0])
+    assert scoring.scores(Z, w) == pytest.approx([0.0, 1.0, 0.5])
+    assert scoring.scores(Z, np.zeros(2)) == pytest.approx([0.5, 0.5, 0.5])
+
+
+@pytest.mark.parametrize("columns, expected", [([], None), (["HABITACIONES"], 3)])
+def test_predicted_p50_key_only_has_used_habitaciones(monkeypatch, feature_cols, columns, expected):
+    bundle = SimpleNamespace(
+        version="v1", feature_cols=feature_cols + columns, predictor=ConstantPredictor(feature_cols + columns),
+    )
+    monkeypatch.setattr(scoring, "get_registry", lambda: SimpleNamespace(get=lambda: bundle))
+    calls = []
+    monkeypatch.setattr(scoring, "_predicted_p50", lambda *args: calls.append(args) or np.zeros(1))
+    scoring.predicted_p50(3)
+    assert calls[0][-1] == expected
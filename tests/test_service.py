@@ -0,0 +1,57 @@
+import http.client
+import json
+
+import pytest
+
+import service
+from utils import registry
+from utils.features import build_inputs
+
+
+@pytest.fixture
+def server(models_dir, monkeypatch):
+    monkeypatch.setattr(service, "get_registry", lambda: registry.get_registry(models_dir))
+    server, thread = service.serve_in_thread(port=0, quiet=True, max_wait_ms=20)
+    yield server
+    server.shutdown()
+    server.server_close()
+    server.batcher.close()
+    thread.join(5)
+
+
+def _request(server, method: str, path: str, body: bytes | None = None, headers: dict | None = None):
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=30)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_post_values_properties_end_to_end(server, models_dir):
+    payload = [
+        {"distrito": "Centro", "barrio": "Palacio", "superficie": 80},
+        {"latitud": 40.4153, "longitud": -3.6845, "superficie": 100},
+    ]
+    status, body = _request(server, "POST", "/valorar", json.dumps(payload).encode())
+    assert status == 200
+    bundle = registry.load_bundle(models_dir)
+    assert body["version"] == bundle.version
+    palacio, jeronimos = body["inmuebles"]
+    assert jeronimos["BARRIO"] == "035. Los Jerónimos"
+    X = build_inputs(["01. Centro"], bundle.feature_cols, barrios=["011. Palacio"])
+    expected = bundle.predictor.predict(X).iloc[0]
+    assert palacio["p50"] == pytest.approx(expected["p50"])
+    assert palacio["total_p50"] == pytest.approx(expected["p50"] * 80)
+    assert palacio["p10"] <= palacio["p50"] <= palacio["p90"]
+
+    status, body = _request(server, "GET", "/health")
+    assert status == 200 and body["version"] == bundle.version
+
+
+@pytest.mark.parametrize("headers", [{"Content-Length": "abc"}, {"Content-Length": "0"}])
+def test_post_rejects_bad_content_length(server, headers):
+    status, body = _request(server, "POST", "/valorar", headers=headers)
+    assert status == 400
+    assert "error" in body
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from utils import geo, spatial
+
+
+@pytest.mark.parametrize("lat, lon, barrio", [
+    (40.4169, -3.7035, "016. Sol"),             # Puerta del Sol
+    (40.4180, -3.7144, "011. Palacio"),         # Palacio Real
+    (40.4153, -3.6845, "035. Los Jerónimos"),   # Parque del Retiro
+])
+def test_locate_point_known_places(lat, lon, barrio):
+    found = spatial.locate_point(lat, lon)
+    assert found["BARRIO"] == barrio
+    assert found["DISTRITO"].split(".")[0] == barrio[:2]
+
+
+@pytest.mark.parametrize("lat, lon", [(41.3851, 2.1734), (40.30, -3.90), (0.0, 0.0)])
+def test_locate_point_outside_madrid(lat, lon):
+    assert spatial.locate_point(lat, lon) is None
+
+
+def test_grid_matches_brute_force():
+    # Con una sola celda se prueban todos los barrios para cada punto
+    index = spatial.barrio_index()
+    shapes = [shape for _, shape in geo.polygons("barrio")]
+    brute = spatial.BarrioIndex(shapes, index.keys, grid_size=1)
+    rng = np.random.default_rng(0)
+    lon = rng.uniform(index.bounds[:, 0].min(), index.bounds[:, 2].max(), 3000)
+    lat = rng.uniform(index.bounds[:, 1].min(), index.bounds[:, 3].max(), 3000)
+    ids = index.locate_ids(lat, lon)
+    assert (ids >= 0).any() and (ids < 0).any()
+    assert np.array_equal(ids, brute.locate_ids(lat, lon))
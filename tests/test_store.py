@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from utils.features import barrio_base, district_base
+from utils.store import ZoneStore
+
+
+@pytest.fixture(scope="module")
+def store():
+    return ZoneStore(district_base(), barrio_base())
+
+
+def test_district_lookups(store):
+    for key in ("01. Centro", "Centro"):
+        assert store.district_label(key) == "01. Centro"
+        assert store.district_name(key) == "Centro"
+        assert store.district(key)["distrito_nombre"] == "Centro"
+    assert store.district("No existe") is None
+    assert store.district_label("No existe") is None
+
+
+def test_barrio_lookups(store):
+    row = store.barrio("Palacio")
+    assert row["BARRIO"] == "011. Palacio"
+    assert store.barrio("011. Palacio", "Centro")["barrio_nombre"] == "Palacio"
+    assert store.barrio("Palacio", "01. Centro") is not None
+    assert store.barrio("Palacio", "Retiro") is None  # no pertenece al distrito
+    assert store.barrio("No existe") is None
+    assert row["PRECIO_EUR_M2"] == barrio_base().loc["011. Palacio", "PRECIO_EUR_M2"]
+
+
+def test_barrios_of_district_are_contiguous(store):
+    base = barrio_base()
+    for distrito in ("Centro", "05. Chamartín", "Vicálvaro"):
+        barrios = store.barrios_of(distrito)
+        label = store.district_label(distrito)
+        assert set(barrios["BARRIO"].astype(str)) == set(base.loc[base["DISTRITO"] == label, "BARRIO"])
+        assert (barrios["DISTRITO"] == label).all()
+    assert store.barrios_of("No existe").empty
+    assert store.offsets[-1] == len(store.barrios)
+
+
+def test_barrio_positions_batch(store):
+    labels = ["012. Embajadores", "No existe", "011. Palacio"]
+    positions = store.barrio_positions(labels)
+    assert positions[1] == -1
+    assert store.barrios["BARRIO"].iloc[positions[[0, 2]]].astype(str).tolist() == [labels[0], labels[2]]
+    assert np.array_equal(positions[[0, 2]], [store.barrio_position(labels[0]), store.barrio_position(labels[2])])
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from utils import treeshap
+from utils.features import build_inputs
+from utils.prediction import split_pipeline
+from utils.registry import load_bundle
+
+
+def test_treeshap_is_additive(quantile_models):
+    pipelines, X = quantile_models
+    prep, regressor = split_pipeline(pipelines["p50"])
+    Xt = np.asarray(prep.transform(X.head(20)), dtype=np.float32)
+    explainer = treeshap.TreeShapExplainer(regressor)
+    values = explainer.shap_values(Xt)
+    assert values.shape == Xt.shape
+    assert explainer.expected_value + values.sum(axis=1) == pytest.approx(regressor.predict(Xt))
+
+
+def test_treeshap_matches_shap_package(quantile_models):
+    shap = pytest.importorskip("shap")
+    pipelines, X = quantile_models
+    prep, regressor = split_pipeline(pipelines["p50"])
+    Xt = np.asarray(prep.transform(X.head(20)), dtype=np.float32)
+    expected = shap.TreeExplainer(regressor)(Xt).values
+    assert treeshap.TreeShapExplainer(regressor).shap_values(Xt) == pytest.approx(expected, abs=1e-6)
+
+
+def test_bundle_explainer_is_lazy_and_shared(models_dir, monkeypatch):
+    monkeypatch.delenv("SMARTHOUSING_SHAP", raising=False)
+    bundle = load_bundle(models_dir)
+    assert bundle._explainer is None  # no se crea al cargar la versión
+
+    X = build_inputs(["01. Centro", "03. Retiro"], bundle.feature_cols)
+    values, base = bundle.explain(X)
+    kind, explainer = bundle.explainer()
+    assert kind == "lite"
+    assert bundle.explainer()[1] is explainer
+    # Contribuciones agregadas por variable original: suman la predicción P50
+    assert values.shape == (2, len(bundle.feature_cols))
+    assert base + values.sum(axis=1) == pytest.approx(bundle.predictor.predict(X)["p50"].to_numpy())
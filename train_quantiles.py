@@ -1,86 +1,289 @@
-
 """
 train_quantiles.py — Entrena modelos cuantílicos P10/P50/P90 y guarda artefactos:
 - models/feature_columns.json
 - models/preprocessor.pkl (ColumnTransformer)
 - models/model_p10.pkl, models/model_p50.pkl, models/model_p90.pkl
 - (opcional) models/shap_explainer.pkl
-Usa vivienda_imputada.xlsx y columns.json (features) de tu repo original.
+- (opcional) models/compiled_ensemble.bin (ensemble compilado, mapeable en memoria)
+- (opcional) models/prediction_table.pkl (tabla precalculada para la Calculadora)
+Usa vivienda_imputada.xlsx y columns.json (features) de tu repo original. El dataset se
+lee desde la caché Parquet tipada de utils/ingest.py (regenerada si el origen cambió).
+
+El preprocesado (ColumnTransformer) se ajusta una sola vez y los tres
+regresores cuantílicos se entrenan en paralelo en un pool de procesos:
+
+    python train_quantiles.py              # un proceso por cuantil (hasta 3)
+    python train_quantiles.py --jobs 1     # secuencial
+
+Backends de GBDT cuantílico (--backend):
+- gbr: GradientBoostingRegressor sobre one-hot + escalado (por defecto).
+- hgb: HistGradientBoostingRegressor(loss='quantile') con tratamiento
+  categórico nativo de DISTRITO/BARRIO/TIPO_VIVIENDA (OrdinalEncoder).
+
+    python train_quantiles.py --backend hgb
+    python train_quantiles.py --compare    # informe gbr vs hgb (models/backend_report.json)
 """
-import json, joblib, numpy as np, pandas as pd
+import argparse, json, os, time, joblib, numpy as np, pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from sklearn.ensemble import GradientBoostingRegressor
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.metrics import mean_absolute_error, mean_pinball_loss, mean_squared_error, r2_score
+from utils.ingest import load_dataset
+from utils.compiled import COMPILED_NAME
+from utils.registry import build_compiled, write_manifest
 
-DATA_XLS = 'data/vivienda_imputada.xlsx'
 COLUMNS_JSON_ORIG = 'data_columns.json'   # copia de columns.json original
 OUT_DIR = Path('models')
-OUT_DIR.mkdir(exist_ok=True)
+TARGET = 'PRECIO_EUR_M2_x'
+ALPHAS = {'p10': 0.10, 'p50': 0.50, 'p90': 0.90}
+BACKENDS = ('gbr', 'hgb')
 
-# 1) Carga
-df = pd.read_excel(DATA_XLS)
+# Tiempos de pared por etapa (se imprimen al final)
+TIMINGS = {}
 
-# 2) Target + features
-target = 'PRECIO_EUR_M2_x'
-with open(COLUMNS_JSON_ORIG,'r') as f:
-    feature_columns = json.load(f)
 
-# Asegura presencia de columnas
-missing = [c for c in feature_columns if c not in df.columns]
-if missing:
-    raise ValueError(f"Faltan columnas en el Excel: {missing[:5]} ...")
+@contextmanager
+def stage(name):
+    """Mide el tiempo de pared de una etapa del entrenamiento."""
+    t0 = time.perf_counter()
+    yield
+    TIMINGS[name] = time.perf_counter() - t0
+    print(f"⏱  {name}: {TIMINGS[name]:.2f} s")
 
-X = df[feature_columns].copy()
-y = df[target].astype(float)
 
-# Identifica categóricas de alto cardinal/cadenas
-cat_candidates = [c for c in feature_columns if df[c].dtype == 'object']
-num_candidates = [c for c in feature_columns if c not in cat_candidates]
+def load_data():
+    # 1) Carga (caché columnar de data/vivienda_imputada.{xlsx,xls,csv})
+    df = load_dataset()
 
-preproc = ColumnTransformer([
-    ('cat', OneHotEncoder(handle_unknown='ignore'), cat_candidates),
-    ('num', StandardScaler(), num_candidates)
-])
+    # 2) Target + features
+    with open(COLUMNS_JSON_ORIG,'r') as f:
+        feature_columns = json.load(f)
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # Asegura presencia de columnas
+    missing = [c for c in feature_columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas en el Excel: {missing[:5]} ...")
 
-def fit_quantile(alpha):
-    # GBDT cuantílico scikit-learn
-    model = Pipeline([
-        ('prep', preproc),
-        ('gb', GradientBoostingRegressor(loss='quantile', alpha=alpha, random_state=42, n_estimators=400, max_depth=3))
+    X = df[feature_columns].copy()
+    y = df[TARGET].astype(float)
+    return df, X, y, feature_columns
+
+
+def categorical_columns(df, feature_columns):
+    # Identifica categóricas de alto cardinal/cadenas
+    return [c for c in feature_columns if df[c].dtype == 'object' or isinstance(df[c].dtype, pd.CategoricalDtype)]
+
+
+def make_preprocessor(df, feature_columns, backend='gbr'):
+    cat_candidates = categorical_columns(df, feature_columns)
+    num_candidates = [c for c in feature_columns if c not in cat_candidates]
+
+    if backend == 'hgb':
+        # Códigos ordinales para el tratamiento categórico nativo (desconocidas -> NaN)
+        return ColumnTransformer([
+            ('cat', OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=np.nan), cat_candidates),
+            ('num', 'passthrough', num_candidates)
+        ])
+    return ColumnTransformer([
+        ('cat', OneHotEncoder(handle_unknown='ignore'), cat_candidates),
+        ('num', StandardScaler(), num_candidates)
     ])
-    model.fit(X_train, y_train)
+
+
+def make_regressor(backend, alpha, n_categorical):
+    if backend == 'hgb':
+        # Las n_categorical primeras columnas del preprocesado son categóricas
+        return HistGradientBoostingRegressor(loss='quantile', quantile=alpha, random_state=42, max_iter=400, max_depth=3,
+                                             categorical_features=list(range(n_categorical)))
+    # GBDT cuantílico scikit-learn
+    return GradientBoostingRegressor(loss='quantile', alpha=alpha, random_state=42, n_estimators=400, max_depth=3)
+
+
+def fit_regressor(backend, alpha, n_categorical, Xt_train, y_train):
+    """
+    Ajusta un regresor cuantílico sobre la matriz ya preprocesada.
+    Se ejecuta en un proceso del pool; devuelve (modelo, segundos de ajuste).
+    """
+    t0 = time.perf_counter()
+    gb = make_regressor(backend, alpha, n_categorical)
+    gb.fit(Xt_train, y_train)
+    return gb, time.perf_counter() - t0
+
+
+def evaluate(alpha, model, X_test, y_test):
     pred = model.predict(X_test)
     mae = mean_absolute_error(y_test, pred)
     rmse = np.sqrt(mean_squared_error(y_test, pred))
     r2 = r2_score(y_test, pred)
     print(f"alpha={alpha} | MAE={mae:.2f} | RMSE={rmse:.2f} | R2={r2:.3f}")
-    return model
-
-print("Entrenando P10..."); m10 = fit_quantile(0.10)
-print("Entrenando P50..."); m50 = fit_quantile(0.50)
-print("Entrenando P90..."); m90 = fit_quantile(0.90)
-
-# Guardar artefactos
-with open(OUT_DIR/'feature_columns.json','w') as f:
-    json.dump(feature_columns, f)
-
-# Extra: separar y guardar preproc por claridad (también está dentro de cada pipeline)
-# Para inferencia simple cargaremos los pipelines directamente.
-joblib.dump(m10, OUT_DIR/'model_p10.pkl')
-joblib.dump(m50, OUT_DIR/'model_p50.pkl')
-joblib.dump(m90, OUT_DIR/'model_p90.pkl')
-print("✅ Artefactos guardados en models/")
-
-# (Opcional) Guardar explainer SHAP si usas árboles compatibles fuera de Pipeline
-try:
-    import shap
-    explainer = shap.Explainer(m50.named_steps['gb'])
-    joblib.dump(explainer, OUT_DIR/'shap_explainer.pkl')
-except Exception as e:
-    print("SHAP explainer no generado (opcional):", e)
+
+
+def train_all(preproc, n_categorical, Xt_train, y_train, jobs, backend='gbr'):
+    """Entrena los tres cuantiles (en paralelo si jobs > 1) y los envuelve en Pipelines."""
+    regressors, fit_times = {}, {}
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(ALPHAS))) as pool:
+            futures = {q: pool.submit(fit_regressor, backend, a, n_categorical, Xt_train, y_train) for q, a in ALPHAS.items()}
+            for q, fut in futures.items():
+                regressors[q], fit_times[q] = fut.result()
+    else:
+        for q, a in ALPHAS.items():
+            print(f"Entrenando {q.upper()}...")
+            regressors[q], fit_times[q] = fit_regressor(backend, a, n_categorical, Xt_train, y_train)
+    for q, secs in fit_times.items():
+        print(f"   {q.upper()} ajustado en {secs:.2f} s")
+    # Cada Pipeline comparte el mismo preprocesado ya ajustado
+    return {q: Pipeline([('prep', preproc), ('gb', regressors[q])]) for q in ALPHAS}, fit_times
+
+
+def fit_backend(backend, df, feature_columns, X_train, y_train, jobs):
+    """Ajusta preprocesado + tres cuantiles para un backend. Devuelve (modelos, tiempos de ajuste)."""
+    preproc = make_preprocessor(df, feature_columns, backend)
+    Xt_train = preproc.fit_transform(X_train)
+    n_categorical = len(categorical_columns(df, feature_columns))
+    return train_all(preproc, n_categorical, Xt_train, y_train, jobs, backend)
+
+
+def compare_backends(df, feature_columns, X_train, X_test, y_train, y_test, jobs, repeats=50):
+    """
+    Informe comparativo de backends: tiempo de ajuste, latencia de predicción
+    (lote completo de test y fila única) y pinball loss por cuantil.
+    """
+    report = {}
+    single = X_test.iloc[[0]]
+    for backend in BACKENDS:
+        t0 = time.perf_counter()
+        models, fit_times = fit_backend(backend, df, feature_columns, X_train, y_train, jobs)
+        fit_wall = time.perf_counter() - t0
+        entry = {'fit_wall_s': fit_wall, 'quantiles': {}}
+        for q, a in ALPHAS.items():
+            t0 = time.perf_counter()
+            pred = models[q].predict(X_test)
+            batch_s = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            for _ in range(repeats):
+                models[q].predict(single)
+            single_ms = (time.perf_counter() - t0) / repeats * 1000
+            entry['quantiles'][q] = {
+                'fit_s': fit_times[q],
+                'predict_batch_ms': batch_s * 1000,
+                'predict_row_ms': single_ms,
+                'pinball': float(mean_pinball_loss(y_test, pred, alpha=a)),
+            }
+        report[backend] = entry
+
+    print(f"\n{'backend':<8}{'cuantil':<9}{'ajuste (s)':>12}{'lote (ms)':>12}{'fila (ms)':>12}{'pinball':>12}")
+    for backend, entry in report.items():
+        for q, m in entry['quantiles'].items():
+            print(f"{backend:<8}{q:<9}{m['fit_s']:>12.2f}{m['predict_batch_ms']:>12.2f}{m['predict_row_ms']:>12.3f}{m['pinball']:>12.2f}")
+        print(f"{backend:<8}{'total':<9}{entry['fit_wall_s']:>12.2f}")
+    with open(OUT_DIR/'backend_report.json', 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Informe guardado en models/backend_report.json\n")
+    return report
+
+
+def save_artifact(obj, name):
+    """
+    Vuelca a un temporal + rename (JSON si `name` acaba en .json, joblib si no):
+    la app nunca lee un artefacto a medio escribir.
+    """
+    tmp_path = OUT_DIR/f'{name}.tmp'
+    if name.endswith('.json'):
+        with open(tmp_path, 'w') as f:
+            json.dump(obj, f)
+    else:
+        joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, OUT_DIR/name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Entrena los modelos cuantílicos P10/P50/P90.")
+    parser.add_argument('--jobs', type=int, default=min(len(ALPHAS), os.cpu_count() or 1),
+                        help="Procesos para entrenar los cuantiles en paralelo (1 = secuencial).")
+    parser.add_argument('--backend', choices=BACKENDS, default='gbr',
+                        help="Backend de GBDT cuantílico: gbr (GradientBoosting) o hgb (HistGradientBoosting).")
+    parser.add_argument('--compare', action='store_true',
+                        help="Entrena ambos backends y genera un informe comparativo antes de guardar el elegido.")
+    args = parser.parse_args(argv)
+    OUT_DIR.mkdir(exist_ok=True)
+    t_total = time.perf_counter()
+
+    with stage("carga de datos"):
+        df, X, y, feature_columns = load_data()
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    if args.compare:
+        with stage("comparativa de backends"):
+            compare_backends(df, feature_columns, X_train, X_test, y_train, y_test, args.jobs)
+
+    with stage("preprocesado"):
+        preproc = make_preprocessor(df, feature_columns, args.backend)
+        Xt_train = preproc.fit_transform(X_train)
+        n_categorical = len(categorical_columns(df, feature_columns))
+
+    print(f"Entrenando P10/P50/P90 ({args.backend}) con {args.jobs} proceso(s)...")
+    with stage("entrenamiento"):
+        models, _ = train_all(preproc, n_categorical, Xt_train, y_train, args.jobs, args.backend)
+
+    with stage("evaluación"):
+        for q, a in ALPHAS.items():
+            evaluate(a, models[q], X_test, y_test)
+
+    with stage("guardado"):
+        # Guardar artefactos
+        save_artifact(feature_columns, 'feature_columns.json')
+
+        # Extra: separar y guardar preproc por claridad (también está dentro de cada pipeline)
+        # Para inferencia simple cargaremos los pipelines directamente.
+        save_artifact(models['p10'], 'model_p10.pkl')
+        save_artifact(models['p50'], 'model_p50.pkl')
+        save_artifact(models['p90'], 'model_p90.pkl')
+    print("✅ Artefactos guardados en models/")
+
+    # Ensemble compilado (arrays contiguos) para la predicción de pocas filas; sólo si
+    # reproduce exactamente a scikit-learn sobre el conjunto de test
+    with stage("ensemble compilado"):
+        compiled_path = OUT_DIR/COMPILED_NAME
+        try:
+            compiled = build_compiled(str(OUT_DIR), models, X_test)
+            print(f"✅ Ensemble compilado: {len(compiled.roots)} árboles, {len(compiled.value):,} nodos "
+                  f"({compiled_path.stat().st_size / 1024:,.0f} KB, {COMPILED_NAME})")
+        except (TypeError, ValueError) as e:
+            compiled_path.unlink(missing_ok=True)  # no dejar uno de modelos anteriores
+            print("Ensemble compilado no generado (opcional):", e)
+
+    # (Opcional) Guardar explainer SHAP si usas árboles compatibles fuera de Pipeline
+    with stage("explainer SHAP"):
+        try:
+            import shap
+            explainer = shap.Explainer(models['p50'].named_steps['gb'])
+            save_artifact(explainer, 'shap_explainer.pkl')
+        except Exception as e:
+            print("SHAP explainer no generado (opcional):", e)
+
+    # Registrar la nueva versión: la app la detecta y la carga en caliente
+    manifest = write_manifest(str(OUT_DIR))
+    print(f"✅ Versión de modelos registrada: {manifest['version']}")
+
+    # (Opcional) Tabla precalculada de cuantiles/SHAP por distrito y barrio para la Calculadora
+    with stage("tabla precalculada"):
+        try:
+            from utils.precompute import build_prediction_table
+            payload = build_prediction_table(str(OUT_DIR))
+            print(f"✅ Tabla precalculada: {len(payload['table'])} filas")
+        except Exception as e:
+            print("Tabla precalculada no generada (opcional):", e)
+
+    print(f"⏱  total: {time.perf_counter() - t_total:.2f} s")
+    return TIMINGS
+
+
+if __name__ == '__main__':
+    main()
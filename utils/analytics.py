@@ -0,0 +1,134 @@
+"""
+Analítica de correlaciones para el Modo Avanzado.
+
+Las matrices de correlación (Pearson, Spearman y parcial), el ranking de
+variables respecto al precio y las figuras Plotly ya construidas se calculan
+una sola vez por versión del dataset y método, en una pasada vectorizada de
+NumPy, y se comparten entre sesiones. Las páginas pasan las figuras cacheadas
+directamente a `st.plotly_chart` (que sólo las lee), sin copiarlas ni
+reconstruirlas desde JSON.
+"""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+from utils.data import DISTRICT_FEATURES_PATH, file_key, load_district_table
+
+METHODS = {"pearson": "Pearson", "spearman": "Spearman", "partial": "Parcial"}
+TARGET = "precio_m2"
+
+
+# ==============================
+# Correlaciones (NumPy)
+# ==============================
+def numeric_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Columnas numéricas con variación (las constantes no tienen correlación definida)."""
+    num = df.select_dtypes(include=[np.number])
+    return num.loc[:, num.std(ddof=0).fillna(0) > 0]
+
+
+def pearson(X: np.ndarray) -> np.ndarray:
+    """Matriz de correlación de Pearson de las columnas de X (NaN sustituidos por la media)."""
+    X = np.asarray(X, dtype=np.float64)
+    X = np.where(np.isnan(X), np.nanmean(X, axis=0), X)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        Z = (X - X.mean(axis=0)) / X.std(axis=0)
+    corr = Z.T @ Z / len(Z)
+    np.fill_diagonal(corr, 1.0)
+    return np.clip(corr, -1.0, 1.0)
+
+
+def rank_columns(X: np.ndarray) -> np.ndarray:
+    """Rangos por columna con empates promediados (como `scipy.stats.rankdata`)."""
+    X = np.asarray(X, dtype=np.float64)
+    n, m = X.shape
+    order = np.argsort(X, axis=0, kind="mergesort")
+    sorted_x = np.take_along_axis(X, order, axis=0)
+    ranks = np.empty_like(X)
+    for j in range(m):
+        # Límites de cada grupo de valores iguales
+        new_group = np.r_[True, sorted_x[1:, j] != sorted_x[:-1, j]]
+        starts = np.flatnonzero(new_group)
+        ends = np.r_[starts[1:], n]
+        group_rank = (starts + ends + 1) / 2.0
+        ranks[order[:, j], j] = np.repeat(group_rank, ends - starts)
+    return ranks
+
+
+def spearman(X: np.ndarray) -> np.ndarray:
+    """Correlación de Spearman: Pearson sobre los rangos."""
+    return pearson(rank_columns(X))
+
+
+def partial(corr: np.ndarray) -> np.ndarray:
+    """
+    Correlaciones parciales (cada par controlando por el resto) a partir de la
+    matriz de correlación, vía su (pseudo)inversa. Con más variables que
+    observaciones la matriz es singular y el resultado es orientativo.
+    """
+    precision = np.linalg.pinv(corr, hermitian=True)
+    d = np.sqrt(np.abs(np.diag(precision)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = -precision / np.outer(d, d)
+    np.fill_diagonal(out, 1.0)
+    return np.clip(np.nan_to_num(out), -1.0, 1.0)
+
+
+def correlation_matrix(num: pd.DataFrame, method: str = "pearson") -> pd.DataFrame:
+    X = num.to_numpy(dtype=np.float64)
+    if method == "spearman":
+        values = spearman(X)
+    elif method == "partial":
+        values = partial(pearson(X))
+    else:
+        values = pearson(X)
+    return pd.DataFrame(values, index=num.columns, columns=num.columns)
+
+
+# ==============================
+# Caché por versión del dataset
+# ==============================
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _analytics(key: tuple, method: str, top_n: int) -> dict:
+    num = numeric_frame(load_district_table())
+    corr = correlation_matrix(num, method)
+    label = METHODS.get(method, method)
+
+    heatmap = go.Figure(data=go.Heatmap(
+        z=corr.values,
+        x=corr.columns,
+        y=corr.index,
+        colorscale="Blues",
+        zmin=-1,
+        zmax=1,
+        colorbar=dict(title="Correlación"),
+    ))
+    heatmap.update_layout(title=f"Matriz de correlaciones ({label})")
+
+    ranking = corr[TARGET].drop(TARGET).dropna() if TARGET in corr else pd.Series(dtype=float)
+    top = ranking.abs().sort_values(ascending=False).head(top_n)
+    fig_ranking = px.bar(
+        x=top.values[::-1],
+        y=list(top.index[::-1]),
+        orientation="h",
+        title=f"Top variables correlacionadas con €/m² ({label})",
+    )
+    return {
+        "corr": corr,
+        "ranking": ranking.reindex(top.index),
+        "heatmap": heatmap,
+        "ranking_fig": fig_ranking,
+    }
+
+
+def correlations(method: str = "pearson", top_n: int = 10) -> dict:
+    """
+    Analítica cacheada del dataset de distritos para `method` ("pearson",
+    "spearman" o "partial"): `corr` (DataFrame), `ranking` (correlación con
+    €/m² de las `top_n` variables más relacionadas) y las figuras Plotly
+    (`heatmap`, `ranking_fig`). Compartida y de solo lectura: no modificar las
+    figuras (copiarlas con `go.Figure(fig)` si hace falta).
+    """
+    return _analytics(file_key(DISTRICT_FEATURES_PATH), method, top_n)
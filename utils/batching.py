@@ -0,0 +1,113 @@
+"""
+Agrupación de peticiones concurrentes en micro-lotes.
+
+Los GBDT predicen una matriz de N filas en poco más tiempo que una sola fila,
+así que un servicio que recibe muchas peticiones pequeñas a la vez rinde más
+si las junta. `MicroBatcher` recibe DataFrames desde cualquier hilo, espera
+como mucho `max_wait_ms` desde la primera petición pendiente (o hasta reunir
+`max_batch` filas), llama una vez a la función de lote con todas las filas
+concatenadas y devuelve a cada petición su parte del resultado. Si el lote
+falla, cada petición se repite por separado: el error sólo llega a la que lo
+provoca.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import pandas as pd
+
+
+class MicroBatcher:
+    """
+    Ejecuta `fn(lote)` sobre micro-lotes de peticiones concurrentes.
+
+    `fn` recibe un DataFrame y devuelve otro con una fila por fila de entrada
+    y en el mismo orden. Un único hilo de trabajo procesa los lotes, de modo
+    que `fn` no necesita ser segura entre hilos.
+    """
+
+    def __init__(self, fn, max_batch: int = 1024, max_wait_ms: float = 5.0):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = threading.Event()
+        self.stats = {"batches": 0, "requests": 0, "rows": 0, "failed_batches": 0}
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, frame: pd.DataFrame) -> Future:
+        """Encola las filas de `frame`; el Future se resuelve con su parte del resultado."""
+        if self._closed.is_set():
+            raise RuntimeError("El agrupador está cerrado")
+        future = Future()
+        self._queue.put((frame, future))
+        return future
+
+    def __call__(self, frame: pd.DataFrame, timeout: float | None = None) -> pd.DataFrame:
+        """Versión bloqueante de `submit()`."""
+        return self.submit(frame).result(timeout)
+
+    def close(self):
+        """Deja de aceptar peticiones; las ya encoladas se procesan."""
+        self._closed.set()
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect(self, first) -> list:
+        """Peticiones del lote: la primera más las que lleguen antes del plazo o del máximo de filas."""
+        pending = [first]
+        rows = len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # se reenvía el aviso de cierre tras este lote
+                break
+            pending.append(item)
+            rows += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending = self._collect(first)
+            frames = [frame for frame, _ in pending]
+            sizes = [len(frame) for frame in frames]
+            try:
+                result = self.fn(pd.concat(frames, ignore_index=True))
+            except Exception as e:
+                self.stats["failed_batches"] += 1
+                if len(pending) == 1:
+                    pending[0][1].set_exception(e)
+                else:
+                    self._run_each(pending)
+                continue
+            self.stats["batches"] += 1
+            self.stats["requests"] += len(pending)
+            self.stats["rows"] += sum(sizes)
+            start = 0
+            for (frame, future), size in zip(pending, sizes):
+                future.set_result(result.iloc[start:start + size].set_axis(frame.index))
+                start += size
+
+    def _run_each(self, pending: list):
+        """Repite por separado las peticiones de un lote fallido."""
+        for frame, future in pending:
+            try:
+                result = self.fn(frame.reset_index(drop=True))
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            self.stats["requests"] += 1
+            self.stats["rows"] += len(frame)
+            future.set_result(result.set_axis(frame.index))
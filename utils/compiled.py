@@ -0,0 +1,438 @@
+"""
+Ensemble compilado: los tres GBDT cuantílicos (y su preprocesado) como arrays.
+
+Cada `GradientBoostingRegressor` guarda sus 400 árboles como objetos de
+scikit-learn separados, y predecir una fila recorre cada árbol con su propia
+llamada en los tres pipelines. Aquí los árboles de todos los cuantiles se
+aplanan en arrays contiguos (`feature`, `threshold`, `left`, `right`, `value`)
+y se evalúan a la vez: en cada nivel de profundidad se avanza un paso en todos
+los árboles con indexado vectorial. Las hojas apuntan a sí mismas, de modo que
+basta con repetir el paso `depth` veces.
+
+El resultado es idéntico bit a bit al de `pipeline.predict`:
+- el preprocesado repite las mismas operaciones, en el mismo tipo, que el
+  `ColumnTransformer` (one-hot; `x -= media; x /= escala`) y pasa a float32;
+- los nodos comparan el valor float32 con el umbral float64, como el árbol;
+- la suma de las hojas (ya multiplicadas por la tasa de aprendizaje) se
+  acumula en el mismo orden que scikit-learn (`cumsum` secuencial).
+
+`compile_models()` admite pipelines `ColumnTransformer` (OneHotEncoder sin
+`drop`, StandardScaler, passthrough) + `GradientBoostingRegressor`; para otros
+modelos (p. ej. el backend `hgb`) lanza TypeError y se usa scikit-learn.
+`train_quantiles.py` guarda el ensemble en `models/compiled_ensemble.bin` tras
+comprobarlo con `validate()`.
+
+Formato de `compiled_ensemble.bin` (pensado para `mmap`):
+
+    b"SHCMPL\0\0" | longitud de la cabecera (uint64 LE) | cabecera JSON | arrays
+
+La cabecera es un manifiesto pequeño: versión del formato, hashes de los
+pickles de origen, versión de scikit-learn, columnas del modelo, categorías y,
+por cada array numérico, tipo, forma y posición (alineada a 64 bytes). Los
+arrays van sin comprimir, así que `load()` los abre como vistas de solo lectura
+de un único `np.memmap`: no hay deserialización y varios procesos del servidor
+comparten las mismas páginas a través de la caché del sistema operativo.
+Con este archivo, `utils/registry.py` no deserializa los pickles al cargar una
+versión: sólo lo hace si se necesita scikit-learn (lotes grandes o SHAP).
+"""
+import json
+import os
+import struct
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from utils.prediction import QUANTILES, build_model_input, numeric_defaults, split_pipeline, to_dense
+
+COMPILED_NAME = "compiled_ensemble.bin"
+COMPILED_FORMAT = "smarthousing-compiled-ensemble"
+COMPILED_VERSION = 2
+MAGIC = b"SHCMPL\0\0"
+ALIGN = 64
+# Filas por bloque al evaluar (acota la memoria de la matriz filas × árboles)
+CHUNK_ROWS = 2048
+
+# Campos de texto (van en la cabecera) y arrays numéricos (van en el cuerpo)
+TEXT_FIELDS = ("quantiles", "feature_cols", "num_cols", "cat_cols", "cat_values")
+NUMERIC_ARRAYS = (
+    "num_mean", "num_scale", "num_out", "num_fill", "cat_offsets", "cat_out",
+    "feature", "threshold", "left", "right", "value", "roots", "tree_offsets", "init",
+)
+
+
+# ==============================
+# Compilación
+# ==============================
+def _compile_preprocessor(prep) -> dict:
+    """Columnas numéricas (media, escala, posición) y categóricas (categorías, primera posición one-hot)."""
+    if prep is None or not isinstance(prep, ColumnTransformer):
+        raise TypeError("Sólo se compilan pipelines con ColumnTransformer")
+    num_cols, num_mean, num_scale, num_out = [], [], [], []
+    cat_cols, cat_values, cat_offsets, cat_out = [], [], [0], []
+    position = 0
+    for name, trans, cols in prep.transformers_:
+        cols = [cols] if isinstance(cols, str) else list(cols)
+        if trans == "drop" or not cols:
+            continue
+        if name == "remainder" and trans == "passthrough":
+            raise TypeError("El resto de columnas (remainder='passthrough') no se compila")
+        if isinstance(trans, OneHotEncoder):
+            infrequent = getattr(trans, "infrequent_categories_", None) or []
+            if trans.drop_idx_ is not None or any(c is not None for c in infrequent):
+                raise TypeError("OneHotEncoder con drop o categorías infrecuentes no se compila")
+            for col, cats in zip(cols, trans.categories_):
+                cat_cols.append(col)
+                cat_out.append(position)
+                cat_values.extend(str(c) for c in cats)
+                cat_offsets.append(len(cat_values))
+                position += len(cats)
+        elif isinstance(trans, StandardScaler) or trans == "passthrough":
+            n = len(cols)
+            mean = trans.mean_ if getattr(trans, "with_mean", False) else np.zeros(n)
+            scale = trans.scale_ if getattr(trans, "with_std", False) else np.ones(n)
+            num_cols.extend(cols)
+            num_mean.extend(np.asarray(mean, dtype=np.float64))
+            num_scale.extend(np.asarray(scale, dtype=np.float64))
+            num_out.extend(range(position, position + n))
+            position += n
+        else:
+            raise TypeError(f"Transformador no compilable: {type(trans).__name__}")
+    return {
+        "num_cols": np.asarray(num_cols, dtype=str),
+        "num_mean": np.asarray(num_mean, dtype=np.float64),
+        "num_scale": np.asarray(num_scale, dtype=np.float64),
+        "num_out": np.asarray(num_out, dtype=np.int64),
+        "cat_cols": np.asarray(cat_cols, dtype=str),
+        "cat_values": np.asarray(cat_values, dtype=str),
+        "cat_offsets": np.asarray(cat_offsets, dtype=np.int64),
+        "cat_out": np.asarray(cat_out, dtype=np.int64),
+    }
+
+
+def _compile_trees(regressors: list) -> dict:
+    """Nodos de todos los árboles de todos los cuantiles en arrays globales."""
+    feature, threshold, left, right, value, roots, tree_offsets, init = [], [], [], [], [], [], [0], []
+    base = 0
+    for reg in regressors:
+        if not (hasattr(reg, "estimators_") and hasattr(reg, "learning_rate")) or reg.estimators_.shape[1] != 1:
+            raise TypeError(f"Regresor no compilable: {type(reg).__name__}")
+        # Con el init por defecto (DummyRegressor) el punto de partida es constante
+        probe = np.zeros((2, reg.n_features_in_), dtype=np.float32)
+        probe[1] = 1.0
+        start = reg._raw_predict_init(probe)[:, 0]
+        if start[0] != start[1]:
+            raise TypeError("Estimador inicial no constante")
+        init.append(float(start[0]))
+        scale = float(reg.learning_rate)
+        for est in reg.estimators_[:, 0]:
+            tree = est.tree_
+            n = tree.node_count
+            ids = np.arange(n, dtype=np.int64) + base
+            leaf = tree.children_left == -1
+            # Las hojas apuntan a sí mismas: un paso más no las mueve
+            left.append(np.where(leaf, ids, tree.children_left + base))
+            right.append(np.where(leaf, ids, tree.children_right + base))
+            feature.append(np.where(leaf, 0, tree.feature).astype(np.int64))
+            threshold.append(np.where(leaf, np.inf, tree.threshold))
+            # Mismo producto que scikit-learn (`scale * value`) y 0 en los nodos internos
+            value.append(np.where(leaf, scale * tree.value[:, 0, 0], 0.0))
+            roots.append(base)
+            base += n
+        tree_offsets.append(len(roots))
+    depth = max(int(est.tree_.max_depth) for reg in regressors for est in reg.estimators_[:, 0])
+    return {
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "value": np.concatenate(value).astype(np.float64),
+        "roots": np.asarray(roots, dtype=np.int64),
+        "tree_offsets": np.asarray(tree_offsets, dtype=np.int64),
+        "init": np.asarray(init, dtype=np.float64),
+        "depth": depth,
+    }
+
+
+def compile_models(models: dict, feature_cols: list[str]) -> "CompiledEnsemble":
+    """
+    Compila los pipelines {cuantil: Pipeline}. Los cuantiles deben compartir el
+    preprocesado ajustado (como los de `train_quantiles.py`). TypeError si
+    algún paso no es compilable.
+    """
+    quantiles = [q for q in QUANTILES if q in models]
+    parts = [split_pipeline(models[q]) for q in quantiles]
+    prep = parts[0][0]
+    spec = _compile_preprocessor(prep)
+    for other, _ in parts[1:]:
+        if other is not prep:
+            other_spec = _compile_preprocessor(other)
+            if not all(np.array_equal(spec[k], other_spec[k]) for k in spec):
+                raise TypeError("Los cuantiles no comparten el preprocesado")
+    fill = numeric_defaults(prep)
+    arrays = {
+        "quantiles": np.asarray(quantiles, dtype=str),
+        "feature_cols": np.asarray(feature_cols, dtype=str),
+        "num_fill": np.asarray([fill.get(c, np.nan) for c in spec["num_cols"]], dtype=np.float64),
+        **spec,
+        **_compile_trees([reg for _, reg in parts]),
+    }
+    return CompiledEnsemble(arrays)
+
+
+# ==============================
+# Evaluación
+# ==============================
+class CompiledEnsemble:
+    """Preprocesado + árboles P10/P50/P90 en arrays; `predict` devuelve (N, n_cuantiles)."""
+
+    def __init__(self, arrays: dict):
+        self.arrays = arrays
+        self.quantiles = [str(q) for q in arrays["quantiles"]]
+        self.feature_cols = [str(c) for c in arrays["feature_cols"]]
+        self.depth = int(arrays["depth"])
+        self.n_out = int(arrays["cat_offsets"][-1]) + len(arrays["num_out"])
+        for name in ("num_mean", "num_scale", "num_out", "num_fill", "cat_out", "cat_offsets",
+                     "feature", "threshold", "left", "right", "value", "roots", "tree_offsets", "init"):
+            setattr(self, name, arrays[name])
+        self.num_cols = [str(c) for c in arrays["num_cols"]]
+        self.cat_cols = [str(c) for c in arrays["cat_cols"]]
+        values = arrays["cat_values"].tolist()
+        # Categoría (como texto) -> posición dentro del bloque one-hot de su columna
+        self.categories = [
+            {v: i for i, v in enumerate(values[a:b])}
+            for a, b in zip(self.cat_offsets[:-1], self.cat_offsets[1:])
+        ]
+
+    def transform(self, X: pd.DataFrame) -> np.ndarray:
+        """Matriz preprocesada float32 (la misma que el ColumnTransformer ajustado)."""
+        # Una sola conversión del DataFrame: en lotes pequeños domina el coste de acceder a cada columna
+        n = len(X)
+        position = {c: i for i, c in enumerate(X.columns)}
+        values = X.to_numpy(dtype=object)
+        Xt = np.zeros((n, self.n_out), dtype=np.float64)
+        if self.num_cols:
+            idx = [position.get(c, -1) for c in self.num_cols]
+            column_dtypes = X.dtypes.tolist()
+            dtypes = [column_dtypes[i] if i >= 0 else np.dtype(np.float64) for i in idx]
+            # Tipo común de las columnas, como `check_array` (float32 sólo si todas lo son)
+            try:
+                dtype = np.result_type(*dtypes)
+            except TypeError:
+                dtype = np.dtype(np.float64)
+            if dtype not in (np.float32, np.float64):
+                dtype = np.dtype(np.float64)
+            num = np.full((n, len(idx)), np.nan, dtype=dtype)
+            found = [j for j, i in enumerate(idx) if i >= 0]
+            num[:, found] = values[:, [idx[j] for j in found]].astype(dtype)
+            num = np.where(np.isnan(num), self.num_fill.astype(dtype), num)
+            # Mismos pasos (y redondeos) que StandardScaler: X -= media; X /= escala
+            centered = np.subtract(num, self.num_mean).astype(dtype, copy=False)
+            Xt[:, self.num_out] = np.divide(centered, self.num_scale).astype(dtype, copy=False)
+        for col, cats, start in zip(self.cat_cols, self.categories, self.cat_out):
+            if col not in position:
+                continue
+            codes = np.fromiter((cats.get(str(v), -1) for v in values[:, position[col]]), dtype=np.int64, count=n)
+            known = np.flatnonzero(codes >= 0)
+            Xt[known, start + codes[known]] = 1.0
+        return Xt.astype(np.float32)
+
+    def predict_matrix(self, Xt: np.ndarray) -> np.ndarray:
+        """Predice sobre una matriz ya preprocesada. Devuelve (N, n_cuantiles)."""
+        Xt = np.ascontiguousarray(Xt, dtype=np.float32)
+        out = np.empty((Xt.shape[0], len(self.quantiles)), dtype=np.float64)
+        for start in range(0, Xt.shape[0], CHUNK_ROWS):
+            block = Xt[start:start + CHUNK_ROWS]
+            out[start:start + len(block)] = self._predict_block(block)
+        return out
+
+    def _predict_block(self, Xt: np.ndarray) -> np.ndarray:
+        rows = np.arange(Xt.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (Xt.shape[0], len(self.roots)))
+        for _ in range(self.depth):
+            go_left = Xt[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        leaves = self.value[node]
+        out = np.empty((Xt.shape[0], len(self.quantiles)), dtype=np.float64)
+        for j in range(len(self.quantiles)):
+            a, b = self.tree_offsets[j], self.tree_offsets[j + 1]
+            # Suma secuencial desde el valor inicial, en el orden de los árboles
+            terms = np.concatenate([np.full((Xt.shape[0], 1), self.init[j]), leaves[:, a:b]], axis=1)
+            out[:, j] = np.cumsum(terms, axis=1)[:, -1]
+        return out
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        """Predicción (N, n_cuantiles) a partir de las variables originales."""
+        return self.predict_matrix(self.transform(X))
+
+
+# ==============================
+# Validación y persistencia
+# ==============================
+def validate(compiled: CompiledEnsemble, models: dict, X: pd.DataFrame) -> bool:
+    """
+    True si el ensemble compilado reproduce exactamente el preprocesado y
+    `pipeline.predict` de scikit-learn sobre `X`.
+    """
+    X = build_model_input(X, compiled.feature_cols).fillna(
+        {c: v for c, v in zip(compiled.num_cols, compiled.num_fill) if not np.isnan(v)}
+    )
+    prep, _ = split_pipeline(models[compiled.quantiles[0]])
+    if not np.array_equal(compiled.transform(X), to_dense(prep.transform(X), np.float32)):
+        return False
+    expected = np.column_stack([models[q].predict(X) for q in compiled.quantiles])
+    return np.array_equal(compiled.predict(X), expected)
+
+
+def probe_frame(compiled: CompiledEnsemble, n: int = 64, seed: int = 0) -> pd.DataFrame:
+    """
+    Filas sintéticas para `validate()` cuando no hay datos a mano: recorren las
+    categorías de cada columna categórica y valores numéricos alrededor de la
+    media de entrenamiento (± 3 desviaciones).
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for col, mean, scale in zip(compiled.num_cols, compiled.num_mean, compiled.num_scale):
+        data[col] = mean + scale * rng.uniform(-3.0, 3.0, n)
+    for col, cats in zip(compiled.cat_cols, compiled.categories):
+        names = list(cats)
+        data[col] = [names[i % len(names)] for i in rng.permutation(n)]
+    return pd.DataFrame(data).reindex(columns=compiled.feature_cols)
+
+
+def save(compiled: CompiledEnsemble, path: str, sources: dict[str, str]):
+    """
+    Escribe el ensemble en el formato de `COMPILED_NAME` (temporal + rename).
+    `sources` son los hashes de los pickles de los que procede.
+    """
+    import sklearn
+
+    arrays = {name: np.ascontiguousarray(compiled.arrays[name]) for name in NUMERIC_ARRAYS}
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    header = {
+        "format": COMPILED_FORMAT,
+        "format_version": COMPILED_VERSION,
+        "created_at": time.time(),
+        "sklearn_version": sklearn.__version__,
+        "sources": dict(sorted(sources.items())),
+        "depth": compiled.depth,
+        **{name: [str(v) for v in compiled.arrays[name]] for name in TEXT_FIELDS},
+        "arrays": layout,
+    }
+    raw = json.dumps(header, ensure_ascii=False).encode()
+    # Los offsets del cuerpo se cuentan desde el primer múltiplo de ALIGN tras la cabecera
+    body_start = -(-(len(MAGIC) + 8 + len(raw)) // ALIGN) * ALIGN
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(raw)) + raw)
+        for name, array in arrays.items():
+            f.seek(body_start + layout[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(body_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _header_length(head: bytes) -> int:
+    if len(head) < len(MAGIC) + 8 or head[:len(MAGIC)] != MAGIC:
+        raise ValueError("No es un ensemble compilado de SmartHousing")
+    return struct.unpack("<Q", head[len(MAGIC):])[0]
+
+
+def read_header(source) -> tuple[dict, int]:
+    """
+    (cabecera, inicio del cuerpo) de un archivo `COMPILED_NAME` (ruta o bytes,
+    p. ej. una subida del panel de administración). ValueError si no tiene el
+    formato esperado.
+    """
+    prefix = len(MAGIC) + 8
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            length = _header_length(f.read(prefix))
+            raw = f.read(length)
+    else:
+        length = _header_length(bytes(source[:prefix]))
+        raw = bytes(source[prefix:prefix + length])
+    try:
+        header = json.loads(raw)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Cabecera del ensemble compilado ilegible: {e}") from None
+    if not isinstance(header, dict) or header.get("format") != COMPILED_FORMAT:
+        raise ValueError("No es un ensemble compilado de SmartHousing")
+    return header, -(-(prefix + length) // ALIGN) * ALIGN
+
+
+def _layout_ok(header: dict, body_start: int, file_size: int) -> bool:
+    """Los arrays de la cabecera caben en el archivo y sus tamaños son coherentes entre sí."""
+    try:
+        specs = header["arrays"]
+        shapes = {}
+        for name in NUMERIC_ARRAYS:
+            spec = specs[name]
+            dtype, shape = np.dtype(spec["dtype"]), tuple(int(n) for n in spec["shape"])
+            if dtype.kind not in "fiu" or len(shape) != 1 or spec["offset"] < 0:
+                return False
+            if body_start + spec["offset"] + dtype.itemsize * shape[0] > file_size:
+                return False
+            shapes[name] = shape[0]
+        n_num, n_cat = len(header["num_cols"]), len(header["cat_cols"])
+        n_nodes, n_quantiles = shapes["feature"], len(header["quantiles"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return (
+        all(shapes[n] == n_num for n in ("num_mean", "num_scale", "num_out", "num_fill"))
+        and shapes["cat_offsets"] == n_cat + 1 and shapes["cat_out"] == n_cat
+        and all(shapes[n] == n_nodes for n in ("threshold", "left", "right", "value"))
+        and shapes["tree_offsets"] == n_quantiles + 1 and shapes["init"] == n_quantiles
+        and set(header["num_cols"]) | set(header["cat_cols"]) <= set(header["feature_cols"])
+    )
+
+
+def load(
+    path: str,
+    sources: dict[str, str] | None = None,
+    feature_cols: list[str] | None = None,
+    mmap_mode: str | None = "r",
+) -> CompiledEnsemble | None:
+    """
+    Abre un ensemble guardado con `save()`. Con `mmap_mode="r"` (por defecto)
+    los arrays son vistas de solo lectura del archivo mapeado en memoria; con
+    None se leen a memoria.
+
+    Devuelve None (y el registro usa los pickles) si el archivo no corresponde
+    a lo que sustituye: otra versión del formato o de scikit-learn (el
+    preprocesado y los árboles reproducen los de esa versión), `sources`
+    distinto de los hashes de los pickles actuales, `feature_cols` distinto de
+    las columnas del modelo o arrays incoherentes con la cabecera.
+    """
+    import sklearn
+
+    header, body_start = read_header(path)
+    if header.get("format_version") != COMPILED_VERSION:
+        return None
+    if header.get("sklearn_version") != sklearn.__version__:
+        return None
+    if sources is not None and header.get("sources") != dict(sorted(sources.items())):
+        return None
+    if feature_cols is not None and header.get("feature_cols") != list(feature_cols):
+        return None
+    if not _layout_ok(header, body_start, os.path.getsize(path)):
+        return None
+    if mmap_mode is not None:
+        buffer = np.memmap(path, dtype=np.uint8, mode=mmap_mode)
+    else:
+        buffer = np.fromfile(path, dtype=np.uint8)
+    arrays = {name: np.asarray(header[name], dtype=str) for name in TEXT_FIELDS}
+    arrays["depth"] = header["depth"]
+    for name in NUMERIC_ARRAYS:
+        spec = header["arrays"][name]
+        arrays[name] = np.ndarray(
+            tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=buffer, offset=body_start + spec["offset"]
+        )
+    return CompiledEnsemble(arrays)
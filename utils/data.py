@@ -0,0 +1,122 @@
+import os
+
+import pandas as pd
+import streamlit as st
+
+from utils import ingest, perf
+
+# ==============================
+# Rutas de los datasets
+# ==============================
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DISTRICT_FEATURES_PATH = os.path.join(BASE_DIR, "data", "district_features.csv")
+CATALOGO_PATH = os.path.join(BASE_DIR, "data", "catalogo_distritos_barrios.csv")
+
+# Columnas categóricas (claves) de district_features.csv
+KEY_COLUMNS = ["DISTRITO", "BARRIO", "TIPO_VIVIENDA"]
+
+# Renombrado usado por las páginas para trabajar con etiquetas amigables
+PAGE_RENAME = {
+    "DISTRITO": "distrito",
+    "PRECIO_EUR_M2": "precio_m2",
+    "VARIACION_PCT": "variacion_pct",
+}
+
+
+# ==============================
+# Utilidades internas
+# ==============================
+def file_key(path: str) -> tuple[int, int]:
+    """
+    Devuelve (mtime_ns, tamaño) del archivo. Se usa como clave de caché:
+    si el archivo cambia en disco, la clave cambia y se vuelve a leer.
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def short_name(values: pd.Series) -> pd.Series:
+    """Elimina el prefijo numérico de un código ("01. Centro" -> "Centro")."""
+    return values.astype(str).str.split(".").str[-1].str.strip()
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+@perf.timed("csv:district_features", kind="miss")
+def _read_district_features(path: str, key: tuple[int, int]) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    # Claves como texto; el resto de columnas numéricas en float64 para que el
+    # modelo reciba exactamente los mismos valores que al entrenar.
+    for col in KEY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(str)
+    num_cols = [c for c in df.columns if c not in KEY_COLUMNS]
+    df[num_cols] = df[num_cols].apply(pd.to_numeric, errors="coerce").astype("float64")
+    df["distrito_nombre"] = short_name(df["DISTRITO"])
+    return df
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+@perf.timed("csv:district_table", kind="miss")
+def _read_district_table(path: str, key: tuple[int, int]) -> pd.DataFrame:
+    return _read_district_features(path, key).rename(columns=PAGE_RENAME)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+@perf.timed("csv:catalogo", kind="miss")
+def _read_catalogo(path: str, key: tuple[int, int]) -> pd.DataFrame:
+    cat = pd.read_csv(path, dtype=str)
+    cat = cat.rename(columns={"DISTRITO_x": "DISTRITO"})
+    cat["distrito_nombre"] = short_name(cat["DISTRITO"])
+    cat["barrio_nombre"] = short_name(cat["BARRIO"])
+    return cat
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+@perf.timed("dataset:vivienda", kind="miss")
+def _read_vivienda(key: tuple) -> pd.DataFrame:
+    return ingest.load_dataset()
+
+
+# ==============================
+# API pública
+# ==============================
+@perf.timed("csv:district_features")
+def load_district_features() -> pd.DataFrame:
+    """
+    Tabla de indicadores por distrito con los nombres de columna originales
+    (los que espera el modelo) más la columna `distrito_nombre`.
+
+    El DataFrame se comparte entre sesiones y páginas: tratarlo como de solo
+    lectura y usar `.copy()` o `.assign()` antes de modificarlo.
+    """
+    return _read_district_features(DISTRICT_FEATURES_PATH, file_key(DISTRICT_FEATURES_PATH))
+
+
+@perf.timed("csv:district_table")
+def load_district_table() -> pd.DataFrame:
+    """
+    Misma tabla que `load_district_features()` con las columnas clave
+    renombradas para las páginas (`distrito`, `precio_m2`, `variacion_pct`).
+    Compartida y de solo lectura.
+    """
+    return _read_district_table(DISTRICT_FEATURES_PATH, file_key(DISTRICT_FEATURES_PATH))
+
+
+@perf.timed("csv:catalogo")
+def load_catalogo() -> pd.DataFrame:
+    """
+    Catálogo de barrios por distrito (`DISTRITO`, `BARRIO`, `distrito_nombre`,
+    `barrio_nombre`). Compartido y de solo lectura.
+    """
+    return _read_catalogo(CATALOGO_PATH, file_key(CATALOGO_PATH))
+
+
+@perf.timed("dataset:vivienda")
+def load_vivienda() -> pd.DataFrame:
+    """
+    Dataset de viviendas a nivel de fila (barrio × periodo × tipo) desde la
+    caché Parquet tipada de `utils/ingest.py`. Se vuelve a leer si cambia el
+    archivo de origen. Compartido y de solo lectura.
+    """
+    source = ingest.find_source()
+    return _read_vivienda((source, file_key(source)))
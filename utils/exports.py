@@ -0,0 +1,192 @@
+"""
+Artefactos de descarga preserializados.
+
+`st.download_button` necesita los bytes del archivo, y generarlos con
+`df.to_csv()` en cada rerun serializa la tabla completa aunque nadie la
+descargue. Aquí cada exportación se identifica por (nombre, versión del
+dataset, formato): los bytes se generan una sola vez, la primera vez que
+alguien pulsa el botón, y se comparten entre sesiones hasta que cambia la
+versión.
+
+Formatos: CSV, CSV comprimido con gzip, Parquet (zstd) y Excel.
+
+Los resultados que ya están en disco (p. ej. la valoración de una cartera) se
+sirven con `file_download_button()`: al pulsar se entrega el archivo abierto
+(o comprimido al vuelo por bloques), sin guardar copias en memoria.
+"""
+import gzip
+import io
+import zlib
+from typing import Callable, Iterator
+
+import pandas as pd
+import streamlit as st
+
+# formato -> (etiqueta, extensión, tipo MIME)
+FORMATS = {
+    "csv": ("CSV", ".csv", "text/csv"),
+    "csv.gz": ("CSV comprimido (gzip)", ".csv.gz", "application/gzip"),
+    "parquet": ("Parquet", ".parquet", "application/vnd.apache.parquet"),
+    "xlsx": ("Excel", ".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+# Formatos en los que se sirve un CSV ya escrito en disco
+FILE_FORMATS = ("csv", "csv.gz")
+COPY_CHUNK = 1 << 20
+
+
+# ==============================
+# Serialización
+# ==============================
+def to_bytes(df: pd.DataFrame, fmt: str = "csv") -> bytes:
+    """Serializa `df` (sin índice) en el formato `fmt` (una clave de `FORMATS`)."""
+    if fmt == "csv":
+        return df.to_csv(index=False).encode()
+    if fmt == "csv.gz":
+        # mtime=0: mismos datos -> mismos bytes
+        return gzip.compress(df.to_csv(index=False).encode(), compresslevel=6, mtime=0)
+    buffer = io.BytesIO()
+    if fmt == "parquet":
+        df.to_parquet(buffer, index=False, compression="zstd")
+    elif fmt == "xlsx":
+        df.to_excel(buffer, index=False)
+    else:
+        raise ValueError(f"Formato de exportación desconocido: {fmt}")
+    return buffer.getvalue()
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _artifact(name: str, version, fmt: str, _build: Callable[[], pd.DataFrame]) -> bytes:
+    # `_build` no forma parte de la clave: la identidad la dan nombre y versión
+    return to_bytes(_build(), fmt)
+
+
+def _gzip_chunks(path: str) -> Iterator[bytes]:
+    """Bloques gzip del archivo `path`, leído de `COPY_CHUNK` en `COPY_CHUNK` bytes."""
+    # wbits=31: formato gzip con mtime=0 (mismo archivo -> mismos bytes)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK), b""):
+            yield compressor.compress(chunk)
+    yield compressor.flush()
+
+
+class _GzipStream(io.RawIOBase):
+    """Lector de sólo lectura que comprime `path` con gzip a medida que se lee."""
+
+    def __init__(self, path: str):
+        self._chunks = _gzip_chunks(path)
+        self._pending = memoryview(b"")
+        self._started = False
+
+    def readable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # `st.download_button` rebobina antes de leer: sólo se admite antes de empezar
+        if offset == 0 and whence == io.SEEK_SET and not self._started:
+            return 0
+        raise io.UnsupportedOperation("seek")
+
+    def readinto(self, buffer) -> int:
+        self._started = True
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self):
+        self._chunks.close()
+        super().close()
+
+
+def open_file(path: str, fmt: str = "csv") -> io.RawIOBase | io.BufferedReader:
+    """Abre el CSV `path` para descargarlo en `fmt`: el propio archivo o su compresión gzip."""
+    if fmt == "csv":
+        return open(path, "rb")
+    if fmt == "csv.gz":
+        return _GzipStream(path)
+    raise ValueError(f"Formato de exportación desconocido: {fmt}")
+
+
+# ==============================
+# API pública
+# ==============================
+def artifact(name: str, version, build: Callable[[], pd.DataFrame], fmt: str = "csv") -> bytes:
+    """
+    Bytes de la exportación `name` en `fmt` para `version` (cualquier valor
+    hashable que cambie con los datos, p. ej. `file_key(path)`). `build()`
+    sólo se llama si esa combinación no está ya en caché.
+    """
+    return _artifact(name, version, fmt, build)
+
+
+def lazy(name: str, version, build: Callable[[], pd.DataFrame], fmt: str = "csv") -> Callable[[], bytes]:
+    """Como `artifact()`, pero diferido: devuelve un callable para `st.download_button(data=...)`."""
+    return lambda: artifact(name, version, build, fmt)
+
+
+def download_button(
+    label: str,
+    name: str,
+    version,
+    build: Callable[[], pd.DataFrame],
+    file_name: str,
+    formats: tuple[str, ...] = tuple(FORMATS),
+    key: str | None = None,
+    **kwargs,
+):
+    """
+    Botón de descarga de la exportación `name`, con selector de formato si
+    hay más de uno. `file_name` va sin extensión. Los bytes se generan al
+    pulsar el botón y se reutilizan mientras no cambie `version`.
+    """
+    fmt = formats[0]
+    if len(formats) > 1:
+        fmt = st.selectbox(
+            "Formato", formats, format_func=lambda f: FORMATS[f][0],
+            key=f"{key or name}_formato", label_visibility="collapsed",
+        )
+    _, extension, mime = FORMATS[fmt]
+    return st.download_button(
+        label,
+        data=lazy(name, version, build, fmt),
+        file_name=file_name + extension,
+        mime=mime,
+        key=key,
+        **kwargs,
+    )
+
+
+def file_download_button(
+    label: str,
+    path: str,
+    file_name: str,
+    formats: tuple[str, ...] = FILE_FORMATS,
+    key: str | None = None,
+    **kwargs,
+):
+    """
+    Botón de descarga del CSV `path` ya escrito en disco, con selector de
+    formato (CSV o CSV gzip). `file_name` va sin extensión. El archivo no se
+    lee en cada rerun: se abre al pulsar y se lee (o comprime) por bloques.
+    """
+    fmt = formats[0]
+    if len(formats) > 1:
+        fmt = st.selectbox(
+            "Formato", formats, format_func=lambda f: FORMATS[f][0],
+            key=f"{key or path}_formato", label_visibility="collapsed",
+        )
+    _, extension, mime = FORMATS[fmt]
+    return st.download_button(
+        label,
+        data=lambda: open_file(path, fmt),
+        file_name=file_name + extension,
+        mime=mime,
+        key=key,
+        **kwargs,
+    )
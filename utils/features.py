@@ -0,0 +1,309 @@
+"""
+Construcción de las filas de entrada de los modelos.
+
+Cada fila se compone de dos partes:
+
+- la **base del distrito** (indicadores agregados de `district_features.csv`),
+  que se prepara una sola vez por versión del CSV y de las columnas del modelo
+  y se comparte entre sesiones;
+- las **características del inmueble** (`antiguedad`, `cerca_metro`,
+  `habitaciones`, `ascensor`), que sólo modifican unas pocas columnas.
+
+Los modelos entrenados con `train_quantiles.py` usan los nombres de columna del
+dataset de viviendas (`DISTRITO_x`, `Número Habitantes`, ...) mientras que el
+CSV de distritos usa nombres normalizados (`DISTRITO`, `RESIDENTES_TOTAL`,
+...). `SOURCE_ALIASES` traduce unos a otros para que cualquier conjunto de
+artefactos reciba sus variables con valores, no con NaN.
+
+Las características del inmueble se traducen a variables del modelo:
+
+- `antiguedad` -> `TIPO_VIVIENDA` (NUEVA hasta `NUEVA_MAX_ANTIGUEDAD` años);
+- `cerca_metro` -> `TIENE_METRO` y paradas de metro (y sus derivadas);
+- `habitaciones`, `ascensor`, `antiguedad` -> `HABITACIONES`, `ASCENSOR`,
+  `ANTIGUEDAD` si el modelo incluye esas columnas.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils import ingest
+from utils.data import (
+    CATALOGO_PATH, DISTRICT_FEATURES_PATH, KEY_COLUMNS, file_key, load_catalogo, load_district_features,
+    load_vivienda,
+)
+
+# Columna del dataset de entrenamiento -> columna de district_features.csv
+SOURCE_ALIASES = {
+    "DISTRITO_x": "DISTRITO",
+    "PRECIO_EUR_M2_x": "PRECIO_EUR_M2",
+    "TRANSACCIONES_x": "TRANSACCIONES",
+    "RENTA_NETA_PERSONA_x": "RENTA_NETA_PERSONA",
+    "RENTA_NETA_HOGAR_x": "RENTA_NETA_HOGAR",
+    "VIVIENDAS_TURISTICAS_REAL_x": "VIVIENDAS_TURISTICAS_REAL",
+    "VIVIENDAS_TURISTICAS_ACU_x": "VIVIENDAS_TURISTICAS_ACU",
+    "PRICE_EUR_AVG\n(en €/día)_x": "PRECIO_EUR_AVG (en €/día)",
+    "PRICE_EUR_AVG_ACU\n(en €/día)_x": "PRECIO_EUR_AVG_ACU (en €/día)",
+    "PARADAS_METRO_x": "PARADAS_METRO",
+    "PARADAS_EMT_x": "PARADAS_EMT",
+    "PERIODO_INICIO_METRO_x": "PERIODO_INICIO_METRO",
+    "POLITICA_VIVIENDA_x": "POLITICA_VIVIENDA",
+    "Edad media de la población": "EDAD_ MEDIA",
+    "Número Habitantes": "RESIDENTES_TOTAL",
+    "Personas con nacionalidad española": "RESIDENTES_ESPANOLES",
+    "Personas con nacionalidad extranjera": "RESIDENTES_EXTRANJEROS",
+    "Población densidad (hab./Ha.)": "DENSIDAD_POBLACION",
+    "Porcentaje de envejecimiento (Población mayor de 65 años/Población total)": "RESIDENTES_MAYORES_65",
+    "Relación de Superficie de zonas verdes y Parques de distrito (ha) entre número de Habitantes *10.000": "ZONAS_VERDES_POR_RESIDENTE",
+    "Tamaño medio del hogar": "TAMAÑO_MEDIO_HOGAR",
+    "Tasa absoluta de paro registrado (febrero)": "TASA_PARO",
+    "Tasa bruta de natalidad (‰)": "TASA_NATALIDAD",
+    "Tasa de crecimiento demográfico (porcentaje)": "TASA_CRECIMIENTO_DEMOGRAFICO",
+    "Total hogares": "VIVIENDA_OCUPADA",
+    "Percepción de seguridad en el barrio (media) (Robusto 1-10)": "PERCEPCION_SEGURIDAD",
+    "Satisfacción de la vida en el barrio (media) (Robusto 1-10)": "PERCEPCION_CALIDAD_VIDA",
+    "Índice de Vulnerabilidad (media) (Robusto 1-10)": "INDICE_VULNERABILIDAD",
+    "Índice de Seguridad por 1000 habitantes (Robusto 1-10)": "INDICE_SEGURIDAD",
+    "Índice de Equipamiento por 1000 habitantes (Robusto 1-10)": "INDICE_INFRAESTRUCTURA",
+}
+
+# Periodo con el que se valora (último año del histórico 2015–2024)
+REFERENCE_PERIODO = 2024
+
+# Antigüedad máxima (años) para considerar la vivienda como NUEVA
+NUEVA_MAX_ANTIGUEDAD = 5
+
+# Valores por defecto de las características del inmueble
+PROPERTY_DEFAULTS = {"habitaciones": 2, "ascensor": "Sí", "cerca_metro": "Sí", "antiguedad": 35}
+
+# Características del inmueble que el modelo puede recibir directamente
+DIRECT_COLUMNS = {"habitaciones": "HABITACIONES", "ascensor": "ASCENSOR", "antiguedad": "ANTIGUEDAD"}
+
+# Columnas (nombres del CSV) que `apply_property` deriva de cada característica del inmueble
+PROPERTY_COLUMNS = {
+    "habitaciones": ["HABITACIONES"],
+    "ascensor": ["ASCENSOR"],
+    "cerca_metro": ["TIENE_METRO"],
+    "antiguedad": ["TIPO_VIVIENDA", "ANTIGUEDAD"],
+}
+
+# Perfiles que cubren todas las combinaciones de variables del modelo afectadas
+# por el inmueble cuando el modelo no usa columnas directas (ver `profile_grid`)
+PROFILE_COLUMNS = ["TIPO_VIVIENDA", "TIENE_METRO"]
+
+
+# ==============================
+# Base por distrito (cacheada)
+# ==============================
+def source_column(feature: str) -> str:
+    """Columna de district_features.csv de la que se toma una variable del modelo."""
+    return SOURCE_ALIASES.get(feature, feature)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _district_base(key: tuple[int, int]) -> pd.DataFrame:
+    base = load_district_features().set_index("DISTRITO", drop=False)
+    return base.assign(PERIODO=float(REFERENCE_PERIODO))
+
+
+def district_base() -> pd.DataFrame:
+    """
+    Indicadores por distrito (indexados por la etiqueta `DISTRITO`) con los
+    nombres de district_features.csv más `PERIODO`. Compartida y de solo lectura.
+    """
+    return _district_base(file_key(DISTRICT_FEATURES_PATH))
+
+
+def _barrio_rows(vivienda: pd.DataFrame, numeric: list[str]) -> pd.DataFrame:
+    """
+    Medias por barrio de las filas del dataset de viviendas (todos los periodos
+    y tipos, como las del CSV de distritos), con los nombres de columna del CSV.
+    """
+    rows = vivienda.rename(columns=SOURCE_ALIASES)
+    rows["BARRIO"] = rows["BARRIO"].astype(str)
+    for col in ["PARADAS_METRO", "PARADAS_EMT"]:
+        if col in rows:
+            rows[col] = pd.to_numeric(rows[col], errors="coerce").astype(np.float64)
+    # Derivadas que se calculan por fila antes de promediar
+    if {"PARADAS_METRO", "PARADAS_EMT"} <= set(rows.columns):
+        rows["PARADAS_TOTAL"] = rows["PARADAS_METRO"] + rows["PARADAS_EMT"]
+        rows["TIENE_METRO"] = (rows["PARADAS_METRO"] > 0).astype(np.float64)
+        rows["TIENE_EMT"] = (rows["PARADAS_EMT"] > 0).astype(np.float64)
+    available = [c for c in numeric if c in rows.columns]
+    grouped = rows[["BARRIO", *available]].groupby("BARRIO")
+    means = grouped.mean().astype(np.float64)
+
+    # Variación del €/m² entre el primer y el último periodo del barrio
+    if {"PRECIO_EUR_M2", "PERIODO"} <= set(rows.columns):
+        yearly = rows.groupby(["BARRIO", "PERIODO"])["PRECIO_EUR_M2"].mean().unstack("PERIODO").sort_index(axis=1)
+        first = yearly.bfill(axis=1).iloc[:, 0]
+        last = yearly.ffill(axis=1).iloc[:, -1]
+        means["VARIACION_PCT"] = (last / first - 1.0) * 100.0
+    return means
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _barrio_base(key: tuple) -> pd.DataFrame:
+    districts = district_base()
+    catalogo = load_catalogo()
+    catalogo = catalogo[catalogo["DISTRITO"].isin(districts.index)]
+    # Cada barrio parte de la fila de su distrito...
+    base = districts.loc[catalogo["DISTRITO"].to_numpy()].reset_index(drop=True)
+    base["BARRIO"] = catalogo["BARRIO"].to_numpy()
+    base["barrio_nombre"] = catalogo["barrio_nombre"].to_numpy()
+    # ...y sustituye las variables que el dataset de viviendas tiene por barrio
+    numeric = [
+        c for c in districts.columns
+        if c not in KEY_COLUMNS and c != "PERIODO" and pd.api.types.is_float_dtype(districts[c])
+    ]
+    try:
+        means = _barrio_rows(load_vivienda(), numeric).reindex(base["BARRIO"])
+    except FileNotFoundError:
+        means = pd.DataFrame(index=base["BARRIO"])
+    for col in means.columns:
+        values = means[col].to_numpy(dtype=np.float64)
+        base[col] = np.where(np.isnan(values), base[col].to_numpy(dtype=np.float64), values)
+    return base.set_index("BARRIO", drop=False)
+
+
+def barrio_key() -> tuple:
+    """Clave de versión de `barrio_base()`: CSV de distritos, catálogo y dataset de viviendas."""
+    try:
+        source = ingest.find_source()
+        source_key = (source, file_key(source))
+    except FileNotFoundError:
+        source_key = None
+    return file_key(DISTRICT_FEATURES_PATH), file_key(CATALOGO_PATH), source_key
+
+
+def barrio_base() -> pd.DataFrame:
+    """
+    Indicadores por barrio del catálogo (indexados por la etiqueta `BARRIO`),
+    con las mismas columnas que `district_base()` más `barrio_nombre`. Las
+    variables que el dataset de viviendas tiene por barrio son la media de sus
+    filas; el resto se heredan del distrito. Compartida y de solo lectura.
+    """
+    return _barrio_base(barrio_key())
+
+
+# ==============================
+# Características del inmueble
+# ==============================
+def to_flag(values) -> np.ndarray:
+    """"Sí"/"No", True/False o 1/0 -> 1.0/0.0 (NaN si no se reconoce)."""
+    text = pd.Series(values, dtype=object).astype(str).str.strip().str.casefold()
+    flags = text.map({"sí": 1.0, "si": 1.0, "s": 1.0, "true": 1.0, "1": 1.0, "1.0": 1.0, "yes": 1.0,
+                      "no": 0.0, "n": 0.0, "false": 0.0, "0": 0.0, "0.0": 0.0})
+    return flags.to_numpy(dtype=np.float64)
+
+
+def _property_frame(props, n: int) -> pd.DataFrame:
+    """Características del inmueble como DataFrame de `n` filas (con valores por defecto)."""
+    if props is None:
+        props = {}
+    if isinstance(props, dict):
+        props = pd.DataFrame({k: [v] * n for k, v in props.items()}, index=range(n))
+    props = props.reset_index(drop=True)
+    for name, default in PROPERTY_DEFAULTS.items():
+        if name not in props:
+            props[name] = default
+        elif props[name].isna().any():
+            props[name] = props[name].fillna(default)
+    return props
+
+
+def apply_property(rows: pd.DataFrame, props) -> pd.DataFrame:
+    """
+    Rellena en `rows` (filas base con nombres del CSV) las columnas que
+    dependen del inmueble. `props` es un dict (mismo inmueble para todas las
+    filas) o un DataFrame alineado por posición.
+
+    Sólo se tocan columnas del propio inmueble; los agregados de la zona
+    (paradas, densidad, turismo...) se mantienen. Dos de ellas son
+    aproximaciones a partir de lo que indica el usuario:
+
+    - `TIPO_VIVIENDA`: NUEVA si la antigüedad no supera
+      `NUEVA_MAX_ANTIGUEDAD` años, USADA en otro caso;
+    - `TIENE_METRO`: la cercanía a metro declarada (en el entrenamiento es
+      "la zona tiene alguna parada de metro").
+    """
+    props = _property_frame(props, len(rows))
+    antiguedad = pd.to_numeric(props["antiguedad"], errors="coerce").to_numpy(dtype=np.float64)
+    metro = to_flag(props["cerca_metro"])
+
+    out = rows.copy()
+    out["TIPO_VIVIENDA"] = np.where(antiguedad <= NUEVA_MAX_ANTIGUEDAD, "NUEVA", "USADA")
+    out["TIENE_METRO"] = np.where(np.isnan(metro), out["TIENE_METRO"].to_numpy(dtype=np.float64), metro)
+
+    # Columnas directas (sólo las usan modelos entrenados con ellas)
+    out["HABITACIONES"] = pd.to_numeric(props["habitaciones"], errors="coerce").to_numpy(dtype=np.float64)
+    out["ASCENSOR"] = to_flag(props["ascensor"])
+    out["ANTIGUEDAD"] = antiguedad
+    return out
+
+
+def property_columns(feature_cols: list[str]) -> dict[str, list[str]]:
+    """
+    Para cada característica del inmueble, las columnas derivadas (nombres del
+    CSV) que el modelo usa de verdad. Una lista vacía indica que el modelo
+    ignora esa característica.
+    """
+    sources = {source_column(c) for c in feature_cols}
+    return {name: [c for c in columns if c in sources] for name, columns in PROPERTY_COLUMNS.items()}
+
+
+# ==============================
+# Filas de entrada del modelo
+# ==============================
+def to_model_columns(rows: pd.DataFrame, feature_cols: list[str]) -> pd.DataFrame:
+    """Selecciona (y traduce con `SOURCE_ALIASES`) las variables del modelo en su orden."""
+    sources = [source_column(c) for c in feature_cols]
+    X = rows.reindex(columns=sources)
+    X.columns = list(feature_cols)
+    return X
+
+
+def build_inputs(distritos, feature_cols: list[str], barrios=None, props=None) -> pd.DataFrame:
+    """
+    Filas de entrada del modelo para cada inmueble.
+
+    - `distritos`: etiquetas `DISTRITO` ("01. Centro"), una por inmueble.
+    - `barrios`: etiquetas `BARRIO` opcionales. Un barrio del catálogo usa su
+      fila de `barrio_base()`; NaN -> fila del distrito (barrio de referencia).
+    - `props`: características del inmueble (dict común o DataFrame por fila).
+
+    Sólo se copian las filas base y se rellenan las columnas que varían; las
+    variables que falten quedan como NaN para que el predictor aplique sus
+    valores por defecto.
+    """
+    rows = district_base().loc[np.asarray(distritos, dtype=object)].reset_index(drop=True)
+    if barrios is not None:
+        barrios = np.asarray(barrios, dtype=object)
+        store = barrio_base()
+        # Búsqueda por índice hash: una fila por barrio, sin recorrer la tabla
+        known = store.index.get_indexer(barrios) >= 0
+        picked = store.reindex(barrios)[rows.columns].reset_index(drop=True)
+        rows = picked.where(np.broadcast_to(known[:, None], rows.shape), rows)
+        rows["BARRIO"] = np.where(pd.isna(barrios), rows["BARRIO"].to_numpy(dtype=object), barrios)
+    rows = apply_property(rows, props)
+    return to_model_columns(rows, feature_cols)
+
+
+def profile(props: dict) -> dict:
+    """Valores de `PROFILE_COLUMNS` que corresponden a un inmueble."""
+    row = apply_property(district_base().iloc[:1], props).iloc[0]
+    return {c: row[c] for c in PROFILE_COLUMNS}
+
+
+def profile_grid(feature_cols: list[str]) -> list[dict] | None:
+    """
+    Inmuebles representativos de cada combinación de `PROFILE_COLUMNS`, para
+    precalcular predicciones. None si el modelo usa columnas directas del
+    inmueble (habitaciones, ascensor o antigüedad) y no se puede precalcular.
+    """
+    if any(c in feature_cols for c in DIRECT_COLUMNS.values()):
+        return None
+    return [
+        dict(PROPERTY_DEFAULTS, antiguedad=antiguedad, cerca_metro=metro)
+        for antiguedad in (0, NUEVA_MAX_ANTIGUEDAD + 1)
+        for metro in ("Sí", "No")
+    ]
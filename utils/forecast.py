@@ -0,0 +1,251 @@
+"""
+Proyecciones P10/P50/P90 del €/m² por distrito.
+
+A partir del histórico anual 2015–2024 de `vivienda_imputada.xlsx` (vía la
+caché Parquet de `utils/ingest.py`) se ajusta, para cada distrito, un paseo
+aleatorio con deriva sobre el logaritmo del precio medio anual:
+
+    log p(t + h) = log p(t) + μ·h + σ·ε·√(h + h²/n)
+
+- μ (deriva) y σ (volatilidad) son los de los crecimientos anuales del
+  distrito, contraídos hacia los de toda la ciudad con un peso de
+  `SHRINKAGE` años (con nueve crecimientos por distrito la estimación propia
+  es ruidosa);
+- el término h²/n añade la incertidumbre de estimar la deriva;
+- P10/P90 usan los cuantiles normales del 10 % y 90 %.
+
+El resultado se materializa una vez en `models/forecast_table.pkl`: histórico
+(distrito × año) y proyección (distrito × mes × P10/P50/P90), junto con la
+huella del dataset de origen. Las páginas lo leen desde caché; si el dataset
+cambia, la tabla se regenera (el ajuste es una pasada de NumPy).
+
+Uso:
+    python -m utils.forecast          # tras subir un dataset nuevo
+"""
+import hashlib
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils import ingest
+from utils.data import file_key, short_name
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models")
+TABLE_NAME = "forecast_table.pkl"
+# Versión del método (forma parte de la huella)
+FORECAST_VERSION = 1
+
+DISTRICT_COLUMN = "DISTRITO_x"
+PERIOD_COLUMN = "PERIODO"
+PRICE_COLUMN = "PRECIO_EUR_M2_x"
+WEIGHT_COLUMN = "TRANSACCIONES_x"
+
+HORIZON_MONTHS = 36
+# Años de "peso" de la media de la ciudad al estimar μ y σ de cada distrito
+SHRINKAGE = 3.0
+# Cuantiles normales estándar de cada banda
+Z_SCORES = {"p10": -1.2815515655446004, "p50": 0.0, "p90": 1.2815515655446004}
+
+
+# ==============================
+# Huella del dataset
+# ==============================
+def source_fingerprint(source: str | None = None) -> str:
+    """Hash SHA-256 del dataset de origen y de la versión del método."""
+    source = source or ingest.find_source()
+    h = hashlib.sha256(f"forecast-v{FORECAST_VERSION}".encode())
+    with open(source, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ==============================
+# Ajuste
+# ==============================
+def district_history(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    €/m² medio anual por distrito (filas) y año (columnas), ponderado por
+    transacciones; los años sin transacciones usan la media simple.
+    """
+    price = pd.to_numeric(df[PRICE_COLUMN], errors="coerce").astype(np.float64)
+    weight = pd.Series(0.0, index=df.index)
+    if WEIGHT_COLUMN in df:
+        weight = pd.to_numeric(df[WEIGHT_COLUMN], errors="coerce").fillna(0).clip(lower=0).astype(np.float64)
+    frame = pd.DataFrame({
+        "DISTRITO": df[DISTRICT_COLUMN].astype(str),
+        "PERIODO": pd.to_numeric(df[PERIOD_COLUMN], errors="coerce"),
+        "precio": price,
+        "peso": weight.where(price.notna(), 0.0),
+        "ponderado": (price * weight).fillna(0.0),
+    }).dropna(subset=["PERIODO", "precio"])
+    grouped = frame.groupby(["DISTRITO", "PERIODO"])
+    sums = grouped[["ponderado", "peso"]].sum()
+    weighted = sums["ponderado"] / sums["peso"].where(sums["peso"] > 0)
+    history = weighted.fillna(grouped["precio"].mean()).unstack("PERIODO").sort_index(axis=1)
+    history.columns = history.columns.astype(int)
+    return history
+
+
+def fit(history: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parámetros por distrito: `ultimo` (último €/m² observado), `periodo`
+    (su año), `mu` y `sigma` (deriva y volatilidad anuales en log) y `n`
+    (crecimientos observados).
+    """
+    values = history.to_numpy(dtype=np.float64)
+    log_p = np.log(np.where(values > 0, values, np.nan))
+    growth = np.diff(log_p, axis=1)
+    valid = ~np.isnan(growth)
+    n = valid.sum(axis=1).astype(np.float64)
+
+    city_mu = np.nanmean(growth) if valid.any() else 0.0
+    city_var = np.nanvar(growth, ddof=1) if valid.sum() > 1 else 0.0
+    g = np.where(valid, growth, 0.0)
+    own_mu = np.divide(g.sum(axis=1), n, out=np.full_like(n, city_mu), where=n > 0)
+    resid = np.where(valid, growth - own_mu[:, None], 0.0)
+    own_ss = (resid ** 2).sum(axis=1)
+    mu = (n * own_mu + SHRINKAGE * city_mu) / (n + SHRINKAGE)
+    var = (own_ss + SHRINKAGE * city_var) / (np.maximum(n - 1, 0) + SHRINKAGE)
+
+    # Último año con precio de cada distrito
+    observed = ~np.isnan(log_p)
+    last_idx = observed.shape[1] - 1 - np.argmax(observed[:, ::-1], axis=1)
+    rows = np.arange(len(values))
+    return pd.DataFrame({
+        "ultimo": values[rows, last_idx],
+        "periodo": history.columns.to_numpy()[last_idx],
+        "mu": mu,
+        "sigma": np.sqrt(var),
+        "n": n,
+    }, index=history.index)
+
+
+def project(params: pd.DataFrame, horizon_months: int = HORIZON_MONTHS) -> pd.DataFrame:
+    """
+    Proyección mensual (mes 0 = último año observado) de P10/P50/P90 para
+    cada distrito: columnas `DISTRITO`, `mes`, `p10`, `p50`, `p90`.
+    """
+    months = np.arange(horizon_months + 1)
+    h = months / 12.0
+    n = np.maximum(params["n"].to_numpy(), 1.0)[:, None]
+    spread = params["sigma"].to_numpy()[:, None] * np.sqrt(h[None, :] + h[None, :] ** 2 / n)
+    center = np.log(params["ultimo"].to_numpy())[:, None] + params["mu"].to_numpy()[:, None] * h[None, :]
+    out = pd.DataFrame({
+        "DISTRITO": np.repeat(params.index.to_numpy(), len(months)),
+        "mes": np.tile(months, len(params)),
+    })
+    for q, z in Z_SCORES.items():
+        out[q] = np.exp(center + z * spread).ravel()
+    return out
+
+
+# ==============================
+# Tabla materializada
+# ==============================
+def build_forecast_table(models_dir: str = MODELS_DIR, save: bool = True) -> dict:
+    """
+    Ajusta los modelos de todos los distritos y guarda histórico, parámetros
+    y proyección en `models/forecast_table.pkl`. Devuelve el contenido.
+    """
+    source = ingest.find_source()
+    history = district_history(ingest.load_dataset())
+    params = fit(history)
+    forecast = project(params)
+    names = dict(zip(history.index, short_name(history.index.to_series())))
+    forecast["distrito_nombre"] = forecast["DISTRITO"].map(names)
+    payload = {
+        "fingerprint": source_fingerprint(source),
+        "history": history,
+        "params": params.assign(distrito_nombre=params.index.map(names)),
+        "forecast": forecast,
+    }
+    if save:
+        tmp_path = os.path.join(models_dir, TABLE_NAME + ".tmp")
+        joblib.dump(payload, tmp_path)
+        os.replace(tmp_path, os.path.join(models_dir, TABLE_NAME))
+    return payload
+
+
+def load_forecast_table(models_dir: str = MODELS_DIR) -> dict | None:
+    """Tabla guardada si existe y corresponde al dataset actual; si no, None."""
+    path = os.path.join(models_dir, TABLE_NAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        payload = joblib.load(path)
+    except Exception:
+        return None
+    if payload.get("fingerprint") != source_fingerprint():
+        return None
+    return payload
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _forecast_table(key: tuple) -> dict:
+    payload = load_forecast_table()
+    if payload is None:
+        try:
+            payload = build_forecast_table()
+        except OSError:
+            # models/ de solo lectura: se sirve la tabla calculada en memoria
+            payload = build_forecast_table(save=False)
+    return payload
+
+
+def forecast_table() -> dict:
+    """
+    Histórico, parámetros y proyección de todos los distritos (ver
+    `build_forecast_table`), cacheados por versión del dataset y de la
+    tabla. Compartidos y de solo lectura.
+    """
+    source = ingest.find_source()
+    path = os.path.join(MODELS_DIR, TABLE_NAME)
+    return _forecast_table((source, file_key(source), file_key(path) if os.path.exists(path) else None))
+
+
+# ==============================
+# Consultas
+# ==============================
+def _district_key(payload: dict, distrito: str) -> str | None:
+    """Etiqueta del distrito en la tabla a partir de la etiqueta o del nombre corto."""
+    params = payload["params"]
+    if distrito in params.index:
+        return distrito
+    match = params.index[params["distrito_nombre"] == short_name(pd.Series([distrito])).iloc[0]]
+    return match[0] if len(match) else None
+
+
+def projection(distrito: str, months: int = 24) -> pd.DataFrame | None:
+    """P10/P50/P90 mensuales (`mes`, `p10`, `p50`, `p90`) de un distrito, o None si no hay histórico."""
+    payload = forecast_table()
+    key = _district_key(payload, distrito)
+    if key is None:
+        return None
+    forecast = payload["forecast"]
+    rows = forecast[(forecast["DISTRITO"] == key) & (forecast["mes"] <= months)]
+    return rows[["mes", *Z_SCORES]].reset_index(drop=True)
+
+
+def history(distrito: str) -> pd.Series | None:
+    """€/m² medio anual observado de un distrito (indexado por año), o None."""
+    payload = forecast_table()
+    key = _district_key(payload, distrito)
+    if key is None:
+        return None
+    return payload["history"].loc[key].dropna()
+
+
+def start_period() -> int:
+    """Año del que parten las proyecciones (último año observado)."""
+    return int(forecast_table()["params"]["periodo"].max())
+
+
+if __name__ == "__main__":
+    payload = build_forecast_table()
+    params = payload["params"]
+    print(f"✅ Proyecciones: {len(params)} distritos × {HORIZON_MONTHS} meses desde {int(params['periodo'].max())} "
+          f"(deriva media {np.expm1(params['mu'].mean()) * 100:+.1f} %/año)")
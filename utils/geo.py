@@ -0,0 +1,265 @@
+"""
+Geometrías de distritos y barrios.
+
+`data/Distritos.json` y `data/Barrios.json` son TopoJSON: los polígonos se
+describen como listas de arcos compartidos, con coordenadas enteras
+delta-codificadas y una transformación (escala + traslación) a lon/lat.
+
+Este módulo decodifica cada archivo una sola vez por proceso, simplifica los
+arcos (Douglas-Peucker) a varias tolerancias según el zoom y une cada polígono
+con las claves de `district_features.csv` y del catálogo de barrios. El
+resultado son capas GeoJSON compactas (coordenadas redondeadas a ~1 m),
+cacheadas y compartidas entre sesiones, que pydeck dibuja directamente.
+
+Como la simplificación se hace por arco y los arcos son compartidos, los
+límites entre polígonos vecinos siguen coincidiendo a cualquier tolerancia.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.data import (
+    BASE_DIR, CATALOGO_PATH, DISTRICT_FEATURES_PATH, file_key, load_catalogo, load_district_table,
+)
+
+BARRIOS_PATH = os.path.join(BASE_DIR, "data", "Barrios.json")
+DISTRITOS_PATH = os.path.join(BASE_DIR, "data", "Distritos.json")
+
+# Nivel -> (archivo, objeto TopoJSON)
+LEVELS = {
+    "distrito": (DISTRITOS_PATH, "DISTRITOS"),
+    "barrio": (BARRIOS_PATH, "BARRIOS"),
+}
+
+# Tolerancia de simplificación (grados) según el zoom mínimo del mapa.
+# 1e-4 grados son ~10 m en Madrid.
+ZOOM_TOLERANCES = [(14, 0.0), (12, 5e-5), (10, 2e-4), (0, 6e-4)]
+
+# Decimales de las coordenadas en las capas (5 decimales ~ 1 m)
+COORD_DECIMALS = 5
+
+# Rampa de color de las coropletas (marca: gris azulado -> azul oscuro)
+COLOR_LOW = (230, 236, 247)
+COLOR_HIGH = (13, 71, 161)
+
+
+# ==============================
+# Decodificación TopoJSON
+# ==============================
+def decode_arcs(topology: dict) -> list[np.ndarray]:
+    """Arcos de la topología como arrays (n, 2) de lon/lat."""
+    transform = topology.get("transform")
+    arcs = []
+    for arc in topology["arcs"]:
+        points = np.asarray(arc, dtype=np.float64)
+        if transform:
+            points = np.cumsum(points, axis=0) * transform["scale"] + transform["translate"]
+        arcs.append(points)
+    return arcs
+
+
+def _ring(arc_ids: list[int], arcs: list[np.ndarray]) -> np.ndarray:
+    """Une los arcos de un anillo (índice negativo ~i = arco i invertido)."""
+    parts = []
+    for k, i in enumerate(arc_ids):
+        points = arcs[i] if i >= 0 else arcs[~i][::-1]
+        parts.append(points if k == 0 else points[1:])
+    return np.concatenate(parts)
+
+
+def _polygons(geometry: dict) -> list[list[list[int]]]:
+    """Polígonos (listas de anillos de arcos) de una geometría Polygon/MultiPolygon."""
+    if geometry["type"] == "Polygon":
+        return [geometry["arcs"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["arcs"]
+    return []
+
+
+def simplify(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker: conserva extremos y puntos a más de `tolerance` de la cuerda."""
+    if tolerance <= 0 or len(points) <= 2:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = points[start], points[end]
+        segment = points[start + 1:end] - a
+        chord = b - a
+        norm = np.hypot(*chord)
+        if norm == 0:
+            dist = np.hypot(segment[:, 0], segment[:, 1])
+        else:
+            dist = np.abs(chord[0] * segment[:, 1] - chord[1] * segment[:, 0]) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return points[keep]
+
+
+def tolerance_for_zoom(zoom: float) -> float:
+    """Tolerancia de simplificación adecuada para un nivel de zoom."""
+    for min_zoom, tolerance in ZOOM_TOLERANCES:
+        if zoom >= min_zoom:
+            return tolerance
+    return ZOOM_TOLERANCES[-1][1]
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _read_topology(path: str, key: tuple[int, int]) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _decoded_arcs(path: str, key: tuple[int, int]) -> list[np.ndarray]:
+    return decode_arcs(_read_topology(path, key))
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _shapes(level: str, tolerance: float, key: tuple[int, int]) -> list[tuple[dict, list]]:
+    """(propiedades originales, polígonos como listas de anillos (n, 2)) de cada geometría."""
+    path, object_name = LEVELS[level]
+    topology = _read_topology(path, key)
+    arcs = _decoded_arcs(path, key)
+    if tolerance > 0:
+        arcs = [simplify(arc, tolerance) for arc in arcs]
+    shapes = []
+    for geometry in topology["objects"][object_name]["geometries"]:
+        shape = [[_ring(ring, arcs) for ring in polygon] for polygon in _polygons(geometry)]
+        shapes.append((geometry.get("properties") or {}, shape))
+    return shapes
+
+
+def polygons(level: str = "barrio", tolerance: float = 0.0) -> list[tuple[dict, list]]:
+    """
+    Geometrías decodificadas de un nivel: lista de (propiedades TopoJSON,
+    polígonos), cada polígono una lista de anillos (n, 2) lon/lat (el primero
+    es el exterior). Compartidas y de solo lectura.
+    """
+    path, _ = LEVELS[level]
+    return _shapes(level, tolerance, file_key(path))
+
+
+# ==============================
+# Unión con los datasets
+# ==============================
+def _code(values: pd.Series) -> pd.Series:
+    """Código numérico de una etiqueta del catálogo ("011. Palacio" -> "011")."""
+    return values.astype(str).str.split(".").str[0].str.strip()
+
+
+def shape_keys(props: dict, level: str) -> dict:
+    """Códigos del distrito (dos dígitos) y del barrio (tres dígitos) de una geometría."""
+    keys = {"cod_distrito": str(props.get("COD_DIS_TX", "")).zfill(2)}
+    if level == "barrio":
+        keys["cod_barrio"] = str(props.get("COD_BAR", "")).zfill(3)
+    return keys
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _layer(level: str, tolerance: float, key: tuple) -> dict:
+    districts = load_district_table()
+    district_labels = dict(zip(_code(districts["distrito"]), districts["distrito"]))
+    district_names = dict(zip(_code(districts["distrito"]), districts["distrito_nombre"]))
+    catalogo = load_catalogo()
+    barrio_labels = dict(zip(_code(catalogo["BARRIO"]), catalogo["BARRIO"]))
+    barrio_names = dict(zip(_code(catalogo["BARRIO"]), catalogo["barrio_nombre"]))
+
+    features = []
+    for props, shape in polygons(level, tolerance):
+        codes = shape_keys(props, level)
+        cod_dis = codes["cod_distrito"]
+        properties = {
+            "DISTRITO": district_labels.get(cod_dis, f"{cod_dis}. {props.get('NOMDIS', props.get('NOMBRE', ''))}"),
+            "distrito_nombre": district_names.get(cod_dis, props.get("NOMDIS", props.get("NOMBRE", ""))),
+        }
+        if level == "barrio":
+            cod_bar = codes["cod_barrio"]
+            properties["BARRIO"] = barrio_labels.get(cod_bar, f"{cod_bar}. {props.get('NOMBRE', '')}")
+            properties["barrio_nombre"] = barrio_names.get(cod_bar, props.get("NOMBRE", ""))
+        coordinates = [
+            [np.round(ring, COORD_DECIMALS).tolist() for ring in polygon]
+            for polygon in shape
+        ]
+        geometry = (
+            {"type": "Polygon", "coordinates": coordinates[0]}
+            if len(coordinates) == 1
+            else {"type": "MultiPolygon", "coordinates": coordinates}
+        )
+        features.append({"type": "Feature", "geometry": geometry, "properties": properties})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def load_layer(level: str = "barrio", zoom: float = 11) -> dict:
+    """
+    Capa GeoJSON (FeatureCollection) de distritos o barrios simplificada para
+    `zoom`, con las claves de los datasets en `properties`: `DISTRITO` y
+    `distrito_nombre` (y `BARRIO`, `barrio_nombre` en el nivel barrio), con
+    las mismas etiquetas que `district_features.csv` y el catálogo.
+    Compartida y de solo lectura.
+    """
+    path, _ = LEVELS[level]
+    key = (file_key(path), file_key(DISTRICT_FEATURES_PATH), file_key(CATALOGO_PATH))
+    return _layer(level, tolerance_for_zoom(zoom), key)
+
+
+# ==============================
+# Coropletas
+# ==============================
+def color_scale(values, low=COLOR_LOW, high=COLOR_HIGH) -> np.ndarray:
+    """Colores RGB (n, 3) interpolados linealmente entre `low` y `high` (NaN -> gris)."""
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    lo, hi = (values[finite].min(), values[finite].max()) if finite.any() else (0.0, 0.0)
+    t = np.where(finite, (values - lo) / (hi - lo) if hi > lo else 0.5, 0.0)
+    colors = np.asarray(low) + t[:, None] * (np.asarray(high) - np.asarray(low))
+    colors[~finite] = (200, 200, 200)
+    return colors.round().astype(int)
+
+
+def choropleth(
+    values: pd.Series,
+    level: str = "barrio",
+    zoom: float = 11,
+    key_column: str | None = None,
+    value_format: str = "{:,.0f}",
+) -> dict:
+    """
+    Capa de `load_layer()` con cada feature coloreada según `values`.
+
+    `values` es una Series indexada por la clave `key_column` de `properties`
+    (por defecto `DISTRITO`; en el nivel barrio, si el índice son etiquetas de
+    barrio, usar `key_column="BARRIO"`). Añade `value`, `value_label` (texto
+    con `value_format`, para tooltips) y `fill_color` a las propiedades; la
+    geometría se reutiliza sin copiarla.
+    """
+    layer = load_layer(level, zoom)
+    key_column = key_column or "DISTRITO"
+    keys = [f["properties"].get(key_column) for f in layer["features"]]
+    mapped = values.reindex(keys).to_numpy(dtype=np.float64)
+    colors = color_scale(mapped)
+    features = [
+        {
+            "type": "Feature",
+            "geometry": feature["geometry"],
+            "properties": {
+                **feature["properties"],
+                "value": None if np.isnan(value) else float(value),
+                "value_label": "s/d" if np.isnan(value) else value_format.format(value),
+                "fill_color": [*color.tolist(), 190],
+            },
+        }
+        for feature, value, color in zip(layer["features"], mapped, colors)
+    ]
+    return {"type": "FeatureCollection", "features": features}
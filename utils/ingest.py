@@ -0,0 +1,178 @@
+"""
+Caché columnar del dataset de viviendas.
+
+Leer `data/vivienda_imputada.xlsx` con openpyxl es, con diferencia, el paso más
+lento del entrenamiento. Este módulo convierte el dataset de origen (xlsx, xls
+o csv, tal y como lo sube el panel de administración) una sola vez a Parquet
+con tipos optimizados:
+
+- enteros reducidos al tipo más pequeño que los representa;
+- flotantes a float32 sólo cuando la conversión no pierde precisión;
+- columnas de texto como categóricas.
+
+Junto al Parquet se guarda un JSON con el esquema y la huella del archivo de
+origen (mtime, tamaño y SHA-256). Las lecturas comprueban esa huella y
+regeneran la caché si el origen ha cambiado.
+
+Uso:
+    python -m utils.ingest          # (re)genera la caché del dataset actual
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DATA_DIR = os.path.join(BASE_DIR, "data")
+CACHE_DIR = os.path.join(DATA_DIR, ".cache")
+DATASET_NAME = "vivienda_imputada"
+SOURCE_EXTENSIONS = (".xlsx", ".xls", ".csv")
+SCHEMA_VERSION = 1
+
+
+# ==============================
+# Origen
+# ==============================
+def find_source(name: str = DATASET_NAME) -> str:
+    """
+    Archivo de origen del dataset: el más reciente de `data/<name>.{xlsx,xls,csv}`
+    (el panel de administración guarda la última subida con su extensión).
+    """
+    candidates = [os.path.join(DATA_DIR, name + ext) for ext in SOURCE_EXTENSIONS]
+    existing = [p for p in candidates if os.path.exists(p)]
+    if not existing:
+        raise FileNotFoundError(f"No se encontró data/{name} con extensión {', '.join(SOURCE_EXTENSIONS)}")
+    return max(existing, key=os.path.getmtime)
+
+
+def read_source(path: str) -> pd.DataFrame:
+    """Lee el dataset de origen (Excel o CSV)."""
+    if path.lower().endswith(".csv"):
+        return pd.read_csv(path)
+    return pd.read_excel(path)
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _source_info(path: str) -> dict:
+    stat = os.stat(path)
+    return {
+        "path": os.path.basename(path),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+    }
+
+
+# ==============================
+# Optimización de tipos
+# ==============================
+def optimize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce el tamaño en memoria sin cambiar ningún valor: enteros al tipo
+    mínimo, float64 -> float32 sólo si es exacto y texto -> categórico.
+    """
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_integer_dtype(s):
+            s = pd.to_numeric(s, downcast="integer")
+        elif pd.api.types.is_float_dtype(s):
+            as32 = s.astype(np.float32)
+            if np.array_equal(as32.to_numpy(np.float64), s.to_numpy(np.float64), equal_nan=True):
+                s = as32
+        elif pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+            s = s.astype("category")
+        out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+# ==============================
+# Caché
+# ==============================
+def cache_paths(name: str = DATASET_NAME) -> tuple[str, str]:
+    """Rutas (parquet, esquema JSON) de la caché de un dataset."""
+    return (
+        os.path.join(CACHE_DIR, f"{name}.parquet"),
+        os.path.join(CACHE_DIR, f"{name}.schema.json"),
+    )
+
+
+def read_schema(name: str = DATASET_NAME) -> dict | None:
+    """Esquema y huella del origen guardados junto a la caché (None si no existe)."""
+    _, schema_path = cache_paths(name)
+    try:
+        with open(schema_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_json(path: str, payload: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def build_cache(source: str | None = None, name: str = DATASET_NAME) -> pd.DataFrame:
+    """Convierte el origen a Parquet tipado y guarda el esquema. Devuelve el DataFrame."""
+    source = source or find_source(name)
+    df = optimize_dtypes(read_source(source))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    parquet_path, schema_path = cache_paths(name)
+    tmp_path = parquet_path + ".tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, parquet_path)
+    _write_json(schema_path, {
+        "version": SCHEMA_VERSION,
+        "source": dict(_source_info(source), sha256=_sha256(source)),
+        "rows": len(df),
+        "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
+        "memory_bytes": int(df.memory_usage(deep=True).sum()),
+    })
+    return df
+
+
+def is_fresh(source: str | None = None, name: str = DATASET_NAME) -> bool:
+    """
+    True si la caché corresponde al origen actual. Si sólo cambió la fecha
+    (mismo contenido), se actualiza la huella sin regenerar.
+    """
+    source = source or find_source(name)
+    schema = read_schema(name)
+    parquet_path, schema_path = cache_paths(name)
+    if schema is None or schema.get("version") != SCHEMA_VERSION or not os.path.exists(parquet_path):
+        return False
+    cached, current = schema["source"], _source_info(source)
+    if cached["path"] != current["path"] or cached["size"] != current["size"]:
+        return False
+    if cached["mtime_ns"] == current["mtime_ns"]:
+        return True
+    if cached.get("sha256") == _sha256(source):
+        schema["source"].update(current)
+        _write_json(schema_path, schema)
+        return True
+    return False
+
+
+def load_dataset(name: str = DATASET_NAME) -> pd.DataFrame:
+    """Dataset completo desde la caché Parquet, regenerándola si el origen cambió."""
+    source = find_source(name)
+    if not is_fresh(source, name):
+        return build_cache(source, name)
+    return pd.read_parquet(cache_paths(name)[0])
+
+
+if __name__ == "__main__":
+    df = build_cache()
+    schema = read_schema()
+    print(f"✅ Caché generada: {schema['rows']} filas, {len(schema['dtypes'])} columnas, "
+          f"{schema['memory_bytes'] / 1024:.0f} KB en memoria (origen {schema['source']['path']})")
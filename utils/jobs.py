@@ -0,0 +1,233 @@
+"""
+Trabajos de entrenamiento en segundo plano.
+
+El panel de administración lanza `train_quantiles.py` en un proceso
+independiente en lugar de bloquear el hilo del script de Streamlit. El estado
+del trabajo se persiste en `.jobs/train.json` (queued/running/done/failed,
+tiempos, métricas por cuantil) y la salida en `.jobs/train_<id>.log`, de modo
+que cualquier sesión puede consultar el mismo entrenamiento y no se lanzan
+entrenamientos duplicados.
+
+El proceso lanzado es este mismo módulo (`python -m utils.jobs run <id>`), que
+ejecuta el script, espera a que termine y registra el resultado aunque la
+sesión que lo inició ya no exista.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+JOBS_DIR = os.path.join(BASE_DIR, ".jobs")
+STATE_PATH = os.path.join(JOBS_DIR, "train.json")
+LOCK_PATH = os.path.join(JOBS_DIR, "train.lock")
+TRAIN_SCRIPT = "train_quantiles.py"
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# Líneas de métricas impresas por train_quantiles.py:
+#   alpha=0.1 | MAE=123.45 | RMSE=234.56 | R2=0.912
+METRICS_RE = re.compile(
+    r"alpha=(?P<alpha>[\d.]+)\s*\|\s*MAE=(?P<mae>[-\d.]+)\s*\|\s*RMSE=(?P<rmse>[-\d.]+)\s*\|\s*R2=(?P<r2>[-\d.]+)"
+)
+
+# Procesos lanzados desde este proceso (pid -> Popen): se recogen con `poll()`
+# para que un proceso terminado no quede como zombi y parezca vivo
+_runners: dict[int, subprocess.Popen] = {}
+
+
+# ==============================
+# Persistencia del estado
+# ==============================
+@contextmanager
+def _locked():
+    """Bloqueo exclusivo entre procesos/sesiones mientras se lee y escribe el estado."""
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    with open(LOCK_PATH, "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_state() -> dict | None:
+    try:
+        with open(STATE_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_state(job: dict):
+    """Escritura atómica (archivo temporal + rename) para no dejar JSON a medias."""
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(job, f, indent=2)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def _update_state(job_id: str, **changes) -> dict | None:
+    with _locked():
+        job = _read_state()
+        if job is None or job.get("id") != job_id:
+            return None
+        job.update(changes)
+        _write_state(job)
+        return job
+
+
+def _pid_alive(pid: int | None) -> bool:
+    """
+    True si el proceso sigue en ejecución. Un hijo terminado se recoge aquí
+    (`poll()`/`waitpid`): `os.kill(pid, 0)` también funciona sobre un zombi.
+    """
+    if not pid:
+        return False
+    runner = _runners.get(pid)
+    if runner is not None:
+        if runner.poll() is None:
+            return True
+        del _runners[pid]
+        return False
+    if hasattr(os, "WNOHANG"):
+        try:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            pass  # no es hijo de este proceso (otro servidor o un reinicio)
+        else:
+            if done == pid:
+                return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# ==============================
+# API pública
+# ==============================
+def parse_metrics(log_text: str) -> list[dict]:
+    """Extrae las métricas por cuantil (`alpha=... | MAE=...`) de la salida del entrenamiento."""
+    return [
+        {k: float(v) for k, v in m.groupdict().items()}
+        for m in METRICS_RE.finditer(log_text)
+    ]
+
+
+def read_log(job: dict, max_chars: int | None = None) -> str:
+    """Devuelve el log del trabajo (o sus últimos `max_chars` caracteres)."""
+    path = job.get("log_path")
+    if not path or not os.path.exists(path):
+        return ""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    return text[-max_chars:] if max_chars else text
+
+
+def elapsed(job: dict) -> float:
+    """Segundos transcurridos desde el inicio (o duración total si ha terminado)."""
+    start = job.get("started_at") or job.get("created_at")
+    if start is None:
+        return 0.0
+    end = job.get("finished_at") or time.time()
+    return max(0.0, end - start)
+
+
+def get_job() -> dict | None:
+    """
+    Estado del último entrenamiento. Si figura como activo pero su proceso ya
+    no existe (p. ej. reinicio del servidor), se marca como fallido.
+    """
+    job = _read_state()
+    if job and job["status"] in ACTIVE_STATUSES and not _pid_alive(job.get("pid")):
+        # Margen para el arranque del proceso recién lanzado
+        if time.time() - job["created_at"] > 10:
+            job = _update_state(
+                job["id"], status="failed", finished_at=time.time(),
+                error="El proceso de entrenamiento terminó de forma inesperada.",
+            ) or job
+    return job
+
+
+def start_training(args: list[str] | None = None) -> tuple[dict, bool]:
+    """
+    Lanza el entrenamiento en segundo plano, salvo que ya haya uno activo.
+    Devuelve (trabajo, creado): `creado` es False si se reutiliza el existente.
+    """
+    with _locked():
+        job = _read_state()
+        if job and job["status"] in ACTIVE_STATUSES and _pid_alive(job.get("pid")):
+            return job, False
+        job_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "args": list(args or []),
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "returncode": None,
+            "metrics": [],
+            "error": None,
+            "log_path": os.path.join(JOBS_DIR, f"train_{job_id}.log"),
+            "pid": None,
+        }
+        runner = subprocess.Popen(
+            [sys.executable, "-m", "utils.jobs", "run", job_id],
+            cwd=BASE_DIR,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        job["pid"] = runner.pid
+        _runners[runner.pid] = runner
+        _write_state(job)
+        return job, True
+
+
+def _run(job_id: str):
+    """Cuerpo del proceso en segundo plano: ejecuta el script y registra el resultado."""
+    job = _update_state(job_id, status="running", started_at=time.time(), pid=os.getpid())
+    if job is None:
+        return
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    try:
+        with open(job["log_path"], "w", encoding="utf-8") as log:
+            proc = subprocess.run(
+                [sys.executable, TRAIN_SCRIPT, *job["args"]],
+                cwd=BASE_DIR, stdout=log, stderr=subprocess.STDOUT, env=env,
+            )
+        returncode, error = proc.returncode, None
+    except Exception as e:
+        returncode, error = -1, str(e)
+    _update_state(
+        job_id,
+        status="done" if returncode == 0 else "failed",
+        finished_at=time.time(),
+        returncode=returncode,
+        metrics=parse_metrics(read_log(job)),
+        error=error,
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "run":
+        _run(sys.argv[2])
+    else:
+        print("Uso: python -m utils.jobs run <job_id>")
@@ -0,0 +1,253 @@
+"""
+Instrumentación ligera de tiempos.
+
+Cada medida es un evento `(instante, nombre, segundos, tipo, sesión)` que se
+guarda en un búfer circular en memoria compartido por el proceso (un `deque`
+con tamaño máximo: añadir es O(1) y seguro entre hilos, y los eventos antiguos
+se descartan solos). El coste por medida es el de dos `perf_counter()` y un
+`append`; con SMARTHOUSING_PERF=0 se desactiva por completo.
+
+- `timer(nombre)`: gestor de contexto.
+- `timed(nombre)`: decorador.
+- Tipos: "call" (llamada pública), "miss" (cuerpo de una función cacheada que
+  se ejecutó, es decir, fallo de caché) y "rerun" (ejecución completa de una
+  página, entre `start_rerun()` y `end_rerun()`). Con ambos, la tasa de
+  aciertos de una caché es 1 − misses / calls.
+
+`summary()` agrega p50/p95 por nombre, `sessions()` estima la memoria de
+`st.session_state` de cada sesión activa y `export()` vuelca los eventos a un
+archivo JSON Lines. El panel de administración muestra los tres.
+
+La memoria de una sesión no se mide en cada rerun: sólo en el primero, cada
+SMARTHOUSING_PERF_MEMORY_EVERY reruns (20 por defecto) y en el siguiente
+rerun tras `request_memory()` (botón del panel). La estimación no serializa
+nada: arrays y DataFrames por sus buffers y contenedores por muestreo.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+ENABLED = os.environ.get("SMARTHOUSING_PERF", "1") != "0"
+BUFFER_SIZE = int(os.environ.get("SMARTHOUSING_PERF_BUFFER", "20000"))
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".perf")
+KINDS = ("call", "miss", "rerun")
+MEMORY_EVERY = max(1, int(os.environ.get("SMARTHOUSING_PERF_MEMORY_EVERY", "20")))
+# Profundidad y elementos por contenedor que recorre `sizeof()` (el resto se extrapola)
+SIZEOF_DEPTH = 3
+SIZEOF_SAMPLE = 100
+
+_events: deque = deque(maxlen=BUFFER_SIZE)
+# Nombres medidos con kind="miss" (funciones cacheadas): sólo ellos tienen tasa de aciertos
+_cached: set[str] = set()
+# Sesión -> {"page", "bytes", "keys", "seen", "reruns", "measured"} (última ejecución)
+_sessions: dict[str, dict] = {}
+_sessions_lock = threading.Lock()
+# Instante de la última petición de medida de memoria (`request_memory()`)
+_memory_requested = 0.0
+
+
+def _session_id() -> str | None:
+    """Identificador de la sesión de Streamlit del hilo actual (None fuera de una sesión)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except Exception:
+        return None
+    return ctx.session_id if ctx is not None else None
+
+
+# ==============================
+# Registro de eventos
+# ==============================
+def record(name: str, seconds: float, kind: str = "call"):
+    """Añade una medida al búfer."""
+    if ENABLED:
+        _events.append((time.time(), name, seconds, kind, _session_id()))
+
+
+@contextmanager
+def timer(name: str, kind: str = "call"):
+    """Mide el bloque; se registra también si lanza una excepción."""
+    if not ENABLED:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0, kind)
+
+
+def timed(name: str | None = None, kind: str = "call"):
+    """
+    Decorador equivalente a `timer()`. Con `kind="miss"` sobre la función que
+    decora `st.cache_resource` (debajo del decorador de caché) sólo se mide
+    cuando la caché falla.
+    """
+    def decorator(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+        if kind == "miss":
+            _cached.add(label)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(label, time.perf_counter() - t0, kind)
+        return wrapper
+    return decorator
+
+
+# ==============================
+# Ejecuciones de página y memoria por sesión
+# ==============================
+def start_rerun(page: str):
+    """Marca el inicio de una ejecución de `page` (al principio del script de la página)."""
+    if not ENABLED:
+        return
+    import streamlit as st
+    st.session_state["_perf_rerun"] = (page, time.perf_counter())
+
+
+def end_rerun():
+    """Cierra la ejecución abierta por `start_rerun()` y actualiza la memoria de la sesión."""
+    if not ENABLED:
+        return
+    import streamlit as st
+    started = st.session_state.pop("_perf_rerun", None)
+    if started is None:
+        return
+    page, t0 = started
+    record(f"page:{page}", time.perf_counter() - t0, "rerun")
+    session = _session_id()
+    if session is None:
+        return
+    with _sessions_lock:
+        info = _sessions.setdefault(session, {"bytes": None, "keys": 0, "reruns": 0, "measured": 0.0})
+        info["reruns"] += 1
+        info["page"], info["seen"] = page, time.time()
+        measure = (info["reruns"] - 1) % MEMORY_EVERY == 0 or info["measured"] < _memory_requested
+    if measure:
+        values = [v for k, v in st.session_state.items() if not str(k).startswith("_perf")]
+        size = sum(sizeof(v) for v in values)
+        with _sessions_lock:
+            info.update(bytes=size, keys=len(values), measured=time.time())
+
+
+def request_memory():
+    """Pide que cada sesión mida su memoria en su próximo rerun."""
+    global _memory_requested
+    _memory_requested = time.time()
+
+
+def sizeof(obj, _depth: int = 0) -> int:
+    """
+    Tamaño aproximado en bytes, sin serializar: DataFrames/Series y arrays por
+    sus buffers (`memory_usage(deep=False)`, `nbytes`); listas, tuplas,
+    conjuntos y dicts recorriendo hasta SIZEOF_DEPTH niveles y SIZEOF_SAMPLE
+    elementos (el resto se extrapola).
+    """
+    if hasattr(obj, "memory_usage") and hasattr(obj, "dtypes"):
+        usage = obj.memory_usage(index=True, deep=False)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    size = sys.getsizeof(obj)
+    if _depth >= SIZEOF_DEPTH or not isinstance(obj, (dict, list, tuple, set, frozenset)) or not obj:
+        return size
+    items = obj.items() if isinstance(obj, dict) else obj
+    sample = [item for _, item in zip(range(SIZEOF_SAMPLE), items)]
+    if isinstance(obj, dict):
+        content = sum(sizeof(k, _depth + 1) + sizeof(v, _depth + 1) for k, v in sample)
+    else:
+        content = sum(sizeof(v, _depth + 1) for v in sample)
+    return size + content * len(obj) // len(sample)
+
+
+def sessions(active: set[str] | None = None) -> list[dict]:
+    """
+    Memoria estimada de `st.session_state` por sesión (última ejecución
+    medida), de mayor a menor. Con `active` se descartan las sesiones cerradas.
+    Las sesiones aún sin medir se omiten.
+    """
+    with _sessions_lock:
+        if active is not None:
+            for session in [s for s in _sessions if s not in active]:
+                del _sessions[session]
+        rows = [{"session": s, **info} for s, info in _sessions.items() if info["bytes"] is not None]
+    return sorted(rows, key=lambda r: -r["bytes"])
+
+
+def active_sessions() -> set[str] | None:
+    """Sesiones abiertas en el servidor (None si no se puede consultar el runtime)."""
+    try:
+        from streamlit.runtime import get_instance
+        manager = get_instance()._session_mgr
+        return {info.session.id for info in manager.list_active_sessions()}
+    except Exception:
+        return None
+
+
+# ==============================
+# Agregados y exportación
+# ==============================
+def events(since: float | None = None) -> list[tuple]:
+    """Copia de los eventos del búfer (opcionalmente desde el instante `since`)."""
+    snapshot = list(_events)
+    if since is not None:
+        snapshot = [e for e in snapshot if e[0] >= since]
+    return snapshot
+
+
+def summary(since: float | None = None) -> list[dict]:
+    """
+    Por nombre: número de llamadas, fallos de caché, tasa de aciertos (sólo
+    funciones cacheadas) y p50/p95/máximo/total en ms. Los percentiles se
+    calculan sobre las llamadas (o sobre los fallos si el nombre sólo tiene
+    fallos). Ordenado por tiempo total.
+    """
+    groups: dict[str, dict[str, list]] = {}
+    for _, name, seconds, kind, _ in events(since):
+        groups.setdefault(name, {k: [] for k in KINDS})[kind].append(seconds)
+    rows = []
+    for name, by_kind in groups.items():
+        calls, misses = by_kind["call"], by_kind["miss"]
+        samples = np.asarray(calls or by_kind["rerun"] or misses) * 1000
+        rows.append({
+            "name": name,
+            "calls": len(calls) or len(samples),
+            "misses": len(misses),
+            "hit_rate": max(0.0, 1 - len(misses) / len(calls)) if calls and name in _cached else None,
+            "p50_ms": float(np.percentile(samples, 50)),
+            "p95_ms": float(np.percentile(samples, 95)),
+            "max_ms": float(samples.max()),
+            "total_ms": float(samples.sum()),
+        })
+    return sorted(rows, key=lambda r: -r["total_ms"])
+
+
+def export(path: str | None = None) -> str:
+    """Vuelca los eventos del búfer a JSON Lines y devuelve la ruta escrita."""
+    if path is None:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, f"perf-{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+    with open(path, "w") as f:
+        for ts, name, seconds, kind, session in events():
+            f.write(json.dumps({"ts": ts, "name": name, "ms": seconds * 1000, "kind": kind, "session": session}) + "\n")
+    return path
+
+
+def clear():
+    """Vacía el búfer de eventos."""
+    _events.clear()
@@ -0,0 +1,193 @@
+"""
+Valoración por lotes de una cartera de inmuebles.
+
+Lee un CSV de inmuebles por bloques (`chunksize` filas), resuelve el distrito
+y el barrio de cada fila (por nombre o por coordenadas), predice P10/P50/P90
+con el `QuantilePredictor` del registro y escribe cada bloque valorado en el
+CSV de salida en cuanto está listo. En memoria sólo hay un bloque a la vez,
+así que el tamaño de la cartera no está limitado por la RAM.
+
+Columnas reconocidas (sin distinguir mayúsculas ni acentos):
+- `distrito` (nombre o etiqueta "01. Centro") y/o `barrio`, o bien
+  `latitud`/`longitud` (también `lat`/`lon`);
+- `superficie` (m², obligatoria para los totales);
+- `habitaciones`, `ascensor`, `cerca_metro`, `antiguedad` (opcionales; se
+  traducen a variables del modelo con `utils/features.py` y se conservan en
+  la salida).
+"""
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from utils.data import load_catalogo, load_district_features, short_name
+from utils.features import PROPERTY_DEFAULTS, build_inputs
+from utils.prediction import QuantilePredictor
+from utils.spatial import locate
+
+CHUNK_SIZE = 10_000
+
+# Nombre normalizado de columna -> nombre canónico
+COLUMN_ALIASES = {
+    "distrito": "distrito",
+    "barrio": "barrio",
+    "superficie": "superficie",
+    "superficie_m2": "superficie",
+    "m2": "superficie",
+    "habitaciones": "habitaciones",
+    "ascensor": "ascensor",
+    "cerca_metro": "cerca_metro",
+    "antiguedad": "antiguedad",
+    "latitud": "latitud",
+    "lat": "latitud",
+    "longitud": "longitud",
+    "lon": "longitud",
+    "lng": "longitud",
+}
+
+# Plantilla de entrada (la página la muestra y la ofrece para descargar)
+TEMPLATE = pd.DataFrame({
+    "distrito": ["Centro", "Chamberí", "", "Retiro"],
+    "barrio": ["Palacio", "", "", ""],
+    "latitud": ["", "", 40.4530, ""],
+    "longitud": ["", "", -3.6890, ""],
+    "superficie": [85, 120, 64, 95],
+    "habitaciones": [2, 3, 1, 3],
+    "ascensor": ["Sí", "Sí", "No", "Sí"],
+    "cerca_metro": ["Sí", "No", "Sí", "Sí"],
+    "antiguedad": [35, 60, 12, 48],
+})
+
+OUTPUT_COLUMNS = ["DISTRITO", "BARRIO", "p10", "p50", "p90", "total_p10", "total_p50", "total_p90", "error"]
+
+
+# ==============================
+# Normalización de entradas
+# ==============================
+def normalize_text(values: pd.Series) -> pd.Series:
+    """Texto en minúsculas, sin acentos ni prefijo numérico ("01. Chamberí" -> "chamberi")."""
+    def _plain(text: str) -> str:
+        decomposed = unicodedata.normalize("NFKD", text)
+        return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold().strip()
+
+    return short_name(values.fillna("")).map(_plain)
+
+
+def canonical_columns(columns) -> dict:
+    """{columna original: nombre canónico} de las columnas reconocidas."""
+    normalized = normalize_text(pd.Series(list(columns), dtype=object)).str.replace(r"[\s\-]+", "_", regex=True)
+    return {
+        original: COLUMN_ALIASES[name]
+        for original, name in zip(columns, normalized)
+        if name in COLUMN_ALIASES
+    }
+
+
+def lookup_tables() -> tuple[dict, dict]:
+    """Etiquetas de distrito y de barrio (por distrito) indexadas por nombre normalizado."""
+    districts = load_district_features()
+    district_by_name = dict(zip(normalize_text(districts["DISTRITO"]), districts["DISTRITO"]))
+    catalogo = load_catalogo()
+    barrio_by_name = dict(zip(
+        zip(catalogo["DISTRITO"], normalize_text(catalogo["BARRIO"])), catalogo["BARRIO"]
+    ))
+    return district_by_name, barrio_by_name
+
+
+def resolve_locations(chunk: pd.DataFrame, district_by_name: dict, barrio_by_name: dict) -> pd.DataFrame:
+    """
+    `DISTRITO`/`BARRIO` (etiquetas del catálogo) de cada fila. Las coordenadas
+    tienen prioridad sobre los nombres; un barrio desconocido se ignora y la
+    fila se valora con el barrio de referencia del distrito.
+    """
+    # Columnas `object` construidas por separado: con pandas 3 un bloque de texto
+    # (dtype "str") no admite asignar arrays con NaN de otro tipo
+    district = pd.Series(np.nan, index=chunk.index, dtype=object)
+    barrio = pd.Series(np.nan, index=chunk.index, dtype=object)
+    if "distrito" in chunk:
+        district = normalize_text(chunk["distrito"].astype("string")).map(district_by_name).astype(object)
+    if "barrio" in chunk:
+        names = normalize_text(chunk["barrio"].astype("string"))
+        barrio = pd.Series(
+            [barrio_by_name.get((d, b)) for d, b in zip(district, names)], index=chunk.index, dtype=object
+        )
+        # Barrio sin distrito: se busca en todo el catálogo
+        missing = district.isna().to_numpy()
+        if missing.any():
+            by_barrio = {b: (d, label) for (d, b), label in barrio_by_name.items()}
+            found = [by_barrio.get(b, (np.nan, np.nan)) for b in names[missing]]
+            district[missing] = [d for d, _ in found]
+            barrio[missing] = [label for _, label in found]
+    if "latitud" in chunk and "longitud" in chunk:
+        located = locate(
+            pd.to_numeric(chunk["latitud"], errors="coerce").to_numpy(),
+            pd.to_numeric(chunk["longitud"], errors="coerce").to_numpy(),
+        )
+        has_point = located["BARRIO"].notna().to_numpy()
+        district[has_point] = located.loc[has_point, "DISTRITO"].to_numpy(dtype=object)
+        barrio[has_point] = located.loc[has_point, "BARRIO"].to_numpy(dtype=object)
+    return pd.DataFrame({"DISTRITO": district, "BARRIO": barrio})
+
+
+# ==============================
+# Valoración
+# ==============================
+def value_chunk(chunk: pd.DataFrame, predictor: QuantilePredictor, lookups: tuple[dict, dict] | None = None) -> pd.DataFrame:
+    """
+    Valora un bloque con columnas canónicas. Devuelve el bloque con
+    `DISTRITO`, `BARRIO`, p10/p50/p90 (€/m²), total_p10/p50/p90 (€) y `error`.
+    """
+    district_by_name, barrio_by_name = lookups or lookup_tables()
+    keys = resolve_locations(chunk, district_by_name, barrio_by_name)
+    out = chunk.copy()
+    out[OUTPUT_COLUMNS] = np.nan
+    out[["DISTRITO", "BARRIO"]] = keys
+    out["error"] = np.where(keys["DISTRITO"].isna(), "distrito no reconocido", "")
+
+    ok = keys["DISTRITO"].notna().to_numpy()
+    if ok.any():
+        props = chunk.loc[ok, [c for c in PROPERTY_DEFAULTS if c in chunk]]
+        rows = build_inputs(keys.loc[ok, "DISTRITO"], predictor.feature_cols, barrios=keys.loc[ok, "BARRIO"], props=props)
+        preds = predictor.predict_unique(rows).to_numpy()
+        out.loc[ok, list(predictor.quantiles)] = preds
+
+    superficie = pd.to_numeric(out["superficie"], errors="coerce") if "superficie" in out else np.nan
+    for q in predictor.quantiles:
+        out[f"total_{q}"] = out[q] * superficie
+    return out
+
+
+def read_chunks(source, chunksize: int = CHUNK_SIZE, sep: str = ","):
+    """Itera el CSV por bloques con las columnas reconocidas renombradas a su nombre canónico."""
+    for chunk in pd.read_csv(source, chunksize=chunksize, sep=sep):
+        yield chunk.rename(columns=canonical_columns(chunk.columns))
+
+
+def value_csv(
+    source,
+    destination,
+    predictor: QuantilePredictor,
+    chunksize: int = CHUNK_SIZE,
+    sep: str = ",",
+    progress=None,
+) -> dict:
+    """
+    Valora el CSV `source` (ruta o archivo abierto) bloque a bloque y escribe
+    el resultado en `destination` (ruta o archivo de texto abierto).
+
+    `progress(filas_procesadas)` se llama tras cada bloque. Devuelve un resumen
+    con filas totales, filas sin valorar y suma de las medianas totales.
+    """
+    lookups = lookup_tables()
+    summary = {"rows": 0, "errors": 0, "total_p50": 0.0}
+    header = True
+    for chunk in read_chunks(source, chunksize, sep):
+        result = value_chunk(chunk, predictor, lookups)
+        result.to_csv(destination, mode="w" if header else "a", header=header, index=False)
+        header = False
+        summary["rows"] += len(result)
+        summary["errors"] += int((result["error"] != "").sum())
+        summary["total_p50"] += float(result["total_p50"].sum())
+        if progress is not None:
+            progress(summary["rows"])
+    return summary
@@ -0,0 +1,223 @@
+"""
+Tabla precalculada de predicciones por distrito y barrio.
+
+La Calculadora predice a partir de la fila de cada distrito en
+`district_features.csv` más unas pocas variables del inmueble que sólo toman
+unos valores (ver `utils/features.py`), así que los cuantiles €/m² (y sus
+valores SHAP) son deterministas para cada distrito/barrio y perfil de
+inmueble. Este módulo los materializa una vez
+en `models/prediction_table.pkl`, junto con la huella (hash de contenido) de
+los artefactos y datos de los que dependen. Si cambia cualquiera de ellos, la
+tabla deja de ser válida y la app vuelve a la predicción en vivo.
+
+Uso:
+    python -m utils.precompute          # tras train_quantiles.py o subir modelos
+"""
+import hashlib
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from utils.data import (
+    CATALOGO_PATH, DISTRICT_FEATURES_PATH, file_key, load_catalogo, load_district_features, short_name,
+)
+from utils import features, ingest, treeshap
+from utils.prediction import QuantilePredictor, split_pipeline, transformed_feature_groups
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models")
+TABLE_NAME = "prediction_table.pkl"
+# Versión del formato de la tabla y de cómo se construyen sus entradas (forma parte de la huella)
+TABLE_VERSION = 4
+
+# Archivos de los que depende la tabla (dentro de models/) además de los CSV de data/
+MODEL_FILES = ["feature_columns.json", "model_p10.pkl", "model_p50.pkl", "model_p90.pkl"]
+
+
+# ==============================
+# Huella de artefactos
+# ==============================
+def _dependencies(models_dir: str) -> list[str]:
+    paths = [os.path.join(models_dir, f) for f in MODEL_FILES] + [DISTRICT_FEATURES_PATH, CATALOGO_PATH]
+    # Los barrios toman sus indicadores del dataset de viviendas (utils/features.barrio_base)
+    try:
+        paths.append(ingest.find_source())
+    except FileNotFoundError:
+        pass
+    return paths
+
+
+def artifact_key(models_dir: str = MODELS_DIR) -> tuple:
+    """Clave barata (mtime/tamaño) de todas las dependencias; útil como clave de caché."""
+    return tuple(file_key(p) if os.path.exists(p) else None for p in _dependencies(models_dir))
+
+
+def model_fingerprint(models_dir: str = MODELS_DIR) -> str:
+    """Hash SHA-256 del contenido de los modelos, columnas y CSV de entrada."""
+    h = hashlib.sha256(f"tabla-v{TABLE_VERSION}".encode())
+    for path in _dependencies(models_dir):
+        h.update(os.path.basename(path).encode())
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+    return h.hexdigest()
+
+
+# ==============================
+# Construcción de la tabla
+# ==============================
+def scenario_rows() -> pd.DataFrame:
+    """
+    Claves de cada distrito (con su barrio de referencia) y de cada barrio del
+    catálogo: `nivel`, `DISTRITO`, `BARRIO`, `distrito_nombre`, `barrio_nombre`.
+    Las filas de barrio se valoran con sus propios indicadores
+    (`utils/features.barrio_base`).
+    """
+    districts = load_district_features()
+    base = districts.assign(nivel="distrito", barrio_nombre=short_name(districts["BARRIO"]))
+    barrios = load_catalogo()[["DISTRITO", "BARRIO", "barrio_nombre"]].merge(
+        districts[["DISTRITO", "distrito_nombre"]], on="DISTRITO", how="inner"
+    )
+    barrios = barrios.assign(nivel="barrio")
+    columns = ["nivel", "DISTRITO", "BARRIO", "distrito_nombre", "barrio_nombre"]
+    return pd.concat([base[columns], barrios[columns]], ignore_index=True)
+
+
+def _shap_p50(predictor: QuantilePredictor, Xt: np.ndarray, model_p50) -> tuple[np.ndarray, float] | None:
+    """
+    Valores SHAP del P50 agregados por variable original (None si no se pueden
+    calcular). Usa el TreeSHAP ligero de utils/treeshap.py si el regresor lo
+    admite y, si no, el paquete shap.
+    """
+    prep, regressor = split_pipeline(model_p50)
+    try:
+        if treeshap.supports(regressor):
+            explainer = treeshap.TreeShapExplainer(regressor)
+            raw, base_value = explainer.shap_values(Xt), explainer.expected_value
+        else:
+            import shap
+            explanation = shap.TreeExplainer(regressor)(Xt)
+            raw, base_value = explanation.values, float(np.ravel(explanation.base_values)[0])
+    except Exception as e:
+        print("SHAP no precalculado:", e)
+        return None
+    groups = transformed_feature_groups(prep, predictor.feature_cols)
+    values = np.zeros((Xt.shape[0], len(predictor.feature_cols)))
+    np.add.at(values.T, groups, raw.T)
+    return values, base_value
+
+
+def build_prediction_table(models_dir: str = MODELS_DIR, with_shap: bool = True) -> dict:
+    """
+    Calcula P10/P50/P90 (y SHAP del P50) para todos los distritos y barrios y
+    guarda el resultado en `models/prediction_table.pkl`. Devuelve el contenido.
+    """
+    fingerprint = model_fingerprint(models_dir)
+    with open(os.path.join(models_dir, "feature_columns.json")) as f:
+        feature_cols = json.load(f)
+    models = {q: joblib.load(os.path.join(models_dir, f"model_{q}.pkl")) for q in ("p10", "p50", "p90")}
+    predictor = QuantilePredictor(models, feature_cols)
+
+    # Un bloque de filas por perfil de inmueble (combinaciones de PROFILE_COLUMNS)
+    keys = scenario_rows()
+    grid = features.profile_grid(feature_cols)
+    if grid is None:
+        print("Tabla precalculada vacía: el modelo usa características directas del inmueble")
+        grid = []
+    tables, inputs = [], []
+    for props in grid:
+        inputs.append(features.build_inputs(keys["DISTRITO"], feature_cols, barrios=keys["BARRIO"], props=props))
+        tables.append(keys.assign(**features.profile(props)))
+    table = pd.concat(tables, ignore_index=True) if tables else keys.iloc[:0].copy()
+    Xt = predictor.transform(pd.concat(inputs, ignore_index=True)) if inputs else None
+    preds = predictor.predict_matrix(Xt) if inputs else np.empty((0, len(predictor.quantiles)))
+    for j, q in enumerate(predictor.quantiles):
+        table[q] = preds[:, j]
+
+    shap_values, shap_base = None, None
+    if with_shap and inputs:
+        result = _shap_p50(predictor, Xt, models["p50"])
+        if result is not None:
+            shap_values, shap_base = result
+
+    payload = {
+        "fingerprint": fingerprint,
+        "feature_cols": feature_cols,
+        "table": table,
+        "shap_values": shap_values,
+        "shap_base": shap_base,
+    }
+    tmp_path = os.path.join(models_dir, TABLE_NAME + ".tmp")
+    joblib.dump(payload, tmp_path)
+    os.replace(tmp_path, os.path.join(models_dir, TABLE_NAME))
+    return payload
+
+
+def load_prediction_table(models_dir: str = MODELS_DIR) -> dict | None:
+    """
+    Carga la tabla precalculada si existe y su huella coincide con los
+    artefactos actuales. En otro caso devuelve None.
+    """
+    path = os.path.join(models_dir, TABLE_NAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        payload = joblib.load(path)
+    except Exception:
+        return None
+    if payload.get("fingerprint") != model_fingerprint(models_dir):
+        return None
+    return payload
+
+
+def _index(payload: dict) -> dict:
+    """
+    {(nivel, distrito_nombre, barrio_nombre | None, *perfil): posición} de la
+    tabla. Se construye una vez por tabla cargada y se guarda en el payload.
+    """
+    index = payload.get("index")
+    if index is None:
+        table = payload["table"]
+        profile_cols = [c for c in features.PROFILE_COLUMNS if c in table]
+        barrio = [b if nivel == "barrio" else None for nivel, b in zip(table["nivel"], table["barrio_nombre"])]
+        keys = zip(table["nivel"], table["distrito_nombre"], barrio, *(table[c] for c in profile_cols))
+        index = {"columns": profile_cols, "rows": {}}
+        for i, key in enumerate(keys):
+            index["rows"].setdefault(key, i)
+        payload["index"] = index
+    return index
+
+
+def lookup(
+    payload: dict,
+    distrito_nombre: str,
+    barrio_nombre: str | None = None,
+    perfil: dict | None = None,
+) -> tuple[pd.Series, np.ndarray | None] | None:
+    """
+    Busca la fila de un distrito (o de un barrio concreto) en la tabla para el
+    perfil de inmueble `perfil` (ver `utils.features.profile`; por defecto el
+    de `PROPERTY_DEFAULTS`). Devuelve (fila con p10/p50/p90, vector SHAP o
+    None) o None si no existe. Es un acceso a diccionario (ver `_index`).
+    """
+    index = _index(payload)
+    perfil = perfil if perfil is not None else features.profile(features.PROPERTY_DEFAULTS)
+    if any(column not in index["columns"] for column in perfil):
+        return None
+    nivel = "distrito" if barrio_nombre is None else "barrio"
+    key = (nivel, distrito_nombre, barrio_nombre, *(perfil.get(c) for c in index["columns"]))
+    i = index["rows"].get(key)
+    if i is None:
+        return None
+    shap_values = payload.get("shap_values")
+    return payload["table"].iloc[i], (shap_values[i] if shap_values is not None else None)
+
+
+if __name__ == "__main__":
+    payload = build_prediction_table()
+    n_shap = 0 if payload["shap_values"] is None else len(payload["shap_values"])
+    print(f"✅ Tabla precalculada: {len(payload['table'])} filas, SHAP para {n_shap} filas "
+          f"(huella {payload['fingerprint'][:12]})")
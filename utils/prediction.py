@@ -0,0 +1,230 @@
+import threading
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.preprocessing import OneHotEncoder
+
+# Orden canónico de los cuantiles servidos por la app
+QUANTILES = ("p10", "p50", "p90")
+# Hasta este número de filas se evalúan los árboles con el ensemble compilado
+# (`utils/compiled.py`); en lotes mayores es más rápido el recorrido de scikit-learn
+COMPILED_MAX_ROWS = 32
+
+
+# ==============================
+# Utilidades
+# ==============================
+def split_pipeline(model):
+    """
+    Separa un Pipeline de scikit-learn en (preprocesado, regresor).
+    Admite los nombres de paso de `train_quantiles.py` ('prep', 'gb') y los de
+    los artefactos históricos ('preprocessor', 'regressor'): se usa la posición.
+    Si el modelo no es un Pipeline, el preprocesado es None.
+    """
+    steps = getattr(model, "steps", None)
+    if not steps:
+        return None, model
+    if len(steps) == 1:
+        return None, steps[0][1]
+    prep = steps[0][1] if len(steps) == 2 else model[:-1]
+    return prep, steps[-1][1]
+
+
+def build_model_input(rows: pd.DataFrame, feature_cols: list[str]) -> pd.DataFrame:
+    """
+    Alinea un DataFrame con las columnas (y el orden) que espera el modelo.
+    Las columnas ausentes se añaden como NaN.
+    """
+    return rows.reindex(columns=feature_cols)
+
+
+def _iter_transformers(prep):
+    """Recorre (transformador, columnas) de un ColumnTransformer ajustado."""
+    for _, trans, cols in getattr(prep, "transformers_", []):
+        if isinstance(cols, str):
+            cols = [cols]
+        yield trans, list(cols)
+
+
+def numeric_defaults(prep) -> dict:
+    """
+    Valores de relleno para columnas numéricas ausentes: la media de
+    entrenamiento guardada por el StandardScaler (equivale a un 0 estandarizado,
+    es decir, una contribución neutra). Los árboles no aceptan NaN.
+    """
+    defaults = {}
+    for trans, cols in _iter_transformers(prep):
+        mean = getattr(trans, "mean_", None)
+        if mean is not None and len(mean) == len(cols):
+            defaults.update(zip(cols, np.asarray(mean, dtype=np.float64)))
+    return defaults
+
+
+def transformed_feature_groups(prep, feature_cols: list[str]) -> np.ndarray:
+    """
+    Para cada columna de la matriz preprocesada, índice de la variable original
+    (en `feature_cols`) de la que procede. Permite agregar contribuciones SHAP de
+    las columnas one-hot a su variable categórica.
+    """
+    if prep is None:
+        return np.arange(len(feature_cols))
+    position = {c: i for i, c in enumerate(feature_cols)}
+    groups = []
+    for trans, cols in _iter_transformers(prep):
+        if trans == "drop" or not cols:
+            continue
+        if isinstance(trans, OneHotEncoder):
+            for col, cats in zip(cols, trans.categories_):
+                groups.extend([position[col]] * len(cats))
+        else:
+            groups.extend(position[c] for c in cols)
+    return np.asarray(groups, dtype=np.intp)
+
+
+def input_dtype(regressors) -> type:
+    """
+    Tipo de la matriz que los regresores usan internamente: float32 para los
+    árboles clásicos de scikit-learn (GradientBoostingRegressor) y float64 para
+    el resto (p. ej. HistGradientBoostingRegressor), de modo que la conversión
+    se hace una sola vez y no altera las predicciones.
+    """
+    if all(hasattr(r, "estimators_") for r in regressors):
+        return np.float32
+    return np.float64
+
+
+def to_dense(Xt, dtype=np.float32) -> np.ndarray:
+    """
+    Convierte la salida del preprocesado a una matriz densa contigua del tipo
+    indicado, para que cada regresor no repita la conversión.
+    """
+    if sparse.issparse(Xt):
+        Xt = Xt.toarray()
+    return np.ascontiguousarray(Xt, dtype=dtype)
+
+
+# ==============================
+# Motor de predicción por lotes
+# ==============================
+class QuantilePredictor:
+    """
+    Predice P10/P50/P90 para N filas a la vez.
+
+    Los tres pipelines se entrenan con el mismo preprocesado sobre los mismos
+    datos, así que sus ColumnTransformer ajustados son idénticos: si se
+    comprueba al construir el motor, el preprocesado se ejecuta una sola vez y
+    la matriz resultante alimenta a los tres regresores. Si los preprocesados
+    difieren, cada cuantil transforma por su cuenta (mismo resultado que
+    `pipeline.predict`).
+
+    Con un ensemble compilado (`utils/compiled.py`) el preprocesado compartido
+    se hace con sus arrays y los lotes pequeños se evalúan sin pasar por
+    scikit-learn; las predicciones son idénticas. Si además `models` es una
+    función (carga diferida), los pipelines de scikit-learn sólo se cargan
+    cuando hacen falta: lotes grandes, preprocesado de un cuantil concreto o SHAP.
+    """
+
+    def __init__(self, models, feature_cols: list[str], compiled=None):
+        self.feature_cols = list(feature_cols)
+        self._loader = models if callable(models) else None
+        self._load_lock = threading.Lock()
+        self.models = None
+        if self._loader is not None and compiled is not None:
+            # El ensemble compilado sólo existe para pipelines con el mismo preprocesado
+            self.quantiles = list(compiled.quantiles)
+            self.shared_preprocessing = True
+            self.compiled = compiled
+            return
+        self._init_models(models() if self._loader is not None else models)
+        usable = compiled is not None and self.shared_preprocessing and list(compiled.quantiles) == self.quantiles
+        self.compiled = compiled if usable else None
+
+    def _init_models(self, models: dict):
+        self.quantiles = [q for q in QUANTILES if q in models]
+        parts = {q: split_pipeline(models[q]) for q in self.quantiles}
+        self.preprocessors = {q: parts[q][0] for q in self.quantiles}
+        self.regressors = {q: parts[q][1] for q in self.quantiles}
+        hashes = {
+            joblib.hash(p) if p is not None else None
+            for p in self.preprocessors.values()
+        }
+        self.shared_preprocessing = len(hashes) == 1
+        self.preprocessor = self.preprocessors[self.quantiles[0]] if self.shared_preprocessing else None
+        self.fill_values = numeric_defaults(self.preprocessors[self.quantiles[0]])
+        self.dtype = input_dtype(self.regressors.values())
+        self.models = models
+
+    def load_models(self) -> dict:
+        """Pipelines {cuantil: Pipeline} de scikit-learn (los carga si la carga era diferida)."""
+        if self.models is None:
+            with self._load_lock:
+                if self.models is None:
+                    self._init_models(self._loader())
+        return self.models
+
+    def transform(self, X: pd.DataFrame, quantile: str | None = None) -> np.ndarray:
+        """Aplica el preprocesado (compartido o el del cuantil indicado)."""
+        if quantile is None and self.compiled is not None:
+            return self.compiled.transform(X)
+        self.load_models()
+        prep = self.preprocessor if quantile is None else self.preprocessors[quantile]
+        X = build_model_input(X, self.feature_cols).fillna(self.fill_values)
+        Xt = prep.transform(X) if prep is not None else X.to_numpy()
+        return to_dense(Xt, self.dtype)
+
+    def predict_matrix(self, Xt: np.ndarray) -> np.ndarray:
+        """Predice sobre una matriz ya preprocesada. Devuelve (N, n_cuantiles)."""
+        if self.compiled is not None and Xt.shape[0] <= COMPILED_MAX_ROWS:
+            return self.compiled.predict_matrix(Xt)
+        self.load_models()
+        out = np.empty((Xt.shape[0], len(self.quantiles)), dtype=np.float64)
+        for j, q in enumerate(self.quantiles):
+            out[:, j] = self.regressors[q].predict(Xt)
+        return out
+
+    def predict(self, X: pd.DataFrame) -> pd.DataFrame:
+        """
+        Predice el precio €/m² de cada fila para todos los cuantiles.
+        Devuelve un DataFrame con columnas p10/p50/p90 y el índice de `X`.
+        """
+        if self.shared_preprocessing:
+            values = self.predict_matrix(self.transform(X))
+        else:
+            values = np.column_stack([
+                self.regressors[q].predict(self.transform(X, q)) for q in self.quantiles
+            ])
+        return pd.DataFrame(values, columns=self.quantiles, index=X.index)
+
+    def predict_unique(self, X: pd.DataFrame) -> pd.DataFrame:
+        """
+        Como `predict`, pero evalúa una sola vez cada fila distinta (útil en
+        cuadrículas de escenarios donde las entradas del modelo se repiten).
+        """
+        X = build_model_input(X, self.feature_cols)
+        codes, _ = pd.factorize(pd.util.hash_pandas_object(X, index=False))
+        _, first = np.unique(codes, return_index=True)
+        preds = self.predict(X.iloc[first]).to_numpy()
+        return pd.DataFrame(preds[codes], columns=self.quantiles, index=X.index)
+
+    def price_scenarios(self, X: pd.DataFrame, superficies) -> pd.DataFrame:
+        """
+        Valora el producto cartesiano filas × superficies.
+
+        La superficie no es una variable del modelo: el €/m² se predice una vez
+        por fila y se multiplica por cada superficie con operaciones vectoriales.
+        Devuelve columnas `row` (índice de `X`), `superficie`, p10/p50/p90 (€/m²)
+        y total_p10/total_p50/total_p90 (€).
+        """
+        superficies = np.asarray(superficies, dtype=np.float64)
+        preds = self.predict_unique(X)
+        n_rows, n_sup = len(preds), len(superficies)
+        values = np.repeat(preds.to_numpy(), n_sup, axis=0)
+        sup = np.tile(superficies, n_rows)
+        out = pd.DataFrame(values, columns=self.quantiles)
+        out.insert(0, "superficie", sup)
+        out.insert(0, "row", np.repeat(preds.index.to_numpy(), n_sup))
+        for q in self.quantiles:
+            out[f"total_{q}"] = out[q] * sup
+        return out
@@ -0,0 +1,413 @@
+"""
+Registro de modelos con recarga en caliente.
+
+Los artefactos de `models/` se versionan por hash de contenido. Las
+publicaciones (subidas del panel de administración, reentrenamientos) escriben
+cada archivo en un temporal y lo renombran sobre el definitivo, y al final
+escriben `models/registry.json` con la versión y el hash de cada archivo.
+
+El proceso de la app mantiene un único `ModelRegistry` (compartido entre
+sesiones). Cuando detecta que los archivos cambiaron en disco, carga la nueva
+versión en un hilo en segundo plano mientras sigue sirviendo la anterior, y la
+sustituye de forma atómica cuando está lista. Los usuarios nunca esperan a una
+recarga salvo la primera carga del proceso.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import dataclasses
+from dataclasses import dataclass, field
+
+import joblib
+import numpy as np
+
+from utils import compiled, perf, treeshap
+from utils.prediction import QuantilePredictor, split_pipeline, transformed_feature_groups
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models")
+MANIFEST_NAME = "registry.json"
+QUANTILE_FILES = {"p10": "model_p10.pkl", "p50": "model_p50.pkl", "p90": "model_p90.pkl"}
+ARTIFACT_FILES = [
+    "feature_columns.json", *QUANTILE_FILES.values(), "preprocessor.pkl", "shap_explainer.pkl", compiled.COMPILED_NAME,
+]
+
+# Segundos tras los que se aceptan archivos que no coinciden con el manifiesto
+# (p. ej. copiados a mano); antes se asume una publicación en curso.
+MANIFEST_GRACE_S = 5.0
+
+
+# ==============================
+# Utilidades de archivos
+# ==============================
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _atomic_write(path: str, data: bytes):
+    """Escribe en un temporal del mismo directorio y lo renombra sobre el destino."""
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def artifact_hashes(models_dir: str = MODELS_DIR) -> dict[str, str]:
+    """Hash SHA-256 de cada artefacto presente."""
+    return {
+        name: _sha256(os.path.join(models_dir, name))
+        for name in ARTIFACT_FILES
+        if os.path.exists(os.path.join(models_dir, name))
+    }
+
+
+def version_of(hashes: dict[str, str]) -> str:
+    """Versión del conjunto de artefactos: hash de los hashes individuales."""
+    h = hashlib.sha256()
+    for name in sorted(hashes):
+        h.update(f"{name}:{hashes[name]}\n".encode())
+    return h.hexdigest()[:16]
+
+
+def stat_key(models_dir: str = MODELS_DIR) -> tuple:
+    """Clave barata (mtime/tamaño) de los artefactos y el manifiesto para detectar cambios."""
+    key = []
+    for name in [*ARTIFACT_FILES, MANIFEST_NAME]:
+        try:
+            stat = os.stat(os.path.join(models_dir, name))
+            key.append((name, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            key.append((name, None, None))
+    return tuple(key)
+
+
+def read_manifest(models_dir: str = MODELS_DIR) -> dict | None:
+    try:
+        with open(os.path.join(models_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_manifest(models_dir: str = MODELS_DIR) -> dict:
+    """Registra la versión actual de los artefactos (último paso de toda publicación)."""
+    hashes = artifact_hashes(models_dir)
+    manifest = {"version": version_of(hashes), "files": hashes, "published_at": time.time()}
+    _atomic_write(os.path.join(models_dir, MANIFEST_NAME), json.dumps(manifest, indent=2).encode())
+    return manifest
+
+
+def publish(files: dict[str, bytes], models_dir: str = MODELS_DIR) -> dict:
+    """
+    Publica nuevos artefactos ({nombre estándar: contenido}): escritura atómica
+    de cada archivo y, al final, del manifiesto. Devuelve el manifiesto.
+    """
+    unknown = set(files) - set(ARTIFACT_FILES)
+    if unknown:
+        raise ValueError(f"Artefactos no reconocidos: {sorted(unknown)}")
+    os.makedirs(models_dir, exist_ok=True)
+    for name, data in files.items():
+        _atomic_write(os.path.join(models_dir, name), data)
+    return write_manifest(models_dir)
+
+
+# ==============================
+# Versión cargada en memoria
+# ==============================
+@dataclass
+class ModelBundle:
+    """
+    Artefactos de una versión ya cargados y listos para predecir.
+
+    El explicador SHAP no se carga con el resto: se crea en la primera llamada a
+    `explain()` y queda compartido por todas las sesiones que usan esta versión.
+    Por defecto se usa el TreeSHAP ligero de `utils/treeshap.py` sobre el
+    regresor P50 (sin importar `shap`); con SMARTHOUSING_SHAP=shap, o si el
+    regresor no es compatible, se usa `shap_explainer.pkl` o `shap.TreeExplainer`.
+    """
+    version: str
+    key: tuple
+    feature_cols: list
+    predictor: QuantilePredictor
+    models_dir: str = MODELS_DIR
+    loaded_at: float = field(default_factory=time.time)
+    _explainer: object = field(default=None, repr=False)
+    _explainer_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def models(self) -> dict:
+        """Pipelines {cuantil: Pipeline}; con archivo compilado se cargan en el primer uso."""
+        return self.predictor.load_models()
+
+    def explainer(self):
+        """(tipo, explicador) del P50, creado de forma perezosa; None si no hay ninguno disponible."""
+        if self._explainer is None:
+            with self._explainer_lock:
+                if self._explainer is None:
+                    self._explainer = _make_explainer(self.models["p50"], self.models_dir) or False
+        return self._explainer or None
+
+    @perf.timed("shap:explain")
+    def explain(self, X) -> tuple[np.ndarray, float] | None:
+        """
+        Valores SHAP del P50 agregados por variable original de `feature_cols`
+        (matriz n_filas × n_variables) y valor base. None si no hay explicador.
+        """
+        entry = self.explainer()
+        if entry is None:
+            return None
+        kind, explainer = entry
+        Xt = self.predictor.transform(X, "p50")
+        if kind == "lite":
+            values, base = explainer.shap_values(Xt), explainer.expected_value
+        else:
+            explanation = explainer(Xt)
+            values, base = explanation.values, float(np.ravel(explanation.base_values)[0])
+        prep, _ = split_pipeline(self.models["p50"])
+        groups = transformed_feature_groups(prep, self.feature_cols)
+        aggregated = np.zeros((values.shape[0], len(self.feature_cols)))
+        np.add.at(aggregated.T, groups, values.T)
+        return aggregated, base
+
+
+@perf.timed("shap:explainer")
+def _make_explainer(model_p50, models_dir: str):
+    """Crea el explicador del P50: TreeSHAP ligero si es posible, si no el paquete shap."""
+    _, regressor = split_pipeline(model_p50)
+    if os.environ.get("SMARTHOUSING_SHAP", "lite") != "shap" and treeshap.supports(regressor):
+        return "lite", treeshap.TreeShapExplainer(regressor)
+    shap_path = os.path.join(models_dir, "shap_explainer.pkl")
+    if os.path.exists(shap_path):
+        try:
+            return "shap", joblib.load(shap_path)
+        except Exception:
+            pass
+    try:
+        import shap
+        return "shap", shap.TreeExplainer(regressor)
+    except Exception:
+        return None
+
+
+def _compiled_sources(hashes: dict[str, str]) -> dict[str, str]:
+    """Hashes de los pickles de los que procede (o debe proceder) el ensemble compilado."""
+    return {name: hashes[name] for name in QUANTILE_FILES.values() if name in hashes}
+
+
+def _open_compiled(models_dir: str, feature_cols: list, hashes: dict):
+    """
+    Ensemble de `compiled_ensemble.bin` mapeado en memoria, si procede de los
+    pickles actuales con la versión de scikit-learn en uso y tiene las mismas
+    columnas (ver `compiled.load`). None si falta, no coincide o
+    SMARTHOUSING_COMPILED=0.
+    """
+    if os.environ.get("SMARTHOUSING_COMPILED", "1") == "0":
+        return None
+    path = os.path.join(models_dir, compiled.COMPILED_NAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        return compiled.load(path, _compiled_sources(hashes), feature_cols)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _compile_in_memory(models: dict, feature_cols: list):
+    """Compila los modelos ya cargados y los comprueba con filas sintéticas; None si no procede."""
+    if os.environ.get("SMARTHOUSING_COMPILED", "1") == "0":
+        return None
+    try:
+        ensemble = compiled.compile_models(models, feature_cols)
+        if compiled.validate(ensemble, models, compiled.probe_frame(ensemble)):
+            return ensemble
+    except Exception:
+        pass
+    return None
+
+
+def _model_loader(models_dir: str, hashes: dict):
+    """
+    Carga diferida de los pickles de una versión. Comprueba que siguen siendo
+    los de esa versión: si se publicó otra entretanto, lanza RuntimeError (el
+    registro ya estará cargando la nueva).
+    """
+    def load() -> dict:
+        models = {}
+        for q, name in QUANTILE_FILES.items():
+            with open(os.path.join(models_dir, name), "rb") as f:
+                data = f.read()
+            if hashlib.sha256(data).hexdigest() != hashes.get(name):
+                raise RuntimeError("Los modelos cambiaron en disco desde que se cargó esta versión")
+            models[q] = joblib.load(io.BytesIO(data))
+        return models
+    return load
+
+
+def build_compiled(models_dir: str = MODELS_DIR, models: dict | None = None, X=None):
+    """
+    Compila los modelos de `models_dir` (o `models`, ya cargados), comprueba
+    que reproducen a scikit-learn sobre `X` (o filas sintéticas) y guarda
+    `compiled_ensemble.bin`. TypeError si no son compilables (p. ej. HGB) y
+    ValueError si no coinciden. No actualiza el manifiesto.
+    """
+    if models is None:
+        models = {q: joblib.load(os.path.join(models_dir, name)) for q, name in QUANTILE_FILES.items()}
+    with open(os.path.join(models_dir, "feature_columns.json")) as f:
+        feature_cols = json.load(f)
+    ensemble = compiled.compile_models(models, feature_cols)
+    if not compiled.validate(ensemble, models, X if X is not None else compiled.probe_frame(ensemble)):
+        raise ValueError("las predicciones no coinciden con scikit-learn")
+    path = os.path.join(models_dir, compiled.COMPILED_NAME)
+    compiled.save(ensemble, path, _compiled_sources(artifact_hashes(models_dir)))
+    return ensemble
+
+
+@perf.timed("models:load")
+def load_bundle(models_dir: str = MODELS_DIR, key: tuple | None = None) -> ModelBundle:
+    """
+    Carga una versión completa. Comprueba que los archivos leídos son
+    coherentes con el manifiesto (no se leyó a mitad de una publicación); si no
+    lo son, lanza RuntimeError para reintentar más tarde.
+    """
+    key = key if key is not None else stat_key(models_dir)
+    hashes = artifact_hashes(models_dir)
+    if not hashes:
+        raise RuntimeError(f"No hay artefactos de modelos en {models_dir}")
+    manifest = read_manifest(models_dir)
+    if manifest is not None and manifest.get("files") != hashes:
+        newest = max(os.path.getmtime(os.path.join(models_dir, n)) for n in hashes)
+        if time.time() - newest < MANIFEST_GRACE_S:
+            raise RuntimeError("Publicación de modelos en curso")
+
+    with open(os.path.join(models_dir, "feature_columns.json")) as f:
+        feature_cols = json.load(f)
+    ensemble = _open_compiled(models_dir, feature_cols, hashes)
+    if ensemble is not None:
+        # Arrays mapeados desde el archivo compilado: los pickles se cargan sólo si hacen falta
+        models = _model_loader(models_dir, hashes)
+    else:
+        models = {q: joblib.load(os.path.join(models_dir, name)) for q, name in QUANTILE_FILES.items()}
+        ensemble = _compile_in_memory(models, feature_cols)
+
+    if artifact_hashes(models_dir) != hashes:
+        raise RuntimeError("Los artefactos cambiaron durante la carga")
+    return ModelBundle(
+        version=version_of(hashes),
+        key=key,
+        feature_cols=feature_cols,
+        predictor=QuantilePredictor(models, feature_cols, ensemble),
+        models_dir=models_dir,
+    )
+
+
+class ModelRegistry:
+    """
+    Mantiene la versión activa de los modelos y la sustituye en segundo plano
+    cuando cambian los artefactos en disco.
+    """
+
+    def __init__(self, models_dir: str = MODELS_DIR):
+        self.models_dir = models_dir
+        self._current: ModelBundle | None = None
+        self._lock = threading.Lock()
+        self._loader: threading.Thread | None = None
+        self._failed_key: tuple | None = None
+        self._failed_at = 0.0
+        self.last_error: str | None = None
+
+    @property
+    def loading(self) -> bool:
+        return self._loader is not None and self._loader.is_alive()
+
+    def get(self) -> ModelBundle:
+        """
+        Versión activa. La primera llamada carga de forma síncrona; después, si
+        los archivos cambiaron, se lanza la recarga en segundo plano y se
+        devuelve la versión anterior hasta que la nueva esté lista.
+        """
+        current = self._current
+        if current is None and self.loading:
+            # Precarga en curso (warm_up): se espera a ella en lugar de cargar dos veces
+            self.wait()
+            current = self._current
+        if current is None:
+            with self._lock:
+                if self._current is None:
+                    self._current = load_bundle(self.models_dir)
+                return self._current
+        key = stat_key(self.models_dir)
+        if key != current.key:
+            # Tras un fallo con estos mismos archivos, se espera antes de reintentar
+            if key != self._failed_key or time.time() - self._failed_at > MANIFEST_GRACE_S:
+                self.refresh()
+        return current
+
+    def refresh(self) -> bool:
+        """Lanza (si no hay otra en curso) la carga en segundo plano. True si se lanzó."""
+        with self._lock:
+            if self.loading:
+                return False
+            self._loader = threading.Thread(target=self._reload, name="model-registry-reload", daemon=True)
+            self._loader.start()
+            return True
+
+    def warm_up(self):
+        """Precarga la versión activa en segundo plano si aún no hay ninguna cargada."""
+        if self._current is None:
+            self.refresh()
+
+    def wait(self, timeout: float | None = None):
+        """Espera a que termine la recarga en curso (útil tras publicar)."""
+        loader = self._loader
+        if loader is not None:
+            loader.join(timeout)
+
+    def _reload(self):
+        key = stat_key(self.models_dir)
+        try:
+            current = self._current
+            hashes = artifact_hashes(self.models_dir)
+            if current is not None and version_of(hashes) == current.version:
+                # Mismo contenido (p. ej. archivos reescritos o manifiesto regenerado)
+                bundle = dataclasses.replace(current, key=key)
+            else:
+                bundle = load_bundle(self.models_dir, key)
+        except Exception as e:
+            # Se mantiene la versión anterior; una llamada posterior a get() reintentará
+            self.last_error = str(e)
+            self._failed_key, self._failed_at = key, time.time()
+            return
+        with self._lock:
+            self._current = bundle
+            self.last_error = None
+            self._failed_key = None
+
+    def status(self) -> dict:
+        current = self._current
+        return {
+            "version": current.version if current else None,
+            "loaded_at": current.loaded_at if current else None,
+            "loading": self.loading,
+            "last_error": self.last_error,
+        }
+
+
+_registries: dict[str, ModelRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(models_dir: str = MODELS_DIR) -> ModelRegistry:
+    """Registro único por proceso (compartido por todas las sesiones y páginas)."""
+    models_dir = os.path.abspath(models_dir)
+    with _registries_lock:
+        if models_dir not in _registries:
+            _registries[models_dir] = ModelRegistry(models_dir)
+        return _registries[models_dir]
@@ -0,0 +1,174 @@
+"""
+Puntuación de recomendaciones de compra según el perfil del usuario.
+
+Cada prioridad del Asistente ("Precio bajo", "Zonas verdes", "Transporte",
+"Seguridad", "Inversión") corresponde a una o varias columnas de
+`district_features.csv` con un signo (+1 si más es mejor, -1 si menos es
+mejor). La matriz de indicadores normalizados a [0, 1] se prepara una vez por
+versión del CSV; cada interacción sólo construye el vector de pesos y evalúa
+todas las zonas con un producto matriz-vector:
+
+    puntuación = (Z · w + Σ|w⁻|) / Σ|w|          (en [0, 1])
+
+Las zonas son los distritos o, con `level="barrio"`, los barrios del catálogo
+(indicadores de `utils/features.barrio_base()`).
+
+La viabilidad del presupuesto se calcula con el P50 €/m² que predicen los
+modelos (una vez por versión de modelos): m² alcanzables = presupuesto ÷ P50,
+frente a la superficie típica del número de habitaciones. Las zonas que no
+llegan se penalizan en proporción a los m² que faltan, de modo que siempre
+quedan por detrás de las asequibles.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.data import DISTRICT_FEATURES_PATH, PAGE_RENAME, file_key, load_district_table
+from utils.features import barrio_base, barrio_key, build_inputs, property_columns
+from utils.registry import get_registry
+
+# Prioridad -> {columna de la tabla de distritos: signo}
+PRIORITIES = {
+    "Precio bajo": {"precio_m2": -1.0},
+    "Zonas verdes": {"ZONAS_VERDES_POR_RESIDENTE": 1.0},
+    "Transporte": {"PARADAS_TOTAL": 1.0},
+    "Seguridad": {"PERCEPCION_SEGURIDAD": 0.5, "INDICE_SEGURIDAD": 0.5},
+    "Inversión": {"variacion_pct": 1.0},
+}
+
+# Superficie típica (m²) según número de habitaciones
+M2_POR_HABITACIONES = {1: 50.0, 2: 70.0, 3: 90.0, 4: 115.0}
+
+KEY_COLUMNS = ["distrito", "distrito_nombre", "precio_m2", "variacion_pct"]
+BARRIO_KEY_COLUMNS = ["distrito", "distrito_nombre", "barrio", "barrio_nombre", "precio_m2", "variacion_pct"]
+LEVELS = ("distrito", "barrio")
+
+
+# ==============================
+# Matriz de indicadores (cacheada)
+# ==============================
+def normalize(raw: np.ndarray) -> np.ndarray:
+    """Min-max por columna a [0, 1]; columnas constantes y NaN -> 0.5 (neutro)."""
+    with np.errstate(invalid="ignore"):
+        lo, hi = np.nanmin(raw, axis=0), np.nanmax(raw, axis=0)
+        span = hi - lo
+        Z = np.where(span > 0, (raw - lo) / np.where(span > 0, span, 1.0), 0.5)
+    return np.nan_to_num(Z, nan=0.5)
+
+
+def _level_key(level: str) -> tuple:
+    """Clave de versión de la tabla de zonas del nivel."""
+    return barrio_key() if level == "barrio" else file_key(DISTRICT_FEATURES_PATH)
+
+
+def _zones(level: str) -> tuple[pd.DataFrame, list[str]]:
+    """Tabla de zonas del nivel (nombres de página) y sus columnas clave."""
+    if level == "barrio":
+        table = barrio_base().rename(columns=dict(PAGE_RENAME, BARRIO="barrio"))
+        return table, BARRIO_KEY_COLUMNS
+    return load_district_table(), KEY_COLUMNS
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _matrix(level: str, key: tuple) -> dict:
+    table, key_columns = _zones(level)
+    columns = list(dict.fromkeys(c for signs in PRIORITIES.values() for c in signs if c in table))
+    raw = table[columns].to_numpy(dtype=np.float64)
+    return {
+        "keys": table[key_columns].reset_index(drop=True),
+        "columns": columns,
+        "Z": np.ascontiguousarray(normalize(raw)),
+    }
+
+
+def matrix(level: str = "distrito") -> dict:
+    """
+    Claves de cada zona (`distrito`, `distrito_nombre`, y para barrios
+    `barrio`, `barrio_nombre`; además `precio_m2` y `variacion_pct`),
+    columnas y matriz `Z` (zonas × indicadores) normalizada. Compartida y de
+    solo lectura.
+    """
+    return _matrix(level, _level_key(level))
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _predicted_p50(level: str, key: tuple, version: str, habitaciones: int | None) -> np.ndarray:
+    keys = matrix(level)["keys"]
+    bundle = get_registry().get()
+    barrios = keys["barrio"] if level == "barrio" else None
+    props = None if habitaciones is None else {"habitaciones": habitaciones}
+    X = build_inputs(keys["distrito"], bundle.feature_cols, barrios=barrios, props=props)
+    return bundle.predictor.predict_unique(X)["p50"].to_numpy(dtype=np.float64)
+
+
+def predicted_p50(habitaciones: int = 2, level: str = "distrito") -> np.ndarray:
+    """
+    P50 €/m² de cada zona de `matrix(level)` con los modelos actuales (una
+    predicción por versión de modelos y, sólo si el modelo las usa, por número
+    de habitaciones). Si no hay modelos, el €/m² medio.
+    """
+    try:
+        bundle = get_registry().get()
+        # Sin columna de habitaciones en el modelo, todas comparten la misma predicción
+        usa_habitaciones = bool(property_columns(bundle.feature_cols)["habitaciones"])
+        habitaciones = int(habitaciones) if usa_habitaciones else None
+        return _predicted_p50(level, _level_key(level), bundle.version, habitaciones)
+    except Exception:
+        return matrix(level)["keys"]["precio_m2"].to_numpy(dtype=np.float64)
+
+
+# ==============================
+# Puntuación
+# ==============================
+def weight_vector(columns: list[str], pesos: dict[str, float]) -> np.ndarray:
+    """Vector de pesos por columna a partir de {prioridad: peso}."""
+    position = {c: i for i, c in enumerate(columns)}
+    w = np.zeros(len(columns), dtype=np.float64)
+    for prioridad, peso in pesos.items():
+        for column, sign in PRIORITIES.get(prioridad, {}).items():
+            if column in position:
+                w[position[column]] += sign * float(peso)
+    return w
+
+
+def scores(Z: np.ndarray, w: np.ndarray) -> np.ndarray:
+    """Puntuación en [0, 1] de cada fila de `Z` (0.5 para todas si no hay pesos)."""
+    total = np.abs(w).sum()
+    if total == 0:
+        return np.full(Z.shape[0], 0.5)
+    return (Z @ w + np.abs(np.minimum(w, 0.0)).sum()) / total
+
+
+def feasibility(presupuesto: float, p50: np.ndarray, habitaciones: int = 2) -> np.ndarray:
+    """Cociente m² alcanzables / m² necesarios de cada zona (≥ 1: asequible)."""
+    necesarios = M2_POR_HABITACIONES.get(int(habitaciones), 70.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(p50 > 0, presupuesto / p50 / necesarios, 0.0)
+
+
+def rank(
+    pesos: dict[str, float],
+    presupuesto: float | None = None,
+    habitaciones: int = 2,
+    level: str = "distrito",
+) -> pd.DataFrame:
+    """
+    Zonas del nivel ordenadas de mejor a peor para el perfil: claves de
+    `matrix(level)` más `p50` (€/m² predicho), `m2_alcanzables`, `asequible`, `afinidad` (sólo
+    prioridades) y `puntuacion` (afinidad penalizada por presupuesto).
+    """
+    m = matrix(level)
+    afinidad = scores(m["Z"], weight_vector(m["columns"], pesos))
+    out = m["keys"].copy()
+    out["afinidad"] = afinidad
+    if presupuesto is None:
+        out["puntuacion"] = afinidad
+    else:
+        p50 = predicted_p50(habitaciones, level)
+        ratio = feasibility(presupuesto, p50, habitaciones)
+        out["p50"] = p50
+        out["m2_alcanzables"] = ratio * M2_POR_HABITACIONES.get(int(habitaciones), 70.0)
+        out["asequible"] = ratio >= 1.0
+        out["puntuacion"] = afinidad - np.maximum(0.0, 1.0 - ratio)
+    order = np.argsort(-out["puntuacion"].to_numpy(), kind="stable")
+    return out.iloc[order].reset_index(drop=True)
@@ -0,0 +1,160 @@
+"""
+Localización de coordenadas en barrios.
+
+Índice de rejilla sobre los polígonos de `data/Barrios.json` (a resolución
+completa, vía `utils/geo.py`): cada celda guarda los barrios cuyo rectángulo
+envolvente la toca, de modo que para cada punto sólo se prueban unos pocos
+polígonos. La prueba punto-en-polígono (regla par-impar, válida para huecos y
+multipolígonos) se hace vectorizada con numpy, agrupando los puntos por
+barrio candidato, así que lotes de miles de puntos se resuelven en
+milisegundos.
+
+El resultado trae las mismas claves que `district_features.csv` y el catálogo
+(`DISTRITO`, `BARRIO`, `distrito_nombre`, `barrio_nombre`), listas para
+construir filas de entrada de los modelos cuantílicos.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils import geo
+from utils.data import CATALOGO_PATH, DISTRICT_FEATURES_PATH, file_key
+
+KEY_COLUMNS = ["DISTRITO", "BARRIO", "distrito_nombre", "barrio_nombre"]
+
+# Celdas de la rejilla por eje
+GRID_SIZE = 64
+
+# Máximo de pares punto × arista evaluados a la vez (limita la memoria)
+MAX_PAIRS = 4_000_000
+
+
+class BarrioIndex:
+    """Índice de rejilla punto -> barrio."""
+
+    def __init__(self, shapes: list[list[np.ndarray]], keys: pd.DataFrame, grid_size: int = GRID_SIZE):
+        """
+        `shapes`: por barrio, lista de polígonos (listas de anillos (n, 2) lon/lat).
+        `keys`: DataFrame con una fila por barrio en el mismo orden.
+        """
+        self.keys = keys.reset_index(drop=True)
+        # Aristas de todos los anillos de cada barrio: (x0, y0, x1, y1)
+        self.edges = []
+        bounds = []
+        for shape in shapes:
+            rings = [ring for polygon in shape for ring in polygon]
+            edges = np.concatenate([np.hstack([ring[:-1], ring[1:]]) for ring in rings])
+            self.edges.append(edges)
+            points = np.concatenate(rings)
+            bounds.append([*points.min(axis=0), *points.max(axis=0)])
+        self.bounds = np.asarray(bounds)
+
+        self.grid_size = grid_size
+        self.x0, self.y0 = self.bounds[:, 0].min(), self.bounds[:, 1].min()
+        self.dx = (self.bounds[:, 2].max() - self.x0) / grid_size
+        self.dy = (self.bounds[:, 3].max() - self.y0) / grid_size
+
+        # Celdas (CSR) -> barrios cuyo rectángulo envolvente toca la celda
+        cells = [[] for _ in range(grid_size * grid_size)]
+        for i, (xmin, ymin, xmax, ymax) in enumerate(self.bounds):
+            ix0, iy0 = self._cell(xmin, ymin)
+            ix1, iy1 = self._cell(xmax, ymax)
+            for iy in range(iy0, iy1 + 1):
+                for ix in range(ix0, ix1 + 1):
+                    cells[iy * grid_size + ix].append(i)
+        self.cell_ptr = np.zeros(len(cells) + 1, dtype=np.int64)
+        self.cell_ptr[1:] = np.cumsum([len(c) for c in cells])
+        self.cell_polys = np.fromiter((i for c in cells for i in c), dtype=np.int64, count=self.cell_ptr[-1])
+
+    def _cell(self, x, y):
+        ix = np.clip(((np.asarray(x) - self.x0) / self.dx).astype(np.int64), 0, self.grid_size - 1)
+        iy = np.clip(((np.asarray(y) - self.y0) / self.dy).astype(np.int64), 0, self.grid_size - 1)
+        return ix, iy
+
+    def _inside(self, poly: int, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Regla par-impar de los puntos (x, y) respecto a todos los anillos del barrio."""
+        edges = self.edges[poly]
+        ex0, ey0, ex1, ey1 = edges.T
+        inside = np.zeros(len(x), dtype=bool)
+        step = max(1, MAX_PAIRS // len(edges))
+        for s in range(0, len(x), step):
+            px, py = x[s:s + step, None], y[s:s + step, None]
+            crosses = (ey0 > py) != (ey1 > py)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_cross = ex0 + (py - ey0) * (ex1 - ex0) / (ey1 - ey0)
+            inside[s:s + step] = np.count_nonzero(crosses & (px < x_cross), axis=1) % 2 == 1
+        return inside
+
+    def locate_ids(self, lat, lon) -> np.ndarray:
+        """Posición del barrio que contiene cada punto (-1 si ninguno)."""
+        x = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        result = np.full(len(x), -1, dtype=np.int64)
+        valid = (
+            np.isfinite(x) & np.isfinite(y)
+            & (x >= self.x0) & (x <= self.x0 + self.dx * self.grid_size)
+            & (y >= self.y0) & (y <= self.y0 + self.dy * self.grid_size)
+        )
+        points = np.flatnonzero(valid)
+        if points.size == 0:
+            return result
+
+        # Pares (punto, barrio candidato) a partir de la celda de cada punto
+        ix, iy = self._cell(x[points], y[points])
+        cell = iy * self.grid_size + ix
+        starts, counts = self.cell_ptr[cell], self.cell_ptr[cell + 1] - self.cell_ptr[cell]
+        pair_point = np.repeat(points, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_poly = self.cell_polys[np.repeat(starts, counts) + offsets]
+
+        # Filtro por rectángulo envolvente y prueba exacta agrupando por barrio
+        b = self.bounds[pair_poly]
+        px, py = x[pair_point], y[pair_point]
+        keep = (px >= b[:, 0]) & (px <= b[:, 2]) & (py >= b[:, 1]) & (py <= b[:, 3])
+        pair_point, pair_poly = pair_point[keep], pair_poly[keep]
+        order = np.argsort(pair_poly, kind="stable")
+        pair_point, pair_poly = pair_point[order], pair_poly[order]
+        polys, first = np.unique(pair_poly, return_index=True)
+        bounds = np.append(first, len(pair_poly))
+        for poly, s, e in zip(polys, bounds[:-1], bounds[1:]):
+            candidates = pair_point[s:e]
+            candidates = candidates[result[candidates] < 0]
+            if candidates.size:
+                hit = self._inside(poly, x[candidates], y[candidates])
+                result[candidates[hit]] = poly
+        return result
+
+    def locate(self, lat, lon) -> pd.DataFrame:
+        """
+        Claves (`DISTRITO`, `BARRIO`, `distrito_nombre`, `barrio_nombre`) del
+        barrio de cada punto; filas vacías (NaN) para puntos fuera de Madrid.
+        """
+        ids = self.locate_ids(lat, lon)
+        found = ids >= 0
+        out = pd.DataFrame(index=range(len(ids)), columns=self.keys.columns, dtype=object)
+        out.loc[found] = self.keys.to_numpy()[ids[found]]
+        return out
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _build_index(key: tuple) -> BarrioIndex:
+    layer = geo.load_layer("barrio", zoom=geo.ZOOM_TOLERANCES[0][0])
+    keys = pd.DataFrame([f["properties"] for f in layer["features"]])[KEY_COLUMNS]
+    shapes = [shape for _, shape in geo.polygons("barrio")]
+    return BarrioIndex(shapes, keys)
+
+
+def barrio_index() -> BarrioIndex:
+    """Índice del proceso (se reconstruye si cambian las geometrías o el catálogo)."""
+    return _build_index((file_key(geo.BARRIOS_PATH), file_key(DISTRICT_FEATURES_PATH), file_key(CATALOGO_PATH)))
+
+
+def locate(lat, lon) -> pd.DataFrame:
+    """Barrio de cada coordenada (arrays o escalares de latitud y longitud)."""
+    return barrio_index().locate(lat, lon)
+
+
+def locate_point(lat: float, lon: float) -> dict | None:
+    """Claves del barrio que contiene el punto o None si cae fuera de Madrid."""
+    row = locate([lat], [lon]).iloc[0]
+    return None if row.isna().all() else row.to_dict()
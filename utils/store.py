@@ -0,0 +1,115 @@
+"""
+Almacén indexado de zonas (distritos y barrios).
+
+Las páginas buscaban filas con `df[df["distrito_nombre"] == distrito]`, una
+pasada completa por consulta. `ZoneStore` guarda las tablas de
+`utils/features.py` (`district_base()` y `barrio_base()`) con claves
+categóricas y sus índices precalculados:
+
+- distrito -> posición (por etiqueta "01. Centro" o nombre corto "Centro");
+- barrio -> posición (por etiqueta, por nombre corto o por (distrito, barrio));
+- distrito -> barrios, como rangos contiguos (CSR) sobre la tabla de barrios
+  ordenada por distrito.
+
+Cada búsqueda es un acceso a diccionario o un corte de la tabla, y los lotes
+de etiquetas se resuelven a posiciones con el índice de etiquetas.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.features import barrio_base, barrio_key, district_base
+
+
+class ZoneStore:
+    """Tablas de distritos y barrios con claves categóricas e índices de búsqueda."""
+
+    def __init__(self, districts: pd.DataFrame, barrios: pd.DataFrame):
+        districts = districts.reset_index(drop=True)
+        categories = pd.Index(districts["DISTRITO"].astype(str))
+        barrios = barrios.reset_index(drop=True)
+        barrio_district = pd.Categorical(barrios["DISTRITO"].astype(str), categories=categories)
+        order = np.argsort(barrio_district.codes, kind="stable")
+        barrios = barrios.iloc[order].reset_index(drop=True)
+
+        self.districts = districts.assign(DISTRITO=pd.Categorical(categories, categories=categories))
+        self.barrio_categories = pd.Index(barrios["BARRIO"].astype(str))
+        self.barrios = barrios.assign(
+            DISTRITO=pd.Categorical(barrios["DISTRITO"].astype(str), categories=categories),
+            BARRIO=pd.Categorical(self.barrio_categories, categories=self.barrio_categories),
+        )
+
+        # Distrito -> posición (etiqueta y nombre corto)
+        self._district_pos = {label: i for i, label in enumerate(categories)}
+        self._district_pos.update({name: i for i, name in enumerate(districts["distrito_nombre"])})
+        # Barrio -> posición (etiqueta, nombre corto y par distrito/barrio)
+        self._barrio_pos = {label: i for i, label in enumerate(self.barrio_categories)}
+        self._barrio_pos.update({name: i for i, name in enumerate(barrios["barrio_nombre"])})
+        self._pair_pos = {
+            (d, b): i for i, (d, b) in enumerate(zip(barrios["distrito_nombre"], barrios["barrio_nombre"]))
+        }
+        # Distrito (código) -> barrios [offsets[c], offsets[c + 1])
+        codes = self.barrios["DISTRITO"].cat.codes.to_numpy()
+        self.offsets = np.searchsorted(codes, np.arange(len(categories) + 1))
+
+    # ------------------------------
+    # Distritos
+    # ------------------------------
+    def district_position(self, distrito: str) -> int | None:
+        """Posición del distrito (etiqueta o nombre corto) en `districts`, o None."""
+        return self._district_pos.get(distrito)
+
+    def district(self, distrito: str) -> pd.Series | None:
+        """Fila del distrito (etiqueta o nombre corto), o None si no existe."""
+        i = self.district_position(distrito)
+        return None if i is None else self.districts.iloc[i]
+
+    def district_label(self, distrito: str) -> str | None:
+        """Etiqueta `DISTRITO` ("01. Centro") a partir de la etiqueta o del nombre corto."""
+        i = self.district_position(distrito)
+        return None if i is None else self.districts["DISTRITO"].cat.categories[i]
+
+    def district_name(self, distrito: str) -> str | None:
+        """Nombre corto ("Centro") a partir de la etiqueta o del nombre corto."""
+        i = self.district_position(distrito)
+        return None if i is None else self.districts["distrito_nombre"].iat[i]
+
+    # ------------------------------
+    # Barrios
+    # ------------------------------
+    def barrios_of(self, distrito: str) -> pd.DataFrame:
+        """Barrios de un distrito (corte contiguo de `barrios`; vacío si no existe)."""
+        i = self.district_position(distrito)
+        if i is None:
+            return self.barrios.iloc[:0]
+        return self.barrios.iloc[self.offsets[i]:self.offsets[i + 1]]
+
+    def barrio_position(self, barrio: str, distrito: str | None = None) -> int | None:
+        """Posición de un barrio (etiqueta o nombre corto, opcionalmente dentro de un distrito)."""
+        if distrito is not None:
+            i = self._pair_pos.get((self.district_name(distrito), barrio))
+            if i is not None:
+                return i
+        i = self._barrio_pos.get(barrio)
+        if i is not None and distrito is not None and self.barrios["distrito_nombre"].iat[i] != self.district_name(distrito):
+            return None
+        return i
+
+    def barrio(self, barrio: str, distrito: str | None = None) -> pd.Series | None:
+        """Fila de un barrio, o None si no existe (o no pertenece a `distrito`)."""
+        i = self.barrio_position(barrio, distrito)
+        return None if i is None else self.barrios.iloc[i]
+
+    def barrio_positions(self, labels) -> np.ndarray:
+        """Posiciones de un lote de etiquetas `BARRIO` (-1 si no existen), sin recorrer la tabla."""
+        return self.barrio_categories.get_indexer(np.asarray(labels, dtype=object)).astype(np.intp)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _store(key: tuple) -> ZoneStore:
+    return ZoneStore(district_base(), barrio_base())
+
+
+def get_store() -> ZoneStore:
+    """Almacén del proceso (se reconstruye si cambian los CSV o el dataset de viviendas)."""
+    return _store(barrio_key())
@@ -1,30 +1,131 @@
 import streamlit as st
-import os, base64
+import os, base64, hashlib, io, mimetypes
+from functools import lru_cache
+
+from utils import perf
 
 # ==============================
-# CSS personalizado
+# Rutas de recursos
 # ==============================
-def inject_css():
-    """Inyecta la hoja de estilos personalizada en la app."""
-    try:
-        with open("assets/style.css") as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-    except FileNotFoundError:
-        st.warning("⚠️ No se encontró assets/style.css. Verifica la ruta.")
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+ASSETS_DIR = os.path.join(BASE_DIR, "assets")
+# Carpeta que Streamlit sirve en /app/static/ con server.enableStaticServing = true
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+STATIC_ASSETS_DIR = os.path.join(STATIC_DIR, "assets")
 
 
 # ==============================
-# Función auxiliar para cargar imágenes en base64
+# Recursos memoizados (una codificación por proceso)
 # ==============================
-def _load_base64_image(path):
-    """Carga imagen desde assets y la devuelve codificada en base64."""
-    if os.path.exists(path):
+def _asset_key(path):
+    """(mtime_ns, tamaño) del archivo o None si no existe: invalida la caché al cambiar."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _optimize_image(data, max_px):
+    """
+    Reduce una imagen raster a `max_px` de lado mayor y la recodifica en WebP.
+    Devuelve (bytes, mime). Si Pillow no está disponible o falla, devuelve None.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        img = Image.open(io.BytesIO(data))
+        if max_px and max(img.size) > max_px:
+            img.thumbnail((max_px, max_px), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format="WEBP", quality=85, method=4)
+    except Exception:
+        return None
+    return out.getvalue(), "image/webp"
+
+
+def _static_serving():
+    try:
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+@perf.timed("asset:src", kind="miss")
+def _asset_src(path, key, max_px, static):
+    """
+    `src` listo para HTML/CSS de un recurso: URL de /app/static/ si el servidor
+    sirve estáticos, o data-URI en otro caso. Se calcula una vez por archivo,
+    tamaño y versión (mtime/tamaño) y se comparte entre sesiones.
+    """
+    if key is None:
+        return ""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return ""
+    mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    ext = os.path.splitext(path)[1]
+    if mime.startswith("image/") and mime != "image/svg+xml":
+        optimized = _optimize_image(data, max_px)
+        if optimized is not None and len(optimized[0]) < len(data):
+            data, mime, ext = optimized[0], optimized[1], ".webp"
+
+    if static:
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name = f"{stem}-{max_px or 'orig'}-{digest}{ext}"
+        target = os.path.join(STATIC_ASSETS_DIR, name)
         try:
-            with open(path, "rb") as f:
-                return base64.b64encode(f.read()).decode()
-        except Exception:
-            return ""
-    return ""
+            if not os.path.exists(target):
+                os.makedirs(STATIC_ASSETS_DIR, exist_ok=True)
+                tmp_path = f"{target}.tmp-{os.getpid()}"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, target)
+            return f"app/static/assets/{name}"
+        except OSError:
+            pass  # Sin permisos de escritura: se sirve como data-URI
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+@perf.timed("asset:src")
+def asset_src(name, max_px=None):
+    """
+    Devuelve el `src` de `assets/<name>` (cadena vacía si no existe).
+
+    - `max_px`: lado mayor al que se reduce la imagen (se pide ~2x el tamaño
+      mostrado). Las imágenes raster se recodifican en WebP si Pillow está
+      disponible; los SVG se sirven tal cual.
+    - Con `server.enableStaticServing = true` en `.streamlit/config.toml` las
+      variantes se escriben en `static/assets/` y se referencian por URL, de
+      modo que cada rerun envía sólo la ruta en lugar de la imagen.
+    """
+    path = os.path.join(ASSETS_DIR, name)
+    return _asset_src(path, _asset_key(path), max_px, _static_serving())
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _read_text(path, key):
+    with open(path) as f:
+        return f.read()
+
+
+# ==============================
+# CSS personalizado
+# ==============================
+def inject_css():
+    """Inyecta la hoja de estilos personalizada en la app."""
+    path = os.path.join(ASSETS_DIR, "style.css")
+    key = _asset_key(path)
+    if key is None:
+        st.warning("⚠️ No se encontró assets/style.css. Verifica la ruta.")
+        return
+    st.markdown(f"<style>{_read_text(path, key)}</style>", unsafe_allow_html=True)
 
 
 # ==============================
@@ -35,12 +136,8 @@ def sidebar_header():
     Inserta en la parte superior del menú lateral
     los logos institucionales (UCM y SmartHousing).
     """
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    logo_app_path = os.path.join(base_dir, "..", "assets", "logontic.svg")
-    logo_ucm_path = os.path.join(base_dir, "..", "assets", "logoucm.png")
-
-    encoded_logo_app = _load_base64_image(logo_app_path)
-    encoded_logo_ucm = _load_base64_image(logo_ucm_path)
+    logo_app_src = asset_src("logontic.svg")
+    logo_ucm_src = asset_src("logoucm.png", max_px=96)
 
     css = """
     <style>
@@ -58,10 +155,10 @@ def sidebar_header():
     """
 
     logos_html = "<div class='sidebar-logos'>"
-    if encoded_logo_ucm:
-        logos_html += f"<img src='data:image/png;base64,{encoded_logo_ucm}' alt='UCM'/>"
-    if encoded_logo_app:
-        logos_html += f"<img src='data:image/svg+xml;base64,{encoded_logo_app}' alt='SmartHousing'/>"
+    if logo_ucm_src:
+        logos_html += f"<img src='{logo_ucm_src}' alt='UCM'/>"
+    if logo_app_src:
+        logos_html += f"<img src='{logo_app_src}' alt='SmartHousing'/>"
     logos_html += "</div>"
 
     st.sidebar.markdown(css + logos_html, unsafe_allow_html=True)
@@ -89,19 +186,14 @@ def hero():
     else:
         title, subtitle = "", "Encuentra el mejor lugar, en el mejor momento."
 
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    skyline_path = os.path.join(base_dir, "..", "assets", "madrid_skyline.png")
-    encoded_bg = _load_base64_image(skyline_path)
-
-    logo_path = os.path.join(base_dir, "..", "assets", "logo.png")
-    isotipo_path = os.path.join(base_dir, "..", "assets", "isotipo.png")
-    encoded_logo = _load_base64_image(logo_path)
-    encoded_isotipo = _load_base64_image(isotipo_path)
+    bg_src = asset_src("madrid_skyline.png", max_px=800)
 
     if objetivo is None:
-        img_html = f"<img src='data:image/png;base64,{encoded_logo}' alt='Logo' style='max-height:420px;margin-bottom:1rem;'/>" if encoded_logo else ""
+        logo_src = asset_src("logo.png", max_px=840)
+        img_html = f"<img src='{logo_src}' alt='Logo' style='max-height:420px;margin-bottom:1rem;'/>" if logo_src else ""
     else:
-        img_html = f"<img src='data:image/png;base64,{encoded_isotipo}' alt='Isotipo' style='max-height:300px;margin-bottom:0.5rem;'/>" if encoded_isotipo else ""
+        isotipo_src = asset_src("isotipo.png", max_px=600)
+        img_html = f"<img src='{isotipo_src}' alt='Isotipo' style='max-height:300px;margin-bottom:0.5rem;'/>" if isotipo_src else ""
 
     css = f"""
     <style>
@@ -122,7 +214,7 @@ def hero():
         text-align: center;
         box-shadow: 0 12px 28px rgba(0,0,0,.15);
         animation: fadeIn 1.2s ease both, moveSkyline 120s linear infinite;
-        background: url('data:image/png;base64,{encoded_bg}') repeat-x bottom;
+        background: url('{bg_src}') repeat-x bottom;
         background-size: contain;
     }}
     .hero-overlay {{
@@ -188,6 +280,60 @@ def kpi(title, value, delta=None):
     )
 
 
+# ==============================
+# Sparklines (SVG en línea)
+# ==============================
+@lru_cache(maxsize=256)
+def _sparkline_svg(values, projected, width, height, color):
+    series = values + projected
+    lo, hi = min(series), max(series)
+    span = (hi - lo) or 1.0
+    step = width / max(len(series) - 1, 1)
+    pad = 3
+
+    def _points(offset, ys):
+        return " ".join(
+            f"{(offset + i) * step:.1f},{pad + (hi - y) / span * (height - 2 * pad):.1f}"
+            for i, y in enumerate(ys)
+        )
+
+    last_x, last_y = _points(len(values) - 1, values[-1:]).split(",")
+    parts = [
+        f"<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 {width} {height}' width='100%' height='{height}' "
+        f"preserveAspectRatio='none' role='img'>",
+        f"<polyline fill='none' stroke='{color}' stroke-width='2' points='{_points(0, values)}'/>",
+    ]
+    if projected:
+        parts.append(
+            f"<polyline fill='none' stroke='{color}' stroke-width='1.5' stroke-dasharray='3 3' "
+            f"points='{_points(len(values) - 1, values[-1:] + projected)}'/>"
+        )
+    parts.append(f"<circle cx='{last_x}' cy='{last_y}' r='2.5' fill='{color}'/></svg>")
+    return "".join(parts)
+
+
+def sparkline_svg(values, projected=(), width=200, height=44, color="#1f77b4"):
+    """
+    Minigráfico de línea como SVG en línea (cadena HTML), sin ejes ni Plotly.
+    `projected` continúa la serie con trazo discontinuo. El SVG se memoiza por
+    valores (redondeados al euro), así que cada serie se genera una vez por proceso.
+    """
+    values = tuple(round(float(v)) for v in values)
+    if not values:
+        return ""
+    projected = tuple(round(float(v)) for v in projected)
+    return _sparkline_svg(values, projected, width, height, color)
+
+
+# ==============================
+# Gráficos Plotly medidos
+# ==============================
+def plotly_chart(fig, name, **kwargs):
+    """`st.plotly_chart` midiendo la serialización y el envío de la figura como `plotly:<name>`."""
+    with perf.timer(f"plotly:{name}"):
+        return st.plotly_chart(fig, **kwargs)
+
+
 # ==============================
 # Chips para etiquetas rápidas
 # ==============================